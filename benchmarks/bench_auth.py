@@ -0,0 +1,109 @@
+"""
+Compare `get_current_user` latency for local JWKS verification vs. the
+remote `/auth/v1/user` round-trip.
+
+Supabase is simulated with an in-process mock transport that sleeps
+`--latency-ms` per request, so the numbers isolate our own overhead plus
+the network cost we avoid. The "+cache" rows keep the verified-token
+cache warm, as a polling browser session would.
+
+    python -m benchmarks.bench_auth --requests 500 --latency-ms 120
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+for _var, _val in {
+    "SUPABASE_URL": "https://bench.supabase.co",
+    "SUPABASE_JWK_URL": "https://bench.supabase.co/auth/v1/.well-known/jwks.json",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "SUPABASE_ANON_KEY": "bench",
+}.items():
+    os.environ.setdefault(_var, _val)
+
+import httpx  # noqa: E402
+import jwt  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+from src.config import settings  # noqa: E402
+from src.utils import auth  # noqa: E402
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _install_fake_supabase(latency_s: float) -> str:
+    key = ec.generate_private_key(ec.SECP256R1())
+    jwk = jwt.algorithms.ECAlgorithm.to_jwk(key.public_key(), as_dict=True)
+    jwk.update({"kid": "bench", "alg": "ES256", "use": "sig"})
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency_s)
+        if request.url.path.endswith("/auth/v1/user"):
+            return httpx.Response(
+                200, json={"id": "bench-user", "role": "authenticated"}
+            )
+        return httpx.Response(200, json={"keys": [jwk]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    auth._http_client = lambda: client
+    auth._jwks = auth._JWKSCache(settings.supabase_jwk_url, 600, 30)
+
+    return jwt.encode(
+        {
+            "sub": "bench-user",
+            "aud": settings.jwt_audience,
+            "exp": int(time.time()) + 3600,
+        },
+        key,
+        algorithm="ES256",
+        headers={"kid": "bench"},
+    )
+
+
+async def _measure(mode: str, token: str, n: int, cached: bool) -> list[float]:
+    settings.auth_mode = mode
+    auth._token_cache.clear()
+    cred = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    samples = []
+    for _ in range(n):
+        if not cached:
+            auth._token_cache.clear()
+        t0 = time.perf_counter()
+        await auth.get_current_user(cred)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=120.0)
+    args = parser.parse_args()
+
+    token = _install_fake_supabase(args.latency_ms / 1000)
+
+    print(f"{'mode':<16} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    for mode, cached in (
+        ("remote", False),
+        ("local", False),
+        ("remote", True),
+        ("local", True),
+    ):
+        samples = await _measure(mode, token, args.requests, cached)
+        label = f"{mode}+cache" if cached else mode
+        print(
+            f"{label:<16} {statistics.median(samples):>10.3f} "
+            f"{_percentile(samples, 99):>10.3f} {statistics.fmean(samples):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Deck compile wall time: the old fixed two pdflatex passes vs. rerun
+detection (with the pass count it settled on), each plain and against the
+preamble's cached format.
+
+Compiles each deck in the corpus through `compile_latex_with_retries`
+(one round, no LLM repair). The one-off format dump is timed separately.
+The corpus is every *.tex under `--decks`, or synthetic decks sharing a
+typical generated preamble, with and without a table of contents. Needs
+pdflatex (with mylatexformat) on PATH.
+
+    python -m benchmarks.bench_latex --frames 5 15 30
+    python -m benchmarks.bench_latex --decks path/to/generated/decks
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+for _var, _val in {
+    "SUPABASE_URL": "https://bench.supabase.co",
+    "SUPABASE_JWK_URL": "https://bench.supabase.co/auth/v1/.well-known/jwks.json",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "SUPABASE_ANON_KEY": "bench",
+}.items():
+    os.environ.setdefault(_var, _val)
+
+from src.config import settings  # noqa: E402
+from src.utils import latex  # noqa: E402
+from src.utils.disk_cache import DiskCache  # noqa: E402
+
+PREAMBLE = r"""\documentclass[aspectratio=169]{beamer}
+\usetheme{Madrid}
+\usepackage[utf8]{inputenc}
+\usepackage{amsmath,amssymb}
+\usepackage{tikz}
+\usetikzlibrary{arrows.meta,positioning}
+\usepackage{booktabs}
+\title{Benchmark deck}
+"""
+
+
+def _synthetic_deck(frames: int, toc: bool) -> str:
+    body = [r"\frame{\titlepage}"]
+    if toc:
+        body.append(r"\begin{frame}{Outline}\tableofcontents\end{frame}")
+    for n in range(1, frames + 1):
+        if toc and n % 5 == 1:
+            body.append(rf"\section{{Part {n // 5 + 1}}}")
+        body.append(rf"""\begin{{frame}}{{Topic {n}}}
+  \begin{{itemize}}
+    \item Point about topic {n}: $\int_0^{n} x^2\,dx = \frac{{{n}^3}}{{3}}$
+    \item Another point
+  \end{{itemize}}
+  \begin{{tikzpicture}}
+    \node[draw] (a) {{A{n}}}; \node[draw, right=of a] (b) {{B}};
+    \draw[-Stealth] (a) -- (b);
+  \end{{tikzpicture}}
+\end{{frame}}""")
+    return PREAMBLE + "\\begin{document}\n" + "\n".join(body) + "\n\\end{document}\n"
+
+
+_MAX_PASSES = settings.latex_max_passes
+_LOG_WANTS_RERUN = latex._log_wants_rerun
+
+
+async def _compile(deck: str, job_id: str, fixed_passes: bool) -> tuple[float, int]:
+    passes = 0
+
+    async def progress(event: str, data: dict) -> None:
+        nonlocal passes
+        if event == "compile_succeeded":
+            passes = data["passes"]
+
+    # the old behaviour: always exactly two passes
+    settings.latex_max_passes = 2 if fixed_passes else _MAX_PASSES
+    latex._log_wants_rerun = (lambda *_: True) if fixed_passes else _LOG_WANTS_RERUN
+
+    t0 = time.perf_counter()
+    await latex.compile_latex_with_retries(
+        deck, job_id, max_rounds=1, progress=progress
+    )
+    return time.perf_counter() - t0, passes
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, nargs="+", default=[5, 15, 30])
+    parser.add_argument("--decks", type=Path, help="directory of .tex decks")
+    args = parser.parse_args()
+
+    if not shutil.which("pdflatex"):
+        sys.exit("pdflatex not found on PATH; nothing to benchmark")
+
+    settings.workspace_root = Path(tempfile.mkdtemp(prefix="bench_latex_"))
+    settings.__post_init__()
+    settings.latex_build_root = settings.workspace_root / "build"
+    latex._formats = DiskCache(
+        "latexfmt", settings.cache_dir / "latexfmt", max_bytes=1 << 30, suffix=".fmt"
+    )
+
+    if args.decks:
+        corpus = {p.stem: p.read_text() for p in sorted(args.decks.glob("*.tex"))}
+    else:
+        corpus = {
+            f"{n} frames{', toc' if toc else ''}": _synthetic_deck(n, toc)
+            for n in args.frames
+            for toc in (False, True)
+        }
+
+    print(
+        f"{'deck':<20} {'2-pass s':>9} {'rerun s':>8} {'passes':>6}"
+        f" {'fmt 2-pass s':>12} {'fmt rerun s':>11} {'dump s':>7}"
+    )
+    for i, (label, deck) in enumerate(corpus.items()):
+        settings.latex_format_cache = False
+        fixed, _ = await _compile(deck, f"fixed-{i}", True)
+        rerun, passes = await _compile(deck, f"rerun-{i}", False)
+        row = f"{label:<20} {fixed:>9.2f} {rerun:>8.2f} {passes:>6}"
+
+        settings.latex_format_cache = True
+        preamble = latex.split_preamble(deck) or ""
+        key = latex.format_key(preamble)
+        dump = 0.0
+        if latex._formats.get_path(key) is None:
+            t0 = time.perf_counter()
+            await latex._build_format(key, latex.normalize_preamble(preamble))
+            dump = time.perf_counter() - t0
+        if key in latex._bad_formats:
+            print(f"{row} {'n/a':>12} {'n/a':>11} {'failed':>7}")
+            continue
+        fmt_fixed, _ = await _compile(deck, f"fmt-fixed-{i}", True)
+        fmt_rerun, _ = await _compile(deck, f"fmt-rerun-{i}", False)
+        print(f"{row} {fmt_fixed:>12.2f} {fmt_rerun:>11.2f} {dump:>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
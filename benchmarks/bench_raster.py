@@ -0,0 +1,126 @@
+"""
+Rasterisation wall time across deck sizes: the original single
+`pdftoppm -png` run at default resolution vs. the page-sharded
+`convert_pdf_to_pngs` with the current RASTER_* settings.
+
+Decks are generated here as plain 16:9 PDFs with a few lines of text and
+a filled shape per page, so no LaTeX toolchain is needed. Needs pdftoppm
+and pdfinfo on PATH.
+
+    python -m benchmarks.bench_raster --pages 10 30 60 --format png jpeg
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+for _var, _val in {
+    "SUPABASE_URL": "https://bench.supabase.co",
+    "SUPABASE_JWK_URL": "https://bench.supabase.co/auth/v1/.well-known/jwks.json",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "SUPABASE_ANON_KEY": "bench",
+}.items():
+    os.environ.setdefault(_var, _val)
+
+from src.config import settings  # noqa: E402
+from src.utils.commands import convert_pdf_to_pngs  # noqa: E402
+
+
+def _write_deck(path: Path, pages: int) -> None:
+    """Minimal multi-page PDF (Helvetica text + a coloured block per page)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    font = 3 + 2 * pages
+    kids = []
+    for n in range(pages):
+        page_id, content_id = 3 + 2 * n, 4 + 2 * n
+        kids.append(f"{page_id} 0 R")
+        stream = (
+            f"{(n * 37 % 100) / 100:.2f} 0.4 0.7 rg 60 60 420 180 re f "
+            f"0 0 0 rg BT /F1 36 Tf 60 380 Td (Slide {n + 1}) Tj "
+            f"/F1 18 Tf 0 -40 Td (Bullet point about topic {n + 1}) Tj "
+            f"0 -28 Td (Another line of slide text) Tj ET"
+        ).encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 720 405] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>".encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    path.write_bytes(bytes(out))
+
+
+def _baseline(pdf: Path, out_dir: Path) -> float:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    subprocess.run(
+        [settings.pdftoppm_path, "-png", str(pdf), str(out_dir / "slide")], check=True
+    )
+    return time.perf_counter() - t0
+
+
+async def _sharded(pdf: Path, job_id: str) -> float:
+    t0 = time.perf_counter()
+    await convert_pdf_to_pngs(pdf, job_id)
+    return time.perf_counter() - t0
+
+
+def _dir_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.iterdir() if p.is_file()) / 1e6
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--format", nargs="+", default=["png", "jpeg"])
+    args = parser.parse_args()
+
+    if not (shutil.which(settings.pdftoppm_path) and shutil.which("pdfinfo")):
+        sys.exit("pdftoppm/pdfinfo not found on PATH; nothing to benchmark")
+
+    settings.workspace_root = Path(tempfile.mkdtemp(prefix="bench_raster_"))
+    settings.__post_init__()
+
+    print(f"{'pages':>6} {'mode':<16} {'wall s':>8} {'MB':>8}")
+    for pages in args.pages:
+        pdf = settings.workspace_root / f"deck_{pages}.pdf"
+        _write_deck(pdf, pages)
+
+        out = settings.workspace_root / f"baseline_{pages}"
+        wall = _baseline(pdf, out)
+        print(f"{pages:>6} {'baseline png':<16} {wall:>8.2f} {_dir_mb(out):>8.2f}")
+
+        for fmt in args.format:
+            settings.raster_format = fmt
+            job_id = f"sharded_{pages}_{fmt}"
+            copy = settings.workspace_root / f"{job_id}.pdf"
+            shutil.copyfile(pdf, copy)  # convert_pdf_to_pngs deletes its input
+            wall = await _sharded(copy, job_id)
+            size = _dir_mb(settings.pngs_dir / job_id)
+            print(f"{pages:>6} {'sharded ' + fmt:<16} {wall:>8.2f} {size:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
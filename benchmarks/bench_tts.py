@@ -0,0 +1,74 @@
+"""
+Wall-clock time to synthesize a deck's narrations at different per-job
+concurrency levels.
+
+Runs against the fake TTS backend, which sleeps `--latency-ms` per clip
+in a worker thread (like the blocking Gradio client), so the numbers show
+the fan-out itself rather than GPU time.
+Audio and the TTS cache live in a throwaway workspace, and every run
+uses fresh text so each clip is a cache miss.
+
+    python -m benchmarks.bench_tts --slides 5 10 20 --concurrency 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+for _var, _val in {
+    "SUPABASE_URL": "https://bench.supabase.co",
+    "SUPABASE_JWK_URL": "https://bench.supabase.co/auth/v1/.well-known/jwks.json",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "SUPABASE_ANON_KEY": "bench",
+}.items():
+    os.environ.setdefault(_var, _val)
+
+from src.config import settings  # noqa: E402
+from src.services import presentation, tts, tts_backends  # noqa: E402
+from src.utils.disk_cache import DiskCache  # noqa: E402
+
+
+async def _measure(slides: int, concurrency: int) -> float:
+    settings.tts_job_concurrency = concurrency
+    narrations = [
+        {"slideIndex": i, "narration": f"Slide {i} of {slides} at c={concurrency}."}
+        for i in range(1, slides + 1)
+    ]
+    t0 = time.perf_counter()
+    await presentation.synthesize_narrations(
+        f"bench-{slides}-{concurrency}", narrations, settings.kokoro_voice_default
+    )
+    return time.perf_counter() - t0
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--slides", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument(
+        "--format", default="wav", help="delivery format (non-wav needs ffmpeg)"
+    )
+    args = parser.parse_args()
+
+    settings.tts_audio_format = args.format
+
+    tts_backends._backend = tts_backends.FakeTTSBackend(args.latency_ms / 1000)
+    settings.workspace_root = Path(tempfile.mkdtemp(prefix="bench_tts_"))
+    tts._audio_cache = DiskCache(
+        "tts", settings.workspace_root / "cache", max_bytes=1 << 30, suffix=".wav"
+    )
+    # Lift the box-wide stage cap so the per-job limit is what's measured
+    settings.stage_limits["tts"] = max(args.concurrency)
+
+    print(f"{'slides':>6} " + " ".join(f"{f'c={c} s':>9}" for c in args.concurrency))
+    for slides in args.slides:
+        row = [await _measure(slides, c) for c in args.concurrency]
+        print(f"{slides:>6} " + " ".join(f"{t:>9.2f}" for t in row))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Compare slide-video assembly modes on a synthetic deck: wall time, CPU
+seconds spent in ffmpeg, and output size.
+
+- legacy: per-slide 30 fps clips + concat (the original path)
+- still:  per-slide still-image clips + stream-copy concat
+- single: one ffmpeg run over an image list and the joined narration
+
+The deck is `--slides` test-pattern PNGs with sine-tone narration of 4–12 s
+each (fixed seed), built once in a throwaway workspace with ffmpeg itself.
+Needs ffmpeg on PATH.
+
+    python -m benchmarks.bench_video --slides 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+for _var, _val in {
+    "SUPABASE_URL": "https://bench.supabase.co",
+    "SUPABASE_JWK_URL": "https://bench.supabase.co/auth/v1/.well-known/jwks.json",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "SUPABASE_ANON_KEY": "bench",
+}.items():
+    os.environ.setdefault(_var, _val)
+
+from src.config import settings  # noqa: E402
+from src.services import presentation  # noqa: E402
+from src.utils.audio import wav_duration  # noqa: E402
+from src.utils.commands import run_ffmpeg_async  # noqa: E402
+
+JOB_ID = "bench"
+
+
+async def _make_deck(slides: int, seed: int) -> None:
+    rng = random.Random(seed)
+    png_dir = settings.pngs_dir / JOB_ID
+    audio_dir = settings.audios_dir / JOB_ID
+    png_dir.mkdir(parents=True, exist_ok=True)
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(1, slides + 1):
+        await run_ffmpeg_async(
+            [
+                "ffmpeg",
+                "-y",
+                "-f",
+                "lavfi",
+                "-i",
+                f"testsrc2=size=1920x1080:rate=1:duration=1,hue=h={i * 12}",
+                "-frames:v",
+                "1",
+                str(png_dir / f"slide_{i}.png"),
+            ]
+        )
+        wav = audio_dir / f"slide_{i}.wav"
+        await run_ffmpeg_async(
+            [
+                "ffmpeg",
+                "-y",
+                "-f",
+                "lavfi",
+                "-i",
+                f"sine=frequency={200 + 20 * i}:duration={rng.uniform(4, 12):.2f}",
+                "-ar",
+                "24000",
+                "-ac",
+                "1",
+                str(wav),
+            ]
+        )
+        meta = {"format": "wav", "duration_s": round(wav_duration(wav), 3)}
+        (audio_dir / f"slide_{i}.json").write_text(json.dumps(meta))
+
+
+def _child_cpu_s() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+# mode → (VIDEO_ASSEMBLER, VIDEO_ENCODE_MODE)
+MODES = {
+    "legacy": ("clips", "legacy"),
+    "still": ("clips", "still"),
+    "single": ("single", "still"),
+}
+
+
+async def _measure(mode: str) -> tuple[float, float, int]:
+    settings.video_assembler, settings.video_encode_mode = MODES[mode]
+    shutil.rmtree(settings.workspace_root / JOB_ID, ignore_errors=True)
+    cpu0, t0 = _child_cpu_s(), time.perf_counter()
+    output = await presentation.stitch_video(JOB_ID)
+    return time.perf_counter() - t0, _child_cpu_s() - cpu0, output.stat().st_size
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--slides", type=int, default=30)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg not found on PATH; nothing to benchmark")
+
+    settings.workspace_root = Path(tempfile.mkdtemp(prefix="bench_video_"))
+    settings.__post_init__()
+    await _make_deck(args.slides, args.seed)
+
+    print(f"{'mode':<12} {'wall s':>8} {'cpu s':>8} {'size MB':>9}")
+    for mode in args.modes:
+        wall, cpu, size = await _measure(mode)
+        print(f"{mode:<12} {wall:>8.2f} {cpu:>8.2f} {size / 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,6 +5,9 @@ from loguru import logger
 from contextlib import asynccontextmanager
 
 from src.config import settings
+from src.utils import http, metrics
+from src.utils.quota import close_quota_backend
+from src.services import job_engine, tts
 from src.api.materials import router as materials_router
 from src.api.analysis import router as analysis_router
 from src.api.presentation import router as presentation_router
@@ -15,8 +18,15 @@ from fastapi.middleware.cors import CORSMiddleware
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("panic-prep starting (workers={})", settings.uvicorn_workers)
+    await http.startup()
+    await tts.startup()
+    await job_engine.start()
     yield
     logger.info("panic-prep shutting down")
+    await job_engine.stop()
+    await close_quota_backend()
+    await tts.shutdown()
+    await http.shutdown()
 
 
 def create_app() -> FastAPI:
@@ -41,6 +51,10 @@ def create_app() -> FastAPI:
             "uvicorn_workers": settings.uvicorn_workers,
         }
 
+    @app.get("/metrics", tags=["aux"])
+    async def worker_metrics():
+        return metrics.snapshot()
+
     # expose generated artefacts
     app.mount("/pngs", StaticFiles(directory=settings.pngs_dir), name="pngs")
 
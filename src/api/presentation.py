@@ -1,13 +1,12 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from loguru import logger
 
+from src.services import job_engine, jobs, tts
 from src.services import presentation as pres_svc
-from src.services.presentation import generate_narrations
 from src.services.topic_outline import allocate_job_id
-from src.services.tts import synthesize_tts
 from src.utils.auth import get_current_user, User, check_generation_limit
 from src.config import settings
 
@@ -53,6 +52,11 @@ class SlideWithAudio(BaseModel):
     title: str
     slide_png_url: str
     audio_url: str
+    duration_s: Optional[float] = None
+    thumbnail_url: Optional[str] = None
+    variants: Optional[Dict[str, str]] = Field(
+        None, description="Slide image URL per width in px"
+    )
 
 
 class BuildPresentationPayload(BaseModel):
@@ -75,49 +79,162 @@ async def build_presentation(payload: BuildPresentationPayload):
 
     cached = False if not payload.job_id else True
 
-    # 1) Generate slides (topic-only or materials-based)
-    png_urls = await pres_svc.create_slides_from_outline(
-        job_id, payload.outline, cached
+    slides = await pres_svc.build_presentation(job_id, payload.outline, cached, voice)
+    return [SlideWithAudio(**s) for s in slides]
+
+
+# ─── Job-based variants: POST returns immediately, progress via SSE ──────────
+class JobAccepted(BaseModel):
+    job_id: str
+    events_url: str
+
+
+# interactive slide builds jump ahead of full presentations
+_JOB_PRIORITY = {"build_slides": 10, "build_presentation": 0}
+
+
+async def _start_job(kind: str, job_id: str, user: User, payload: dict) -> dict:
+    await job_engine.submit(
+        job_id,
+        user.id,
+        kind,
+        payload,
+        priority=_JOB_PRIORITY[kind],
+        accepted_event="outline_accepted",
+    )
+    return {"job_id": job_id, "events_url": f"/presentation/jobs/{job_id}/events"}
+
+
+@router.post(
+    "/build_slides_job",
+    response_model=JobAccepted,
+    status_code=202,
+    dependencies=[Depends(check_generation_limit)],
+)
+async def build_slides_job(
+    payload: BuildSlidesPayload,
+    user: User = Depends(get_current_user),
+):
+    """
+    Like /build_slides, but queues a job and returns its id. Follow
+    `events_url` for compile attempts and each rasterised slide.
+    """
+    if not payload.outline:
+        raise HTTPException(status_code=422, detail="Outline cannot be empty")
+
+    cached = bool(payload.job_id)
+    job_id = payload.job_id or allocate_job_id()
+    return await _start_job(
+        "build_slides",
+        job_id,
+        user,
+        {"outline": payload.outline, "cached": cached},
+    )
+
+
+@router.post(
+    "/build_presentation_job",
+    response_model=JobAccepted,
+    status_code=202,
+    dependencies=[Depends(check_generation_limit)],
+)
+async def build_presentation_job(
+    payload: BuildPresentationPayload,
+    user: User = Depends(get_current_user),
+):
+    """
+    Like /build_presentation, but queues a job and returns its id. Follow
+    `events_url` for slides and audio as they become ready; the final
+    `done` event carries the same list /build_presentation returns.
+    """
+    if not payload.outline:
+        raise HTTPException(status_code=422, detail="Outline cannot be empty")
+
+    voice = payload.voice or settings.kokoro_voice_default
+    cached = bool(payload.job_id)
+    job_id = payload.job_id or allocate_job_id()
+    return await _start_job(
+        "build_presentation",
+        job_id,
+        user,
+        {"outline": payload.outline, "cached": cached, "voice": voice},
+    )
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    priority: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str, user: User = Depends(get_current_user)):
+    return await job_engine.status(job_id, user.id)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobStatus)
+async def cancel_job(job_id: str, user: User = Depends(get_current_user)):
+    """
+    Queued jobs are cancelled at once; running ones stop at the next
+    dispatcher tick of the worker that owns them.
+    """
+    return await job_engine.cancel(job_id, user.id)
+
+
+@router.get(
+    "/jobs/{job_id}/events",
+    summary="Server-Sent Events stream of a build job's progress",
+)
+async def job_events(
+    job_id: str,
+    user: User = Depends(get_current_user),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Replays the job's events so far, then streams new ones until `done`,
+    `error` or `cancelled`. Honours `Last-Event-ID` on reconnect.
+    """
+    await jobs.get_job_meta(job_id, user.id)
+    start = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        jobs.stream_events(job_id, start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # 2) Generate slide narrations metadata
-    narrations = await generate_narrations(job_id)
-
-    if len(narrations) != len(png_urls):
-        raise HTTPException(
-            status_code=500,
-            detail="Mismatch between slides and narration count",
-        )
-
-    logger.info(f"Generating TTS for {len(narrations)} slides (job {job_id})")
-
-    # 3) Synthesize TTS and assemble response
-    results: List[SlideWithAudio] = []
-    for slide in narrations:
-        idx = slide["slideIndex"]
-        title = slide.get("title", "")
-        text = slide.get("narration", "")
-
-        audio_url = await synthesize_tts(text, job_id, idx, voice)
-
-        try:
-            png_url = next(u for u in png_urls if job_id in u and f"{idx}.png" in u)
-        except StopIteration:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Could not find PNG for slide {idx}",
-            )
-
-        results.append(
-            SlideWithAudio(
-                slideIndex=idx,
-                title=title,
-                slide_png_url=png_url,
-                audio_url=audio_url,
-            )
-        )
-
-    return results
+
+@router.get(
+    "/jobs/{job_id}/audio/{slide_index}/stream",
+    summary="Stream a slide's narration while it is still being synthesized",
+)
+async def stream_slide_audio(
+    job_id: str,
+    slide_index: int,
+    user: User = Depends(get_current_user),
+):
+    """
+    With TTS_CHUNKING on, plays from the first synthesized sentence instead
+    of waiting for the whole clip (announced by `audio_stream_ready`). The
+    finished clip is served with range support under /audios/; without a
+    chunked synthesis this returns that clip, or 404 if there is none yet.
+    """
+    await jobs.get_job_meta(job_id, user.id)
+    if not tts.has_chunk_stream(job_id, slide_index):
+        clip = tts.finished_clip(job_id, slide_index)
+        if clip is not None:
+            return FileResponse(clip)
+        if not settings.tts_chunking:
+            raise HTTPException(status_code=404, detail="No audio for this slide")
+    return StreamingResponse(
+        tts.stream_slide_audio(job_id, slide_index),
+        media_type="audio/wav",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 class DownloadVideoRequest(BaseModel):
@@ -17,6 +17,12 @@ if ENV_FILE.exists():
     load_dotenv(dotenv_path=ENV_FILE, override=False)
 
 
+def _parse_int_map(raw: str) -> dict[str, int]:
+    """Parse "a=1,b=2" into {"a": 1, "b": 2}."""
+    pairs = (item.split("=", 1) for item in raw.split(",") if "=" in item)
+    return {k.strip(): int(v) for k, v in pairs}
+
+
 # Config Dataclass
 @dataclass
 class Config:
@@ -34,6 +40,36 @@ class Config:
     supabase_anon_key: str = field(
         default_factory=lambda: os.environ["SUPABASE_ANON_KEY"]
     )
+    # "local" verifies JWTs against the cached JWKS, "remote" asks /auth/v1/user
+    auth_mode: str = field(default_factory=lambda: os.getenv("AUTH_MODE", "local"))
+    # Opt-in: fall back to /auth/v1/user when local verification can't decide
+    auth_remote_fallback: bool = field(
+        default_factory=lambda: os.getenv("AUTH_REMOTE_FALLBACK", "false").lower()
+        == "true"
+    )
+    jwks_cache_ttl_s: int = field(
+        default_factory=lambda: int(os.getenv("JWKS_CACHE_TTL_S", "600"))
+    )
+    # Lower bound between refreshes triggered by an unknown `kid`
+    jwks_min_refresh_interval_s: int = field(
+        default_factory=lambda: int(os.getenv("JWKS_MIN_REFRESH_INTERVAL_S", "30"))
+    )
+    jwt_audience: str = field(
+        default_factory=lambda: os.getenv("JWT_AUDIENCE", "authenticated")
+    )
+    jwt_leeway_s: int = field(
+        default_factory=lambda: int(os.getenv("JWT_LEEWAY_S", "30"))
+    )
+    # Verified-token cache (entries never outlive the token's `exp`)
+    token_cache_max_entries: int = field(
+        default_factory=lambda: int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+    )
+    token_cache_ttl_s: int = field(
+        default_factory=lambda: int(os.getenv("TOKEN_CACHE_TTL_S", "300"))
+    )
+    token_cache_negative_ttl_s: int = field(
+        default_factory=lambda: int(os.getenv("TOKEN_CACHE_NEGATIVE_TTL_S", "30"))
+    )
 
     pandoc_path: str = field(default_factory=lambda: os.getenv("PANDOC_PATH", "pandoc"))
     ffmpeg_path: str = field(default_factory=lambda: os.getenv("FFMPEG_PATH", "ffmpeg"))
@@ -53,12 +89,113 @@ class Config:
     max_gen_per_day: int = field(
         default_factory=lambda: int(os.getenv("MAX_GEN_PER_DAY", "20"))
     )
+    # "supabase" (increment_daily_generation RPC) or "sqlite" (local file)
+    quota_backend: str = field(
+        default_factory=lambda: os.getenv("QUOTA_BACKEND", "supabase")
+    )
+    quota_db_path: Path = field(
+        default_factory=lambda: Path(
+            os.getenv("QUOTA_DB_PATH", str(TMP_ROOT / "quota.sqlite3"))
+        )
+    )
 
     # External binaries
     ffmpeg_path: str = field(default_factory=lambda: os.getenv("FFMPEG_PATH", "ffmpeg"))
     pdftoppm_path: str = field(
         default_factory=lambda: os.getenv("PDFTOPPM_PATH", "pdftoppm")
     )
+    pdfinfo_path: str = field(
+        default_factory=lambda: os.getenv("PDFINFO_PATH", "pdfinfo")
+    )
+
+    # LaTeX compiles: per-job build dirs live here (point at tmpfs, e.g.
+    # /dev/shm/panic-prep, to keep aux churn off disk); repair-round backoff
+    latex_build_root: Path = field(
+        default_factory=lambda: Path(
+            os.getenv("LATEX_BUILD_ROOT", str(TMP_ROOT / "build"))
+        )
+    )
+    latex_retry_base_delay_s: float = field(
+        default_factory=lambda: float(os.getenv("LATEX_RETRY_BASE_DELAY_S", "1.0"))
+    )
+    latex_retry_max_delay_s: float = field(
+        default_factory=lambda: float(os.getenv("LATEX_RETRY_MAX_DELAY_S", "8.0"))
+    )
+    # Cap on pdflatex passes per compile (extra passes only run while
+    # cross-references are still settling)
+    latex_max_passes: int = field(
+        default_factory=lambda: int(os.getenv("LATEX_MAX_PASSES", "3"))
+    )
+
+    # On a failed compile, locate and repair just the failing frames when
+    # possible instead of sending the whole document back to the LLM
+    latex_frame_repair: bool = field(
+        default_factory=lambda: os.getenv("LATEX_FRAME_REPAIR", "true").lower()
+        == "true"
+    )
+
+    # Dump each distinct Beamer preamble into a pdflatex format (mylatexformat)
+    # and compile later decks against it
+    latex_format_cache: bool = field(
+        default_factory=lambda: os.getenv("LATEX_FORMAT_CACHE", "true").lower()
+        == "true"
+    )
+    latex_format_cache_max_mb: int = field(
+        default_factory=lambda: int(os.getenv("LATEX_FORMAT_CACHE_MAX_MB", "512"))
+    )
+
+    # Slide rasterisation: long side in px (0 → use RASTER_DPI instead),
+    # png | jpeg output, and pages per pdftoppm run. 960 px is about the
+    # old 150 dpi output (756 px for a 4:3 beamer page, 945 px for 16:9);
+    # every step up costs pdftoppm and ffmpeg time with the pixel count
+    # (1920 is ~4x the pixels), so raise it only for sharper video frames.
+    raster_scale_to: int = field(
+        default_factory=lambda: int(os.getenv("RASTER_SCALE_TO", "960"))
+    )
+    raster_dpi: int = field(default_factory=lambda: int(os.getenv("RASTER_DPI", "0")))
+    raster_format: str = field(
+        default_factory=lambda: os.getenv("RASTER_FORMAT", "png").lower()
+    )
+    raster_jpeg_quality: int = field(
+        default_factory=lambda: int(os.getenv("RASTER_JPEG_QUALITY", "85"))
+    )
+    # Extra JPEG widths rendered per slide (first = thumbnail, made first)
+    raster_variant_widths: list[int] = field(
+        default_factory=lambda: [
+            int(w)
+            for w in os.getenv("RASTER_VARIANT_WIDTHS", "320,960").split(",")
+            if w
+        ]
+    )
+    raster_variant_quality: int = field(
+        default_factory=lambda: int(os.getenv("RASTER_VARIANT_QUALITY", "75"))
+    )
+    raster_pages_per_shard: int = field(
+        default_factory=lambda: int(os.getenv("RASTER_PAGES_PER_SHARD", "2"))
+    )
+
+    # Outbound HTTP pool (src/utils/http.py)
+    http_max_connections: int = field(
+        default_factory=lambda: int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    )
+    http_max_keepalive: int = field(
+        default_factory=lambda: int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    )
+    http_keepalive_expiry_s: float = field(
+        default_factory=lambda: float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+    )
+    http_per_host_limit: int = field(
+        default_factory=lambda: int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+    )
+    http_connect_timeout_s: float = field(
+        default_factory=lambda: float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+    )
+    http_read_timeout_s: float = field(
+        default_factory=lambda: float(os.getenv("HTTP_READ_TIMEOUT_S", "60"))
+    )
+    http2_enabled: bool = field(
+        default_factory=lambda: os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    )
 
     # Workspace root (project-local tmp)
     workspace_root: Path = field(default_factory=lambda: TMP_ROOT)
@@ -68,6 +205,8 @@ class Config:
     pngs_dir: Path = field(init=False)
     audios_dir: Path = field(init=False)
     videos_dir: Path = field(init=False)
+    cache_dir: Path = field(init=False)
+    job_db_path: Path = field(init=False)
 
     # Prompts
     prompts_dir: Path = field(default_factory=lambda: PROMPTS_DIR)
@@ -103,14 +242,161 @@ class Config:
         )
     )
 
+    # LLM concurrency (per worker): default cap, per-model overrides
+    # ("gemini/gemini-2.5-pro=2,gemini/gemini-2.5-flash=6") and queue timeout
+    llm_max_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    )
+    llm_model_concurrency: dict[str, int] = field(
+        default_factory=lambda: _parse_int_map(os.getenv("LLM_MODEL_CONCURRENCY", ""))
+    )
+    llm_queue_timeout_s: float = field(
+        default_factory=lambda: float(os.getenv("LLM_QUEUE_TIMEOUT_S", "120"))
+    )
+
+    # LLM response cache (on disk, shared by all workers)
+    llm_cache_enabled: bool = field(
+        default_factory=lambda: os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    )
+    llm_cache_max_mb: int = field(
+        default_factory=lambda: int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+    )
+    llm_cache_ttl_s: int = field(
+        default_factory=lambda: int(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+    )
+
+    # Stream Beamer generation and preview finished frames while the rest
+    # of the deck is still being generated
+    beamer_streaming: bool = field(
+        default_factory=lambda: os.getenv("BEAMER_STREAMING", "true").lower() == "true"
+    )
+    beamer_preview_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("BEAMER_PREVIEW_CONCURRENCY", "2"))
+    )
+
+    # Background job engine (src/services/job_engine.py)
+    job_max_running_per_worker: int = field(
+        default_factory=lambda: int(os.getenv("JOB_MAX_RUNNING_PER_WORKER", "2"))
+    )
+    job_max_running_per_user: int = field(
+        default_factory=lambda: int(os.getenv("JOB_MAX_RUNNING_PER_USER", "1"))
+    )
+    job_poll_interval_s: float = field(
+        default_factory=lambda: float(os.getenv("JOB_POLL_INTERVAL_S", "0.5"))
+    )
+    # Box-wide slots per pipeline stage, split evenly across workers
+    stage_limits: dict[str, int] = field(
+        default_factory=lambda: {
+            "llm": 8,
+            "latex": 4,
+            "raster": 4,
+            "tts": 8,
+            "encode": 4,
+            "video": 2,
+            **_parse_int_map(os.getenv("STAGE_LIMITS", "")),
+        }
+    )
+
+    # TTS engine: gradio (hosted Kokoro Space) | local (in-process) | fake
+    tts_backend: str = field(
+        default_factory=lambda: os.getenv("TTS_BACKEND", "gradio").lower()
+    )
+    tts_gradio_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("TTS_GRADIO_CONCURRENCY", "8"))
+    )
+    tts_local_lang: str = field(
+        default_factory=lambda: os.getenv("TTS_LOCAL_LANG", "a")
+    )
+    tts_local_workers: int = field(
+        default_factory=lambda: int(os.getenv("TTS_LOCAL_WORKERS", "1"))
+    )
+    tts_fake_latency_ms: float = field(
+        default_factory=lambda: float(os.getenv("TTS_FAKE_LATENCY_MS", "0"))
+    )
+
+    # TTS fan-out: per-job cap (the box-wide cap is stage_limits["tts"])
+    tts_job_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("TTS_JOB_CONCURRENCY", "4"))
+    )
+    tts_max_attempts: int = field(
+        default_factory=lambda: int(os.getenv("TTS_MAX_ATTEMPTS", "3"))
+    )
+    tts_retry_base_delay_s: float = field(
+        default_factory=lambda: float(os.getenv("TTS_RETRY_BASE_DELAY_S", "1.0"))
+    )
+
+    # Synthesized audio cache (on disk, shared by all workers)
+    tts_cache_enabled: bool = field(
+        default_factory=lambda: os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+    )
+    tts_cache_max_mb: int = field(
+        default_factory=lambda: int(os.getenv("TTS_CACHE_MAX_MB", "2048"))
+    )
+    tts_speed: float = field(
+        default_factory=lambda: float(os.getenv("TTS_SPEED", "1.0"))
+    )
+
+    # Delivered narration audio: mp3 | opus | aac | wav (wav skips encoding)
+    tts_audio_format: str = field(
+        default_factory=lambda: os.getenv("TTS_AUDIO_FORMAT", "mp3").lower()
+    )
+    tts_audio_bitrate: str = field(
+        default_factory=lambda: os.getenv("TTS_AUDIO_BITRATE", "64k")
+    )
+
+    # Sentence-chunked synthesis: chunks are synthesized concurrently and
+    # can be streamed to clients before the whole slide is done
+    tts_chunking: bool = field(
+        default_factory=lambda: os.getenv("TTS_CHUNKING", "false").lower() == "true"
+    )
+    tts_chunk_max_chars: int = field(
+        default_factory=lambda: int(os.getenv("TTS_CHUNK_MAX_CHARS", "240"))
+    )
+    tts_stream_timeout_s: float = field(
+        default_factory=lambda: float(os.getenv("TTS_STREAM_TIMEOUT_S", "120"))
+    )
+
     kokoro_voice_default: str = "af_heart"
     dev_mode: bool = True
 
-    ffmpeg_max_concurrency: int = 2
+    # Machine-wide slots per external binary (shared by all workers via lock
+    # files), their timeouts, and the nice level they run at
+    proc_slots: dict[str, int] = field(
+        default_factory=lambda: {
+            "pdflatex": os.cpu_count() or 1,
+            "pdftoppm": max(1, (os.cpu_count() or 1) // 2),
+            "ffmpeg": max(1, (os.cpu_count() or 1) // 2),
+            "pandoc": max(1, (os.cpu_count() or 1) // 4),
+            **_parse_int_map(os.getenv("PROC_SLOTS", "")),
+        }
+    )
+    proc_timeouts: dict[str, int] = field(
+        default_factory=lambda: {
+            "pdflatex": 120,
+            "pdftoppm": 120,
+            "ffmpeg": 900,
+            "pandoc": 180,
+            **_parse_int_map(os.getenv("PROC_TIMEOUTS", "")),
+        }
+    )
+    proc_nice: int = field(default_factory=lambda: int(os.getenv("PROC_NICE", "10")))
+    proc_poll_interval_s: float = 0.05
+    # Slide clip encoding: "still" (few frames, long GOP) or "legacy" (30 fps)
+    video_encode_mode: str = field(
+        default_factory=lambda: os.getenv("VIDEO_ENCODE_MODE", "still").lower()
+    )
+    video_still_fps: int = field(
+        default_factory=lambda: int(os.getenv("VIDEO_STILL_FPS", "1"))
+    )
+    # How the final video is put together: "clips" (one MP4 per slide, then
+    # a stream-copy concat) or "single" (one ffmpeg run over all slides)
+    video_assembler: str = field(
+        default_factory=lambda: os.getenv("VIDEO_ASSEMBLER", "clips").lower()
+    )
 
     def __post_init__(self):
         # Ensure workspace structure
-        for sub in ("", "materials", "pngs", "audios", "videos"):
+        for sub in ("", "materials", "pngs", "audios", "videos", "cache"):
             path = self.workspace_root / sub
             path.mkdir(parents=True, exist_ok=True)
 
@@ -118,6 +404,8 @@ class Config:
         self.pngs_dir = self.workspace_root / "pngs"
         self.audios_dir = self.workspace_root / "audios"
         self.videos_dir = self.workspace_root / "videos"
+        self.cache_dir = self.workspace_root / "cache"
+        self.job_db_path = self.workspace_root / "jobs.sqlite3"
 
 
 # Instantiate global settings
@@ -0,0 +1,409 @@
+"""
+In-process background job engine.
+
+- Jobs live in a SQLite table under `workspace_root` (WAL mode), so all
+  Uvicorn workers on the box share one queue without Redis.
+- Every worker runs a dispatcher that claims queued jobs atomically
+  (`BEGIN IMMEDIATE`), highest priority first, then the owner with the
+  fewest running jobs, then oldest.
+- Heavy stages (llm, latex, raster, tts, video) run under `stage(name)`,
+  a per-worker pool sized so the whole box stays within the configured
+  budget.
+- Cancellation is a flag in the table; the worker running the job cancels
+  its task on the next dispatcher tick.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+from loguru import logger
+
+from src.config import settings
+from src.services import jobs
+from src.utils import metrics
+from src.utils.progress import ProgressCallback
+
+JobHandler = Callable[[str, dict[str, Any], ProgressCallback], Awaitable[Any]]
+
+_ACTIVE = ("pending", "queued", "running")
+
+_handlers: dict[str, JobHandler] = {}
+_tasks: dict[str, asyncio.Task] = {}
+_dispatcher: asyncio.Task | None = None
+_shutting_down = False
+
+
+def register(kind: str, handler: JobHandler) -> None:
+    """Make `kind` runnable; `handler(job_id, payload, progress)` returns the result."""
+    _handlers[kind] = handler
+
+
+# ─── Stage pools ──────────────────────────────────────────────────────────────
+_stage_pools: dict[str, asyncio.Semaphore] = {}
+
+
+def _stage_slots(name: str) -> int:
+    """
+    Per-worker share of the box-wide budget for `name`, rounded down so the
+    workers together never exceed it. Every worker keeps at least one slot,
+    so a budget below the worker count is overshot; the machine-wide
+    process scheduler (`procs`) still caps the subprocesses themselves.
+    """
+    budget = settings.stage_limits.get(name, 1)
+    workers = max(1, settings.uvicorn_workers)
+    return max(1, budget // workers)
+
+
+@asynccontextmanager
+async def stage(name: str):
+    """Hold one slot of the `name` stage pool while the block runs."""
+    sema = _stage_pools.setdefault(name, asyncio.Semaphore(_stage_slots(name)))
+    t0 = time.perf_counter()
+    async with sema:
+        metrics.observe(f"stage.{name}.queue_wait", time.perf_counter() - t0)
+        yield
+
+
+# ─── Persistence ──────────────────────────────────────────────────────────────
+@contextmanager
+def _db():
+    conn = sqlite3.connect(settings.job_db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_pid INTEGER,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+            """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, priority)"
+        )
+        yield conn
+    finally:
+        conn.close()
+
+
+def _insert(job_id: str, owner: str, kind: str, payload: dict, priority: int) -> None:
+    """
+    Claim `job_id` as `pending` (not yet runnable). Raises 404 if the id
+    belongs to another owner and 409 if it is still active. `_release`
+    makes it claimable once its log exists.
+    """
+    with _db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT owner, status FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row and row["owner"] != owner:
+            conn.execute("ROLLBACK")
+            raise HTTPException(status_code=404, detail="Job not found")
+        if row and row["status"] in _ACTIVE:
+            conn.execute("ROLLBACK")
+            raise HTTPException(status_code=409, detail="Job already in progress")
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO jobs
+                (id, owner, kind, payload, priority, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+            """,
+            (job_id, owner, kind, json.dumps(payload), priority, time.time()),
+        )
+        conn.execute("COMMIT")
+
+
+def _release(job_id: str) -> None:
+    with _db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued' WHERE id = ? AND status = 'pending'",
+            (job_id,),
+        )
+
+
+def _abandon(job_id: str, error: str) -> None:
+    """Fail a row `_insert` claimed but that never got released."""
+    with _db() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'error', finished_at = ?, error = ?
+            WHERE id = ? AND status = 'pending'
+            """,
+            (time.time(), error, job_id),
+        )
+
+
+def _claim(pid: int) -> sqlite3.Row | None:
+    """Atomically move the next eligible queued job to `running` for `pid`."""
+    with _db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            """
+            SELECT q.* FROM jobs q
+            WHERE q.status = 'queued'
+              AND (SELECT COUNT(*) FROM jobs r
+                   WHERE r.owner = q.owner AND r.status = 'running') < ?
+            ORDER BY q.priority DESC,
+                     (SELECT COUNT(*) FROM jobs r
+                      WHERE r.owner = q.owner AND r.status = 'running') ASC,
+                     q.created_at ASC
+            LIMIT 1
+            """,
+            (settings.job_max_running_per_user,),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ?
+                WHERE id = ?
+                """,
+                (time.time(), pid, row["id"]),
+            )
+        conn.execute("COMMIT")
+        return row
+
+
+def _finish(job_id: str, status: str, error: str | None = None) -> None:
+    with _db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+            (status, time.time(), error, job_id),
+        )
+
+
+def _requeue(job_ids: list[str]) -> None:
+    with _db() as conn:
+        conn.executemany(
+            """
+            UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL
+            WHERE id = ? AND status = 'running'
+            """,
+            [(j,) for j in job_ids],
+        )
+
+
+def _cancel_requested(pid: int) -> list[str]:
+    with _db() as conn:
+        rows = conn.execute(
+            """
+            SELECT id FROM jobs
+            WHERE status = 'running' AND worker_pid = ? AND cancel_requested = 1
+            """,
+            (pid,),
+        ).fetchall()
+    return [r["id"] for r in rows]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _reap_orphans() -> list[str]:
+    """Fail jobs left `running` by a worker process that no longer exists."""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT id, worker_pid FROM jobs WHERE status = 'running'"
+        ).fetchall()
+    orphans = [r["id"] for r in rows if not _pid_alive(r["worker_pid"])]
+    for job_id in orphans:
+        _finish(job_id, "error", "worker exited while running the job")
+    return orphans
+
+
+def _row(job_id: str) -> sqlite3.Row | None:
+    with _db() as conn:
+        return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+async def submit(
+    job_id: str,
+    owner: str,
+    kind: str,
+    payload: dict,
+    priority: int = 0,
+    accepted_event: str | None = None,
+) -> jobs.JobEvents:
+    """
+    Queue a job; it starts as soon as a worker has capacity.
+    `accepted_event`, if given, is logged before the job can start.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    # claim the row first (owner and activity checked in one transaction),
+    # so a concurrent or foreign resubmit can't reset a live log
+    await asyncio.to_thread(_insert, job_id, owner, kind, payload, priority)
+    try:
+        events = await jobs.create_job(job_id, owner, kind)
+        if accepted_event:
+            await events.emit(accepted_event, {"kind": kind})
+        await events.emit("queued", {"kind": kind, "priority": priority})
+    except BaseException:
+        await asyncio.to_thread(_abandon, job_id, "failed to queue the job")
+        raise
+    await asyncio.to_thread(_release, job_id)
+    metrics.incr("jobs.submitted")
+    return events
+
+
+async def status(job_id: str, owner: str) -> dict:
+    await jobs.get_job_meta(job_id, owner)
+    row = await asyncio.to_thread(_row, job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "priority": row["priority"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "error": row["error"],
+    }
+
+
+async def cancel(job_id: str, owner: str) -> dict:
+    """Cancel a queued job immediately, or flag a running one for its worker."""
+    await jobs.get_job_meta(job_id, owner)
+
+    def _mark() -> str | None:
+        with _db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            if row["status"] in ("pending", "queued"):
+                conn.execute(
+                    """
+                    UPDATE jobs SET status = 'cancelled', finished_at = ?
+                    WHERE id = ?
+                    """,
+                    (time.time(), job_id),
+                )
+            elif row["status"] == "running":
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,)
+                )
+            conn.execute("COMMIT")
+            return row["status"]
+
+    previous = await asyncio.to_thread(_mark)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if previous in ("pending", "queued"):
+        await jobs.JobEvents(job_id).emit("cancelled", {})
+    return await status(job_id, owner)
+
+
+# ─── Dispatcher ───────────────────────────────────────────────────────────────
+async def _run(row: sqlite3.Row) -> None:
+    job_id = row["id"]
+    events = jobs.JobEvents(job_id)
+    handler = _handlers.get(row["kind"])
+    await events.emit("started", {"pid": os.getpid()})
+    try:
+        if handler is None:
+            raise HTTPException(
+                status_code=500, detail=f"Unknown job kind {row['kind']}"
+            )
+        result = await handler(job_id, json.loads(row["payload"]), events)
+    except asyncio.CancelledError:
+        if _shutting_down:
+            await asyncio.to_thread(_requeue, [job_id])
+            await events.emit("requeued", {})
+        else:
+            await asyncio.to_thread(_finish, job_id, "cancelled")
+            await events.emit("cancelled", {})
+        raise
+    except HTTPException as exc:
+        await asyncio.to_thread(_finish, job_id, "error", str(exc.detail))
+        await events.emit("error", {"status": exc.status_code, "detail": exc.detail})
+        metrics.incr("jobs.failed")
+    except Exception as exc:
+        logger.exception("Job {} failed", job_id)
+        await asyncio.to_thread(_finish, job_id, "error", repr(exc))
+        await events.emit("error", {"status": 500, "detail": "Internal error"})
+        metrics.incr("jobs.failed")
+    else:
+        await asyncio.to_thread(_finish, job_id, "done")
+        await events.emit("done", {"result": result})
+        metrics.incr("jobs.done")
+    finally:
+        _tasks.pop(job_id, None)
+        metrics.set_gauge("jobs.running", len(_tasks))
+
+
+async def _tick(pid: int) -> None:
+    for job_id in await asyncio.to_thread(_cancel_requested, pid):
+        task = _tasks.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+
+    while len(_tasks) < settings.job_max_running_per_worker:
+        row = await asyncio.to_thread(_claim, pid)
+        if row is None:
+            break
+        _tasks[row["id"]] = asyncio.create_task(_run(row))
+        metrics.set_gauge("jobs.running", len(_tasks))
+
+
+async def _dispatch_loop() -> None:
+    pid = os.getpid()
+    while True:
+        try:
+            await _tick(pid)
+        except sqlite3.Error as exc:
+            logger.warning("Job dispatcher tick failed: {}", exc)
+        await asyncio.sleep(settings.job_poll_interval_s)
+
+
+async def start() -> None:
+    global _dispatcher, _shutting_down
+    _shutting_down = False
+    reaped = await asyncio.to_thread(_reap_orphans)
+    for job_id in reaped:
+        await jobs.JobEvents(job_id).emit(
+            "error", {"status": 500, "detail": "Job interrupted"}
+        )
+    _dispatcher = asyncio.create_task(_dispatch_loop())
+    logger.info("Job engine started (db={})", settings.job_db_path)
+
+
+async def stop() -> None:
+    """Stop claiming work; jobs still running here go back to the queue."""
+    global _dispatcher, _shutting_down
+    _shutting_down = True
+    if _dispatcher is not None:
+        _dispatcher.cancel()
+        await asyncio.gather(_dispatcher, return_exceptions=True)
+        _dispatcher = None
+    running = list(_tasks.values())
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,142 @@
+"""
+Job progress events for long-running builds.
+
+Each job appends JSON lines to `{workspace_root}/jobs/{job_id}/events.jsonl`.
+The file is the only shared state, so whichever Uvicorn worker receives the
+SSE request can tail a job that runs in another worker.
+"""
+
+import asyncio
+import fcntl
+import json
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import aiofiles
+from fastapi import HTTPException
+
+from src.config import settings
+
+TERMINAL_EVENTS = {"done", "error", "cancelled"}
+
+_POLL_INTERVAL_S = 0.25
+_HEARTBEAT_S = 15.0
+
+
+def job_dir(job_id: str) -> Path:
+    return settings.workspace_root / "jobs" / job_id
+
+
+def _events_path(job_id: str) -> Path:
+    return job_dir(job_id) / "events.jsonl"
+
+
+def _meta_path(job_id: str) -> Path:
+    return job_dir(job_id) / "meta.json"
+
+
+def _append_event(path: Path, event: str, data: dict[str, Any]) -> None:
+    """
+    Append one record under an exclusive lock; ids are the line number, so
+    they stay sequential even when several workers write to the same job.
+    """
+    with open(path, "a+", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            seq = sum(1 for _ in f) + 1
+            record = {"id": seq, "event": event, "ts": time.time(), "data": data}
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class JobEvents:
+    """
+    Append-only event log for one job. Instances are usable as a
+    `ProgressCallback`.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.path = _events_path(job_id)
+
+    async def __call__(self, event: str, data: dict[str, Any]) -> None:
+        await self.emit(event, data)
+
+    async def emit(self, event: str, data: dict[str, Any] | None = None) -> None:
+        await asyncio.to_thread(_append_event, self.path, event, data or {})
+
+
+async def create_job(job_id: str, owner_id: str, kind: str) -> JobEvents:
+    """Start (or restart) the event log for `job_id`, owned by `owner_id`."""
+    if _meta_path(job_id).exists():
+        await get_job_meta(job_id, owner_id)  # someone else's job → 404
+    d = job_dir(job_id)
+    d.mkdir(parents=True, exist_ok=True)
+    meta = {"job_id": job_id, "owner": owner_id, "kind": kind, "created": time.time()}
+    async with aiofiles.open(_meta_path(job_id), "w", encoding="utf-8") as f:
+        await f.write(json.dumps(meta))
+    async with aiofiles.open(_events_path(job_id), "w", encoding="utf-8") as f:
+        await f.write("")
+    return JobEvents(job_id)
+
+
+async def get_job_meta(job_id: str, owner_id: str) -> dict:
+    """Job metadata; 404 unless the job exists and belongs to `owner_id`."""
+    path = _meta_path(job_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Job not found")
+    async with aiofiles.open(path, "r", encoding="utf-8") as f:
+        meta = json.loads(await f.read())
+    if meta.get("owner") != owner_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return meta
+
+
+def _sse(record: dict) -> str:
+    return (
+        f"id: {record['id']}\n"
+        f"event: {record['event']}\n"
+        f"data: {json.dumps(record['data'])}\n\n"
+    )
+
+
+async def stream_events(job_id: str, last_event_id: int = 0) -> AsyncIterator[str]:
+    """
+    Yield the job's events as SSE frames, starting after `last_event_id`,
+    until a terminal event. Sends comment heartbeats while idle so proxies
+    keep the connection open.
+    """
+    path = _events_path(job_id)
+    offset = 0
+    buffer = ""
+    idle_since = time.monotonic()
+
+    while True:
+        if path.stat().st_size < offset:  # job was restarted, log truncated
+            offset, buffer = 0, ""
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            await f.seek(offset)
+            chunk = await f.read()
+            offset = await f.tell()
+
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")  # keep a partial trailing line
+        for line in lines:
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["id"] <= last_event_id:
+                continue
+            idle_since = time.monotonic()
+            yield _sse(record)
+            if record["event"] in TERMINAL_EVENTS:
+                return
+
+        if time.monotonic() - idle_since > _HEARTBEAT_S:
+            idle_since = time.monotonic()
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(_POLL_INTERVAL_S)
@@ -1,6 +1,5 @@
 from fastapi import HTTPException
 import base64
-import asyncio
 import subprocess
 import re
 from pathlib import Path
@@ -9,6 +8,7 @@ from typing import List, Dict, Any
 from loguru import logger
 
 from src.config import settings
+from src.utils import procs
 from src.utils.llm import call_llm_multimedia, load_prompt_template
 
 import aiofiles
@@ -21,7 +21,11 @@ async def _convert_to_pdf(path: Path) -> Path:
     """
     out = path.with_suffix(".pdf")
     cmd = [settings.pandoc_path, str(path), "-o", str(out)]
-    await asyncio.to_thread(subprocess.run, cmd, check=True)
+    result = await procs.run(cmd, binary="pandoc")
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(
+            result.returncode, cmd, result.stdout, result.stderr
+        )
     return out
 
 
@@ -86,6 +90,18 @@ async def prepare_payload(
     return payload
 
 
+def _match_deep_analysis(raw: str) -> re.Match:
+    m = re.search(
+        r"<<<ANALYSIS_START>>>(?P<analysis>.*?)<<<ANALYSIS_END>>>\s*"
+        r"<<<TOPICS_START>>>(?P<topics>.*?)<<<TOPICS_END>>>",
+        raw,
+        flags=re.DOTALL,
+    )
+    if not m:
+        raise ValueError("LLM output missing expected delimiters")
+    return m
+
+
 async def extract_materials_analysis(
     material_keys: List[str],
 ) -> str:
@@ -122,16 +138,8 @@ async def extract_and_structure(
     4) Return dict { extracted_content, topics_list }
     """
     content_array = await prepare_deep_payload(material_keys)
-    raw = await call_llm_multimedia(content_array)
-
-    m = re.search(
-        r"<<<ANALYSIS_START>>>(?P<analysis>.*?)<<<ANALYSIS_END>>>\s*"
-        r"<<<TOPICS_START>>>(?P<topics>.*?)<<<TOPICS_END>>>",
-        raw,
-        flags=re.DOTALL,
-    )
-    if not m:
-        raise ValueError("LLM output missing expected delimiters")
+    raw = await call_llm_multimedia(content_array, validate=_match_deep_analysis)
+    m = _match_deep_analysis(raw)
 
     return {
         "extracted_content": m.group("analysis").strip(),
@@ -8,17 +8,39 @@ import asyncio
 import subprocess
 
 from src.config import settings
-from src.services.tts import synthesize_text
-from src.utils.latex import compile_latex_with_retries
-from src.utils.llm import call_llm_text, load_prompt_template
+from src.services import job_engine
+from src.services.job_engine import stage
+from src.services.tts import synthesize_tts
+from src.utils import metrics, procs
+from src.utils.audio import find_slide_audio
+from src.utils.disk_cache import content_key
+from src.utils.locks import file_lock
+from src.utils.latex import (
+    BeamerStreamParser,
+    check_preamble,
+    compile_latex_with_retries,
+    compile_snippet,
+    sanitize_latex,
+)
+from src.utils.llm import call_llm_stream, call_llm_text, load_prompt_template
+from src.utils.progress import ProgressCallback, noop
 
 from src.utils.commands import (
     convert_pdf_to_pngs,
+    read_slide_manifest,
+    render_pdf_page,
     run_ffmpeg_async,
     build_slide_clip_cmd,
+    build_still_clip_cmd,
+    build_single_pass_cmd,
+    write_image_concat,
     build_concat_cmd,
 )
+import hashlib
 import json
+import os
+import shutil
+import time
 
 import re
 
@@ -31,14 +53,107 @@ async def _load_cached_content(job_id: str) -> str:
         return await f.read()
 
 
+def _strip_fences(latex: str) -> str:
+    if latex.lstrip().startswith("```"):
+        latex = latex.split("```")[1]
+    return latex
+
+
+async def _preview_frame(
+    job_id: str,
+    preamble: str,
+    index: int,
+    frame: str,
+    sema: asyncio.Semaphore,
+    progress: ProgressCallback,
+) -> None:
+    """
+    Compile one finished frame on its own and rasterise it to
+    /pngs/{job_id}/preview/frame_{index}.png.
+    """
+    async with sema:
+        workdir = settings.workspace_root / job_id / "preview"
+        frame, _ = sanitize_latex(frame, fragment=True, record=False)
+        pdf = await compile_snippet(preamble, frame, workdir, f"frame_{index}")
+        if pdf is None:
+            await progress("frame_preview_failed", {"index": index})
+            return
+        png = settings.pngs_dir / job_id / "preview" / f"frame_{index}.png"
+        await render_pdf_page(pdf, png)
+    await progress(
+        "frame_preview", {"index": index, "url": f"/pngs/{job_id}/preview/{png.name}"}
+    )
+
+
+async def _stop_previews(job_id: str, tasks: list[asyncio.Task]) -> None:
+    """Cancel outstanding preview compiles and drop their scratch dir."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    shutil.rmtree(settings.workspace_root / job_id / "preview", ignore_errors=True)
+
+
+async def _generate_latex_streaming(
+    job_id: str, prompt: str, progress: ProgressCallback
+) -> tuple[str, list[asyncio.Task]]:
+    """
+    Consume the Beamer document as it is generated. The preamble is
+    validated as soon as `\\begin{document}` arrives and every finished
+    frame is compiled and rasterised in the background, so the first
+    slides are viewable long before the model is done. Returns the full
+    document and the still-running preview tasks.
+    """
+    parser = BeamerStreamParser()
+    sema = asyncio.Semaphore(max(1, settings.beamer_preview_concurrency))
+    tasks: list[asyncio.Task] = []
+    t0 = time.perf_counter()
+
+    async def _check_preamble(preamble: str) -> None:
+        async with sema:
+            workdir = settings.workspace_root / job_id / "preview"
+            ok = await check_preamble(preamble, workdir)
+        await progress("latex_preamble", {"ok": ok})
+
+    try:
+        async for delta in call_llm_stream(prompt):
+            for kind, text in parser.feed(delta):
+                if kind == "preamble":
+                    tasks.append(asyncio.create_task(_check_preamble(text)))
+                else:
+                    index = len(parser.frames)
+                    if index == 1:
+                        metrics.observe("beamer.first_frame", time.perf_counter() - t0)
+                    tasks.append(
+                        asyncio.create_task(
+                            _preview_frame(
+                                job_id, parser.preamble, index, text, sema, progress
+                            )
+                        )
+                    )
+    except BaseException:
+        await _stop_previews(job_id, tasks)
+        raise
+
+    logger.info(
+        "Beamer stream finished for job {} ({} frames)", job_id, len(parser.frames)
+    )
+    return parser.text, tasks
+
+
 async def create_slides_from_outline(
-    job_id: str, outline: list[dict], cached=True
+    job_id: str,
+    outline: list[dict],
+    cached=True,
+    progress: ProgressCallback = noop,
 ) -> list[str]:
     """
     1. Try to load cached extracted_content (materials flow).
     2. Select the appropriate Beamer prompt.
     3. Call LLM to generate LaTeX, compile to PDF, convert to PNGs.
     4. Return the list of slide PNG URLs.
+
+    With `settings.beamer_streaming`, frames are previewed while the model
+    is still generating; the final full compile below stays authoritative.
     """
 
     # check if there are cached extracted materials
@@ -57,22 +172,32 @@ async def create_slides_from_outline(
         "{{outline}}", str(outline)
     )
 
-    latex = await call_llm_text(
-        prompt,
-        {},
-    )
-    if latex.lstrip().startswith("```"):
-        latex = latex.split("```")[1]
-
-    latex = re.sub(r"\\pause\s*", "", latex)  # scrub stray \pause commands
+    previews: list[asyncio.Task] = []
+    async with stage("llm"):
+        if settings.beamer_streaming:
+            latex, previews = await _generate_latex_streaming(job_id, prompt, progress)
+        else:
+            latex = _strip_fences(await call_llm_text(prompt, {}))
 
-    tex_dir = settings.workspace_root / job_id
-    tex_dir.mkdir(parents=True, exist_ok=True)
-    tex_path = tex_dir / "presentation.tex"
-    tex_path.write_text(latex, encoding="utf-8")
-
-    pdf_path = await compile_latex_with_retries(latex, job_id)
-    png_urls = await convert_pdf_to_pngs(pdf_path, job_id)
+    try:
+        latex, fired = sanitize_latex(latex)  # \pause, fences, unbalanced envs, ...
+        if fired:
+            await progress("latex_sanitized", {"attempt": 0, "rules": fired})
+        await progress("latex_generated", {"chars": len(latex)})
+
+        tex_dir = settings.workspace_root / job_id
+        tex_dir.mkdir(parents=True, exist_ok=True)
+        tex_path = tex_dir / "presentation.tex"
+        tex_path.write_text(latex, encoding="utf-8")
+
+        async with stage("latex"):
+            pdf_path = await compile_latex_with_retries(
+                latex, job_id, progress=progress
+            )
+        async with stage("raster"):
+            png_urls = await convert_pdf_to_pngs(pdf_path, job_id, progress=progress)
+    finally:
+        await _stop_previews(job_id, previews)
 
     logger.info("Generated {} slides for job {}", len(png_urls), job_id)
     return png_urls
@@ -87,8 +212,15 @@ async def generate_narrations(job_id: str) -> list[dict]:
     tpl = await load_prompt_template("narration_generator.prompt")
     prompt = tpl.replace("{{beamer_code}}", beamer_code)
 
-    raw = await call_llm_text(prompt, {"beamer_code": beamer_code})
+    # an answer that does not parse is not cached, so a retry asks again
+    async with stage("llm"):
+        raw = await call_llm_text(
+            prompt, {"beamer_code": beamer_code}, validate=_parse_narrations
+        )
+    return _parse_narrations(raw)
 
+
+def _parse_narrations(raw: str) -> list[dict]:
     # Strip leading/trailing Markdown code fences (``` or ```json)
     # 1. Remove opening fence
     raw_clean = re.sub(r"^```(?:\w+)?\s*\n?", "", raw)
@@ -102,13 +234,167 @@ async def generate_narrations(job_id: str) -> list[dict]:
         raise HTTPException(500, "Invalid JSON from narration LLM")
 
 
+async def build_presentation(
+    job_id: str,
+    outline: list[dict],
+    cached: bool,
+    voice: str,
+    progress: ProgressCallback = noop,
+) -> list[dict]:
+    """
+    Slides + narration + per-slide audio. Returns one entry per slide
+    (slideIndex, title, slide_png_url, audio_url, duration_s, plus
+    thumbnail_url / variants when rendered) in slide order.
+    """
+    # 1) Generate slides (topic-only or materials-based)
+    png_urls = await create_slides_from_outline(job_id, outline, cached, progress)
+
+    # 2) Generate slide narrations metadata
+    narrations = await generate_narrations(job_id)
+
+    if len(narrations) != len(png_urls):
+        raise HTTPException(
+            status_code=500,
+            detail="Mismatch between slides and narration count",
+        )
+    await progress("narration_generated", {"slides": len(narrations)})
+
+    logger.info(f"Generating TTS for {len(narrations)} slides (job {job_id})")
+
+    # 3) Synthesize TTS and assemble response
+    clips = await synthesize_narrations(job_id, narrations, voice, progress)
+
+    images = read_slide_manifest(job_id)
+    thumb_width = (
+        str(settings.raster_variant_widths[0])
+        if settings.raster_variant_widths
+        else None
+    )
+
+    results: list[dict] = []
+    for slide, clip in zip(narrations, clips):
+        idx = slide["slideIndex"]
+        try:
+            png_url = next(
+                u
+                for u in png_urls
+                if job_id in u and u.rsplit("/", 1)[-1].startswith(f"slide_{idx}.")
+            )
+        except StopIteration:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Could not find PNG for slide {idx}",
+            )
+
+        variants = images.get(idx, {}).get("variants", {})
+        results.append(
+            {
+                "slideIndex": idx,
+                "title": slide.get("title", ""),
+                "slide_png_url": png_url,
+                "audio_url": clip["url"],
+                "duration_s": clip["duration_s"],
+                "thumbnail_url": variants.get(thumb_width),
+                "variants": variants or None,
+            }
+        )
+
+    return results
+
+
+async def synthesize_narrations(
+    job_id: str,
+    narrations: list[dict],
+    voice: str,
+    progress: ProgressCallback = noop,
+) -> list[dict]:
+    """
+    Synthesize every slide's narration concurrently: at most
+    `tts_job_concurrency` per job; synthesis and encoding additionally
+    queue on the worker's "tts" / "encode" stage pools. Returns
+    {"url", "duration_s"} per slide in narration order.
+    """
+    job_sema = asyncio.Semaphore(max(1, settings.tts_job_concurrency))
+
+    async def _one(slide: dict) -> dict:
+        idx = slide["slideIndex"]
+        async with job_sema:
+            clip = await synthesize_tts(
+                slide.get("narration", ""), job_id, idx, voice, progress=progress
+            )
+        await progress("audio_synthesized", {"index": idx, **clip})
+        return clip
+
+    tasks = [asyncio.create_task(_one(slide)) for slide in narrations]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _clip_duration(audio_dir: Path, idx: int) -> float | None:
+    """Narration length recorded by the TTS encode stage, if any."""
+    try:
+        meta = json.loads((audio_dir / f"slide_{idx}.json").read_text())
+        return float(meta["duration_s"])
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+# Bump when the clip / assembly commands change output for the same inputs
+_VIDEO_FORMAT_VERSION = 1
+_CLIP_OFFSET_S = 0.5
+
+_stitching: dict[str, asyncio.Task] = {}
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _clip_key(png: Path, audio: Path, duration: float | None) -> str:
+    """Content hash of one slide's inputs plus everything that shapes its clip."""
+    return content_key(
+        _VIDEO_FORMAT_VERSION,
+        _file_digest(png),
+        _file_digest(audio),
+        duration,
+        _CLIP_OFFSET_S,
+        settings.video_encode_mode,
+        settings.video_still_fps,
+    )
+
+
 async def stitch_video(job_id: str) -> Path:
     """
-    Build every per-slide clip and concatenate them into the final video
+    Assemble slide PNGs + narration into videos/{job_id}.mp4, per
+    VIDEO_ASSEMBLER (per-slide clips, or a single ffmpeg pass).
+
+    Incremental: clips are keyed by their inputs' content, and an
+    up-to-date video is returned as is. Concurrent calls for one job share
+    a single build (in this worker via a shared task, across workers via a
+    lock file).
     """
+    task = _stitching.get(job_id)
+    if task is None:
+        task = asyncio.create_task(_stitch_video(job_id))
+        _stitching[job_id] = task
+        task.add_done_callback(lambda _: _stitching.pop(job_id, None))
+    # shielded: one caller going away must not cancel the others' build
+    return await asyncio.shield(task)
+
+
+async def _stitch_video(job_id: str) -> Path:
     png_dir = Path(settings.pngs_dir) / job_id
     audio_dir = Path(settings.workspace_root) / "audios" / job_id
-    clips_dir = Path(settings.workspace_root) / job_id / "clips"
+    work_dir = Path(settings.workspace_root) / job_id
     video_dir = Path(settings.videos_dir)
 
     # Validate & prepare directories
@@ -117,53 +403,169 @@ async def stitch_video(job_id: str) -> Path:
             raise HTTPException(
                 status_code=404, detail=f"{d.name.capitalize()} not found"
             )
-    clips_dir.mkdir(parents=True, exist_ok=True)
+    work_dir.mkdir(parents=True, exist_ok=True)
     video_dir.mkdir(parents=True, exist_ok=True)
 
-    # 1) Gather slide PNGs
+    # 1) Gather slide PNGs and their narration
     png_files = sorted(
-        png_dir.glob("slide_*.png"),
+        (p for p in png_dir.glob("slide_*") if p.suffix in (".png", ".jpg")),
         key=lambda p: int(p.stem.split("_")[1]),
     )
     if not png_files:
         raise HTTPException(status_code=404, detail="No slide PNGs found")
 
-    # 2) Launch clip-building tasks with concurrency limit
-    max_conc = max(1, getattr(settings, "ffmpeg_max_concurrency", 2))
-    sema = asyncio.Semaphore(max_conc)
-
-    tasks: list[asyncio.Task[tuple[int, Path]]] = []
-
+    slides: list[tuple[int, Path, Path, float | None]] = []
     for png in png_files:
         idx = int(png.stem.split("_")[1])
-        audio = audio_dir / f"slide_{idx}.mp3"
-        if not audio.exists():
+        audio = find_slide_audio(audio_dir, idx)
+        if audio is None:
             raise HTTPException(
                 status_code=404, detail=f"Missing audio for slide {idx}"
             )
+        slides.append((idx, png, audio, _clip_duration(audio_dir, idx)))
 
-        clip_path = clips_dir / f"clip_{idx:02d}.mp4"
-        cmd = build_slide_clip_cmd(png, audio, clip_path, offset=0.5)
+    assembler = settings.video_assembler
+    if assembler == "single" and any(d is None for *_, d in slides):
+        logger.warning(
+            "Job {}: narration durations missing, assembling from clips", job_id
+        )
+        assembler = "clips"
 
-        async def _make_clip(i=idx, c=clip_path, command=cmd):
-            async with sema:  # ← concurrency gate
+    # 2) Skip the build when the last one used exactly these inputs
+    output = video_dir / f"{job_id}.mp4"
+    manifest = work_dir / "video.json"
+    async with file_lock(work_dir / ".stitch.lock"):
+        keys = await asyncio.to_thread(
+            lambda: [_clip_key(png, audio, d) for _, png, audio, d in slides]
+        )
+        video_key = content_key(assembler, keys)
+        try:
+            built = json.loads(manifest.read_text()).get("key")
+        except (FileNotFoundError, ValueError):
+            built = None
+        if built == video_key and output.exists():
+            metrics.incr("video.reused")
+            return output
+
+        # 3) Assemble into a temp file, then publish atomically
+        tmp = output.with_name(f".{output.stem}.tmp.mp4")
+        try:
+            if assembler == "single":
+                await _assemble_single_pass(work_dir, slides, tmp)
+            else:
+                await _assemble_from_clips(work_dir / "clips", slides, keys, tmp)
+            os.replace(tmp, output)
+        finally:
+            tmp.unlink(missing_ok=True)
+        manifest.write_text(json.dumps({"key": video_key, "clips": keys}))
+        metrics.incr("video.built")
+
+    return output
+
+
+async def _assemble_from_clips(
+    clips_dir: Path,
+    slides: list[tuple[int, Path, Path, float | None]],
+    keys: list[str],
+    output: Path,
+) -> None:
+    """
+    Build the per-slide clips that don't exist yet (named by `keys`), then
+    stream-copy concatenate them; clips no longer referenced are removed.
+    """
+    clips_dir.mkdir(parents=True, exist_ok=True)
+
+    # Launch clip-building tasks; ffmpeg runs are capped machine-wide by
+    # the process scheduler, and per worker by the "video" stage
+    threads = procs.threads("ffmpeg")
+    tasks: list[asyncio.Task[tuple[int, Path]]] = []
+
+    for (idx, png, audio, duration), key in zip(slides, keys):
+        clip_path = clips_dir / f"{key}.mp4"
+        if clip_path.exists():
+            metrics.incr("video.clip.hit")
+            continue
+        metrics.incr("video.clip.miss")
+
+        tmp_clip = clips_dir / f".{key}.tmp.mp4"
+        if settings.video_encode_mode == "still":
+            cmd = build_still_clip_cmd(
+                png,
+                audio,
+                tmp_clip,
+                duration=duration,
+                offset=_CLIP_OFFSET_S,
+                fps=settings.video_still_fps,
+                threads=threads,
+            )
+        else:
+            cmd = build_slide_clip_cmd(
+                png, audio, tmp_clip, offset=_CLIP_OFFSET_S, threads=threads
+            )
+
+        async def _make_clip(tmp=tmp_clip, c=clip_path, command=cmd):
+            async with stage("video"):  # ← concurrency gate
                 await run_ffmpeg_async(command)
-            return i, c
+            os.replace(tmp, c)
 
         tasks.append(asyncio.create_task(_make_clip()))
 
-    # 3) Wait, sort, write concat list
-    results = await asyncio.gather(*tasks)
-    clip_paths = [clip for idx, clip in sorted(results, key=lambda x: x[0])]
+    # Wait, write concat list in slide order
+    await asyncio.gather(*tasks)
+    clip_paths = [clips_dir / f"{key}.mp4" for key in keys]
 
     list_file = clips_dir / "concat_list.txt"
     with list_file.open("w", encoding="utf-8") as f:
         for clip in clip_paths:
             f.write(f"file '{clip.as_posix()}'\n")
 
-    # 4) Concatenate
-    output = video_dir / f"{job_id}.mp4"
+    # Concatenate
     concat_cmd = build_concat_cmd(list_file, output)
-    await run_ffmpeg_async(concat_cmd)
+    async with stage("video"):
+        await run_ffmpeg_async(concat_cmd)
 
-    return output
+    for stale in set(clips_dir.glob("*.mp4")) - set(clip_paths):
+        stale.unlink(missing_ok=True)
+
+
+async def _assemble_single_pass(
+    work_dir: Path,
+    slides: list[tuple[int, Path, Path, float | None]],
+    output: Path,
+) -> None:
+    """
+    One ffmpeg run straight to `output`: no per-slide clips, no concat pass.
+    Needs every slide's narration duration.
+    """
+    offset = _CLIP_OFFSET_S
+    image_list = work_dir / "images.ffconcat"
+    write_image_concat(
+        [(png, offset + duration) for _, png, _, duration in slides], image_list
+    )
+    cmd = build_single_pass_cmd(
+        image_list,
+        [(audio, duration) for _, _, audio, duration in slides],
+        output,
+        offset=offset,
+        fps=settings.video_still_fps,
+        threads=procs.threads("ffmpeg"),
+    )
+    async with stage("video"):
+        await run_ffmpeg_async(cmd)
+
+
+# ─── Job engine handlers ──────────────────────────────────────────────────────
+async def _slides_job(job_id: str, payload: dict, progress: ProgressCallback):
+    return await create_slides_from_outline(
+        job_id, payload["outline"], payload["cached"], progress
+    )
+
+
+async def _presentation_job(job_id: str, payload: dict, progress: ProgressCallback):
+    return await build_presentation(
+        job_id, payload["outline"], payload["cached"], payload["voice"], progress
+    )
+
+
+job_engine.register("build_slides", _slides_job)
+job_engine.register("build_presentation", _presentation_job)
@@ -1,71 +1,318 @@
 import os
 import asyncio
+import json
+import re
+import shutil
+import time
 from pathlib import Path
+from typing import AsyncIterator
 
-import aiofiles
-from gradio_client import Client
+from loguru import logger
 
 from src.config import settings
+from src.services.job_engine import stage
+from src.services.tts_backends import close_tts_backend, get_tts_backend
+from src.utils import metrics
+from src.utils.audio import (
+    audio_ext,
+    concat_wavs,
+    find_slide_audio,
+    read_wav,
+    wav_duration,
+    wav_header,
+)
+from src.utils.commands import build_audio_encode_cmd, run_ffmpeg_async
+from src.utils.disk_cache import DiskCache, content_key
+from src.utils.progress import ProgressCallback, noop
 
-# ─── Lazy‐initialized Gradio client ───────────────────────────────────────────
-_client: Client | None = None
 
+# ─── Backend ──────────────────────────────────────────────────────────────────
+async def startup() -> None:
+    """Connect / load the configured engine so the first request doesn't pay for it."""
+    await get_tts_backend().startup()
 
-def get_kokoro_client() -> Client:
+
+async def shutdown() -> None:
+    await close_tts_backend()
+
+
+async def synthesize_text(text: str, voice: str, speed: float = 1.0) -> bytes:
+    """WAV bytes for `text` from the configured TTS backend."""
+    return await get_tts_backend().synthesize(text, voice, speed)
+
+
+# ─── Audio cache ──────────────────────────────────────────────────────────────
+_audio_cache = DiskCache(
+    "tts",
+    settings.cache_dir / "tts",
+    max_bytes=settings.tts_cache_max_mb * 1024 * 1024,
+    suffix=".wav",
+)
+_pending: dict[str, asyncio.Future] = {}
+
+
+def _normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic differences share a cache entry."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def audio_key(text: str, voice: str, speed: float) -> str:
+    backend = get_tts_backend().name
+    return content_key(backend, _normalize_text(text), voice, float(speed))
+
+
+async def synthesize_cached(text: str, voice: str, speed: float) -> Path:
+    """
+    Return the path of a cached WAV for (text, voice, speed), synthesizing it
+    on a miss. Concurrent misses for the same key in this process share one
+    synthesis.
+    """
+    key = audio_key(text, voice, speed)
+    if settings.tts_cache_enabled:
+        cached = await asyncio.to_thread(_audio_cache.get_path, key)
+        if cached is not None:
+            return cached
+
+    while (pending := _pending.get(key)) is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():  # we were cancelled, not the producer
+                raise
+
+    fut = asyncio.get_running_loop().create_future()
+    _pending[key] = fut
+    try:
+        async with stage("tts"):
+            audio_bytes = await synthesize_text(_normalize_text(text), voice, speed)
+        path = await asyncio.to_thread(_audio_cache.put_bytes, key, audio_bytes)
+        fut.set_result(path)
+        return path
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as exc:
+        fut.set_exception(exc)
+        fut.exception()  # don't warn when nobody else was waiting
+        raise
+    finally:
+        _pending.pop(key, None)
+
+
+def _link_into(src: Path, dest: Path) -> None:
+    """Hardlink `src` to `dest` (copy across filesystems), replacing `dest`."""
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+# ─── Encode stage ─────────────────────────────────────────────────────────────
+async def encode_clip(wav: Path, dest: Path, fmt: str, bitrate: str) -> None:
     """
-    Instantiate the Gradio Client on first use, avoiding network calls at import time.
-    Requires HF_KOKORO_REPO and HF_TOKEN environment variables.
+    Encode `wav` into `dest` in the delivery format, inside the "encode"
+    stage pool. `dest` appears atomically; "wav" is a plain hardlink.
     """
-    global _client
-    if _client is None:
-        repo = os.getenv("HF_KOKORO_REPO")
-        token = os.getenv("HF_TOKEN")
-        if not repo or not token:
-            raise RuntimeError(
-                "Environment variables HF_KOKORO_REPO and HF_TOKEN must be set"
-            )
-        _client = Client(repo, hf_token=token)
-    return _client
-
-
-# ─── Synchronous TTS helper ───────────────────────────────────────────────────
-def synthesize_text(text: str, voice: str) -> bytes:
+    if fmt == "wav":
+        await asyncio.to_thread(_link_into, wav, dest)
+        return
+    tmp = dest.with_name(f".{dest.stem}.tmp{dest.suffix}")
+    try:
+        async with stage("encode"):
+            t0 = time.perf_counter()
+            await run_ffmpeg_async(build_audio_encode_cmd(wav, tmp, fmt, bitrate))
+            metrics.observe("tts.encode", time.perf_counter() - t0)
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# ─── Sentence chunks ──────────────────────────────────────────────────────────
+def split_sentences(text: str, max_chars: int) -> list[str]:
     """
-    Calls the Kokoro-TTS Gradio API via Client.predict, reads the generated .wav file,
-    and returns its raw bytes.
+    Split narration at sentence boundaries, merging neighbours up to
+    `max_chars` so chunks stay long enough for natural prosody. A single
+    sentence longer than `max_chars` is kept whole.
     """
-    client = get_kokoro_client()
-    # client.predict returns (local_wav_path, phoneme_str)
-    audio_path, _ = client.predict(
-        text=text, voice=voice, speed=1, api_name="/generate_first"
+    sentences = re.split(r"(?<=[.!?;:])\s+", _normalize_text(text))
+    chunks: list[str] = []
+    for sentence in filter(None, sentences):
+        if chunks and len(chunks[-1]) + 1 + len(sentence) <= max_chars:
+            chunks[-1] += " " + sentence
+        else:
+            chunks.append(sentence)
+    return chunks or [""]
+
+
+def stream_url(job_id: str, slide_index: int) -> str:
+    return f"/presentation/jobs/{job_id}/audio/{slide_index}/stream"
+
+
+def _chunk_dir(job_id: str, slide_index: int) -> Path:
+    return (
+        Path(settings.workspace_root) / "audios" / job_id / "chunks" / str(slide_index)
     )
-    with open(audio_path, "rb") as f:
-        return f.read()
 
 
-# ─── Async wrapper that writes out .mp3 and returns a public URL ─────────────
-async def synthesize_tts(
+def has_chunk_stream(job_id: str, slide_index: int) -> bool:
+    """Whether a chunked synthesis was started for this slide."""
+    return (_chunk_dir(job_id, slide_index) / "manifest.json").exists()
+
+
+def finished_clip(job_id: str, slide_index: int) -> Path | None:
+    audio_dir = Path(settings.workspace_root) / "audios" / job_id
+    return find_slide_audio(audio_dir, slide_index)
+
+
+async def _pin_cached(text: str, voice: str, speed: float, dest: Path) -> None:
+    """
+    Hardlink the cached WAV for `text` to `dest`, so eviction can't pull it
+    while we still need it.
+    """
+    try:
+        await asyncio.to_thread(
+            _link_into, await synthesize_cached(text, voice, speed), dest
+        )
+    except FileNotFoundError:  # evicted by another worker in between
+        audio_bytes = await synthesize_text(_normalize_text(text), voice, speed)
+        await asyncio.to_thread(dest.write_bytes, audio_bytes)
+
+
+async def _synthesize_chunked(
     text: str,
     job_id: str,
     slide_index: int,
     voice: str,
-) -> str:
+    speed: float,
+    dest: Path,
+    progress: ProgressCallback = noop,
+) -> None:
     """
-    1. Run blocking TTS in a thread to get WAV bytes.
-    2. Write them as an .mp3 in {workspace_root}/audios/{job_id}/slide_{slide_index}.mp3.
-    3. Return the web-accessible path.
+    Synthesize sentence chunks concurrently, exposing each one as
+    `<chunk dir>/<n>.wav` as soon as it and all before it are ready, then
+    join them into `dest` without re-encoding.
+
+    `manifest.json` in the chunk dir tells streamers how many chunks to
+    expect and whether synthesis failed.
     """
-    # 1. Get raw audio bytes (WAV)
-    audio_bytes = await asyncio.to_thread(synthesize_text, text, voice)
+    chunks = split_sentences(text, settings.tts_chunk_max_chars)
+    chunk_dir = _chunk_dir(job_id, slide_index)
+    # chunks of a previous build must never reach a new stream
+    await asyncio.to_thread(shutil.rmtree, chunk_dir, True)
+    chunk_dir.mkdir(parents=True)
+    manifest = chunk_dir / "manifest.json"
+    await asyncio.to_thread(manifest.write_text, json.dumps({"chunks": len(chunks)}))
+
+    parts = [chunk_dir / f"{n}.wav" for n in range(len(chunks))]
+    # Synthesize into hidden names; expose in order so streamers never skip ahead
+    tasks = [
+        asyncio.create_task(
+            _pin_cached(chunk, voice, speed, part.with_name(f".{part.name}"))
+        )
+        for chunk, part in zip(chunks, parts)
+    ]
+    try:
+        for n, (task, part) in enumerate(zip(tasks, parts)):
+            await task
+            os.replace(part.with_name(f".{part.name}"), part)
+            if n == 0:
+                await progress(
+                    "audio_stream_ready",
+                    {"index": slide_index, "url": stream_url(job_id, slide_index)},
+                )
+        await asyncio.to_thread(concat_wavs, parts, dest)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(
+            manifest.write_text, json.dumps({"chunks": len(chunks), "failed": True})
+        )
+        raise
 
-    # 2. Prepare output directory
+
+async def stream_slide_audio(job_id: str, slide_index: int) -> AsyncIterator[bytes]:
+    """
+    Stream a slide's narration as one WAV while its chunks are still being
+    synthesized (possibly by another worker): the header goes out with the
+    first chunk, then each chunk's samples in order. Ends early if
+    synthesis fails or nothing new shows up within TTS_STREAM_TIMEOUT_S.
+    """
+    chunk_dir = _chunk_dir(job_id, slide_index)
+    manifest = chunk_dir / "manifest.json"
+    expected: int | None = None
+    n = 0
+    deadline = time.monotonic() + settings.tts_stream_timeout_s
+    while expected is None or n < expected:
+        part = chunk_dir / f"{n}.wav"
+        if part.exists():
+            fmt, data = await asyncio.to_thread(read_wav, part)
+            if n == 0:
+                yield wav_header(fmt)
+            yield data
+            n += 1
+            deadline = time.monotonic() + settings.tts_stream_timeout_s
+            continue
+        if manifest.exists():
+            meta = json.loads(manifest.read_text())
+            if meta.get("failed"):
+                return
+            expected = meta["chunks"]
+            if n >= expected:
+                break
+        if time.monotonic() > deadline:
+            logger.warning("Audio stream {}/{} timed out", job_id, slide_index)
+            return
+        await asyncio.sleep(settings.job_poll_interval_s)
+
+
+# ─── Async wrapper that writes out the slide audio and returns its URL ───────
+async def synthesize_tts(
+    text: str,
+    job_id: str,
+    slide_index: int,
+    voice: str,
+    speed: float | None = None,
+    progress: ProgressCallback = noop,
+) -> dict:
+    """
+    1. Look the clip up in the audio cache, synthesizing it on a miss
+       (retrying transient errors). With TTS_CHUNKING, sentence chunks are
+       synthesized concurrently and streamable as they complete; an
+       `audio_stream_ready` event carries the stream URL.
+    2. Encode it as {workspace_root}/audios/{job_id}/slide_{slide_index}.<ext>
+       in TTS_AUDIO_FORMAT, with a slide_{slide_index}.json duration sidecar.
+    3. Return {"url", "duration_s"}.
+    """
+    speed = settings.tts_speed if speed is None else speed
+    fmt, bitrate = settings.tts_audio_format, settings.tts_audio_bitrate
     out_dir = Path(settings.workspace_root) / "audios" / job_id
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # 3. Write out as .mp3
-    output_path = out_dir / f"slide_{slide_index}.mp3"
-    async with aiofiles.open(output_path, "wb") as f:
-        await f.write(audio_bytes)
+    # 1. Pin the cached WAV (or the joined chunks) next to the output
+    src = out_dir / f".slide_{slide_index}.src.wav"
+    if settings.tts_chunking:
+        await _synthesize_chunked(
+            text, job_id, slide_index, voice, speed, src, progress
+        )
+    else:
+        # a previous chunked build's stream would be stale now
+        await asyncio.to_thread(shutil.rmtree, _chunk_dir(job_id, slide_index), True)
+        await _pin_cached(text, voice, speed, src)
+
+    # 2. Encode + record duration
+    name = f"slide_{slide_index}.{audio_ext(fmt)}"
+    try:
+        duration = await asyncio.to_thread(wav_duration, src)
+        await encode_clip(src, out_dir / name, fmt, bitrate)
+    finally:
+        src.unlink(missing_ok=True)
+
+    meta = {"format": fmt, "bitrate": bitrate, "duration_s": round(duration, 3)}
+    await asyncio.to_thread(
+        (out_dir / f"slide_{slide_index}.json").write_text, json.dumps(meta)
+    )
 
-    # 4. Return the public-facing path
-    return f"/audios/{job_id}/slide_{slide_index}.mp3"
+    # 3. Return the public-facing path
+    return {"url": f"/audios/{job_id}/{name}", "duration_s": meta["duration_s"]}
@@ -0,0 +1,273 @@
+"""
+Text-to-speech backends.
+
+Every backend turns (text, voice, speed) into WAV bytes through one async
+`synthesize` call and owns its own concurrency limit (and retries, where
+the engine is remote). `settings.tts_backend` picks one:
+
+- "gradio": the hosted Kokoro Space (HF_KOKORO_REPO / HF_TOKEN);
+- "local":  Kokoro loaded in-process on CPU (`pip install .[local-tts]`),
+            warmed up at startup so the first request doesn't pay for it;
+- "fake":   deterministic silence, for tests and benchmarks.
+"""
+
+import asyncio
+import os
+import random
+import struct
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from gradio_client import Client
+from loguru import logger
+
+from src.config import settings
+from src.utils import http, metrics
+
+SAMPLE_RATE = 24000  # Kokoro's native rate
+
+
+def _pcm16_wav(samples: bytes, rate: int = SAMPLE_RATE) -> bytes:
+    """Mono 16-bit PCM WAV around raw little-endian samples."""
+    fmt = struct.pack("<HHIIHH", 1, 1, rate, rate * 2, 2, 16)
+    return (
+        struct.pack("<4sI4s", b"RIFF", 4 + 8 + len(fmt) + 8 + len(samples), b"WAVE")
+        + struct.pack("<4sI", b"fmt ", len(fmt))
+        + fmt
+        + struct.pack("<4sI", b"data", len(samples))
+        + samples
+    )
+
+
+class TTSBackend(ABC):
+    #: Goes into the audio cache key, so engines never share entries
+    name: str
+
+    @abstractmethod
+    async def synthesize(self, text: str, voice: str, speed: float) -> bytes:
+        """Return WAV bytes for `text`."""
+
+    async def startup(self) -> None:
+        """Connect / load / warm up ahead of the first request."""
+
+    async def aclose(self) -> None:
+        """Release clients, threads and models."""
+
+
+# ─── Hosted Kokoro Space ──────────────────────────────────────────────────────
+class GradioTTSBackend(TTSBackend):
+    """
+    Kokoro behind a Hugging Face Gradio Space. `Client.predict` is blocking,
+    so calls run in threads, at most `concurrency` at a time. Connection
+    errors and timeouts (cold start, flaky network) are retried with
+    jittered exponential backoff; errors raised by the Space itself (bad
+    voice, text too long) are deterministic and fail at once.
+    """
+
+    name = "kokoro-gradio"
+    transient_errors = (
+        httpx.TransportError,
+        ConnectionError,
+        TimeoutError,
+    )
+
+    def __init__(self, repo: str | None, token: str | None, concurrency: int):
+        self._repo = repo
+        self._token = token
+        self._client: Client | None = None
+        self._sema = asyncio.Semaphore(max(1, concurrency))
+
+    def _get_client(self) -> Client:
+        """
+        Instantiate the Gradio Client on first use. It keeps its own (sync)
+        keep-alive session for the app lifetime; timeouts and its worker cap
+        follow the outbound HTTP settings.
+        """
+        if self._client is None:
+            if not self._repo or not self._token:
+                raise RuntimeError(
+                    "Environment variables HF_KOKORO_REPO and HF_TOKEN must be set"
+                )
+            self._client = Client(
+                self._repo,
+                hf_token=self._token,
+                max_workers=settings.http_per_host_limit,
+                httpx_kwargs={"timeout": http.timeout()},
+                verbose=False,
+            )
+        return self._client
+
+    def _predict(self, text: str, voice: str, speed: float) -> bytes:
+        # client.predict returns (local_wav_path, phoneme_str)
+        audio_path, _ = self._get_client().predict(
+            text=text, voice=voice, speed=speed, api_name="/generate_first"
+        )
+        with open(audio_path, "rb") as f:
+            return f.read()
+
+    async def synthesize(self, text: str, voice: str, speed: float) -> bytes:
+        delay = settings.tts_retry_base_delay_s
+        for attempt in range(1, settings.tts_max_attempts + 1):
+            try:
+                async with self._sema:
+                    return await asyncio.to_thread(self._predict, text, voice, speed)
+            except self.transient_errors as exc:
+                if attempt == settings.tts_max_attempts:
+                    raise
+                metrics.incr("tts.retry")
+                logger.warning(
+                    "TTS attempt {} failed ({}); retrying in ~{:.1f}s",
+                    attempt,
+                    exc,
+                    delay,
+                )
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+        raise AssertionError("unreachable")
+
+    async def startup(self) -> None:
+        if not (self._repo and self._token):
+            return
+        try:
+            await asyncio.to_thread(self._get_client)
+        except Exception as exc:  # keep serving; we retry lazily on first use
+            logger.warning("Kokoro client warm-up failed: {}", exc)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await asyncio.to_thread(self._client.close)
+            self._client = None
+
+
+# ─── In-process Kokoro (CPU) ──────────────────────────────────────────────────
+class LocalKokoroBackend(TTSBackend):
+    """
+    Kokoro loaded in this worker. Inference is CPU-bound and the pipeline
+    synthesizes one utterance at a time, so requests run on a dedicated
+    executor of `workers` threads rather than the shared default pool;
+    concurrent callers simply queue for it.
+    """
+
+    name = "kokoro-local"
+
+    def __init__(self, lang_code: str, workers: int):
+        self._lang_code = lang_code
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="kokoro"
+        )
+        self._pipeline = None
+        self._load_lock = asyncio.Lock()
+
+    def _load(self):
+        try:
+            from kokoro import KPipeline
+        except ImportError as exc:
+            raise RuntimeError(
+                "TTS_BACKEND=local needs the optional Kokoro dependency: "
+                "pip install '.[local-tts]'"
+            ) from exc
+        t0 = time.perf_counter()
+        pipeline = KPipeline(lang_code=self._lang_code)
+        logger.info("Kokoro pipeline loaded in {:.1f}s", time.perf_counter() - t0)
+        return pipeline
+
+    async def _get_pipeline(self):
+        if self._pipeline is None:
+            async with self._load_lock:
+                if self._pipeline is None:
+                    loop = asyncio.get_running_loop()
+                    self._pipeline = await loop.run_in_executor(
+                        self._executor, self._load
+                    )
+        return self._pipeline
+
+    @staticmethod
+    def _render(pipeline, text: str, voice: str, speed: float) -> bytes:
+        import numpy as np
+
+        segments = [
+            np.asarray(audio, dtype=np.float32)
+            for _, _, audio in pipeline(text, voice=voice, speed=speed)
+            if audio is not None
+        ]
+        samples = np.concatenate(segments) if segments else np.zeros(0, np.float32)
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+        return _pcm16_wav(pcm.tobytes())
+
+    async def synthesize(self, text: str, voice: str, speed: float) -> bytes:
+        pipeline = await self._get_pipeline()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._render, pipeline, text, voice, speed
+        )
+
+    async def startup(self) -> None:
+        try:
+            t0 = time.perf_counter()
+            await self.synthesize("Warming up.", settings.kokoro_voice_default, 1.0)
+            logger.info("Kokoro warm-up took {:.1f}s", time.perf_counter() - t0)
+        except Exception as exc:  # keep serving; load is retried on first use
+            logger.warning("Kokoro warm-up failed: {}", exc)
+
+    async def aclose(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pipeline = None
+
+
+# ─── Deterministic fake ───────────────────────────────────────────────────────
+class FakeTTSBackend(TTSBackend):
+    """
+    Silent WAVs whose length depends only on the text (`seconds_per_word`,
+    scaled by speed), after `latency_s` of simulated work in a thread.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_s: float = 0.0, seconds_per_word: float = 0.25):
+        self.latency_s = latency_s
+        self.seconds_per_word = seconds_per_word
+
+    def _render(self, text: str, speed: float) -> bytes:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        seconds = self.seconds_per_word * len(text.split()) / (speed or 1.0)
+        return _pcm16_wav(b"\0\0" * int(seconds * SAMPLE_RATE))
+
+    async def synthesize(self, text: str, voice: str, speed: float) -> bytes:
+        return await asyncio.to_thread(self._render, text, speed)
+
+
+# ─── Backend selection ────────────────────────────────────────────────────────
+_backend: TTSBackend | None = None
+
+
+def get_tts_backend() -> TTSBackend:
+    """Build the configured backend on first use (`settings.tts_backend`)."""
+    global _backend
+    if _backend is None:
+        kind = settings.tts_backend.lower()
+        if kind == "gradio":
+            _backend = GradioTTSBackend(
+                os.getenv("HF_KOKORO_REPO"),
+                os.getenv("HF_TOKEN"),
+                settings.tts_gradio_concurrency,
+            )
+        elif kind == "local":
+            _backend = LocalKokoroBackend(
+                settings.tts_local_lang, settings.tts_local_workers
+            )
+        elif kind == "fake":
+            _backend = FakeTTSBackend(settings.tts_fake_latency_ms / 1000)
+        else:
+            raise RuntimeError(f"Unknown TTS_BACKEND: {settings.tts_backend}")
+        logger.info("TTS backend: {}", type(_backend).__name__)
+    return _backend
+
+
+async def close_tts_backend() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.aclose()
+        _backend = None
@@ -0,0 +1,117 @@
+"""
+Small helpers for the narration audio we deliver: container/extension per
+configured format and WAV header handling (so clip durations never need
+an ffprobe round-trip, and sentence chunks join without re-encoding).
+"""
+
+import struct
+from pathlib import Path
+
+from src.config import settings
+
+# format → (file extension, ffmpeg encoder args)
+AUDIO_FORMATS: dict[str, tuple[str, list[str]]] = {
+    "mp3": ("mp3", ["-c:a", "libmp3lame"]),
+    "opus": ("opus", ["-c:a", "libopus", "-application", "voip"]),
+    "aac": ("m4a", ["-c:a", "aac", "-movflags", "+faststart"]),
+    "wav": ("wav", []),
+}
+
+
+def audio_ext(fmt: str | None = None) -> str:
+    """File extension for `fmt` (default: TTS_AUDIO_FORMAT)."""
+    fmt = fmt or settings.tts_audio_format
+    try:
+        return AUDIO_FORMATS[fmt][0]
+    except KeyError:
+        raise ValueError(f"Unsupported audio format: {fmt!r}") from None
+
+
+# Size placeholder for WAVs streamed before their length is known
+STREAMING_SIZE = 0xFFFFFFFF
+
+
+def _wav_layout(path: Path) -> tuple[bytes, int, int]:
+    """(fmt chunk payload, data offset, data size) of a RIFF/WAVE file."""
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path} is not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path}: data chunk before fmt chunk")
+                if size in (0, STREAMING_SIZE):  # streamed WAV, size left unset
+                    size = path.stat().st_size - f.tell()
+                return fmt, f.tell(), size
+            else:
+                f.seek(size, 1)
+            if size % 2:  # chunks are word-aligned
+                f.seek(1, 1)
+
+
+def wav_duration(path: Path) -> float:
+    """
+    Duration in seconds from a RIFF/WAVE header: data chunk size over the
+    fmt chunk's byte rate. Works for PCM and float WAVs alike.
+    """
+    fmt, _, size = _wav_layout(path)
+    return size / struct.unpack("<I", fmt[8:12])[0]
+
+
+def read_wav(path: Path) -> tuple[bytes, bytes]:
+    """(fmt chunk payload, sample data)."""
+    fmt, offset, size = _wav_layout(path)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return fmt, f.read(size)
+
+
+def wav_header(fmt: bytes, data_size: int = STREAMING_SIZE) -> bytes:
+    """RIFF header + fmt chunk + data chunk header for `data_size` bytes."""
+    riff_size = (
+        STREAMING_SIZE
+        if data_size == STREAMING_SIZE
+        else 4 + 8 + len(fmt) + 8 + data_size
+    )
+    return (
+        struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE")
+        + struct.pack("<4sI", b"fmt ", len(fmt))
+        + fmt
+        + struct.pack("<4sI", b"data", data_size)
+    )
+
+
+def concat_wavs(paths: list[Path], dest: Path) -> None:
+    """Join WAVs sharing one sample format by appending their sample data."""
+    fmt = None
+    parts = []
+    for path in paths:
+        chunk_fmt, data = read_wav(path)
+        if fmt is not None and chunk_fmt != fmt:
+            raise ValueError(f"{path}: sample format differs from {paths[0]}")
+        fmt = chunk_fmt
+        parts.append(data)
+    if fmt is None:
+        raise ValueError("nothing to concatenate")
+    with open(dest, "wb") as f:
+        f.write(wav_header(fmt, sum(len(p) for p in parts)))
+        for data in parts:
+            f.write(data)
+
+
+def find_slide_audio(audio_dir: Path, slide_index: int) -> Path | None:
+    """The slide's narration file, preferring the configured format."""
+    exts = [audio_ext()] + [ext for ext, _ in AUDIO_FORMATS.values()]
+    for ext in dict.fromkeys(exts):
+        path = audio_dir / f"slide_{slide_index}.{ext}"
+        if path.exists():
+            return path
+    return None
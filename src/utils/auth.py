@@ -1,13 +1,19 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import date
 
 import httpx
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from loguru import logger
 from pydantic import BaseModel
-from supabase import Client, create_client
 
 from src.config import settings
+from src.utils import http, metrics
+from src.utils.quota import QuotaExceeded, get_quota_backend
 
 
 # data models
@@ -26,7 +32,150 @@ class User(BaseModel):
 _auth_scheme = HTTPBearer(auto_error=True)
 
 
-async def verify_token(token: str) -> dict:
+def _http_client() -> httpx.AsyncClient:
+    """Client used for the Supabase auth endpoints (shared pool, never closed here)."""
+    return http.get_client()
+
+
+def _forbidden(detail: str = "Invalid or expired access token") -> HTTPException:
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+# not a verdict on the token: the key may just not be in our JWKS copy yet
+_UNKNOWN_KID = "Unknown token signing key"
+
+
+class _LocalVerificationUnavailable(Exception):
+    """
+    Raised when a token cannot be checked locally (unknown `kid`, JWKS
+    unreachable, non-JWKS algorithm). Carries the error we would return if
+    the remote fallback is disabled.
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# ─── JWKS cache ───────────────────────────────────────────────────────────────
+class _JWKSCache:
+    """
+    In-process copy of the Supabase JWKS.
+
+    Keys are re-fetched once `ttl` seconds have passed, or earlier when a
+    token carries a `kid` we do not know. Either way at most once per
+    `min_refresh_interval`, so bogus tokens or a JWKS outage cannot hammer
+    the endpoint. A failed refresh keeps serving the previous key set.
+    """
+
+    def __init__(self, url: str, ttl: float, min_refresh_interval: float):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at > self.ttl
+
+    async def _refresh(self) -> None:
+        self._attempted_at = time.monotonic()
+        try:
+            resp = await _http_client().get(self.url, timeout=10)
+            resp.raise_for_status()
+            keys: dict[str, jwt.PyJWK] = {}
+            for jwk in resp.json().get("keys", []):
+                try:
+                    key = jwt.PyJWK(jwk)
+                except jwt.PyJWTError as exc:
+                    logger.debug("Skipping unusable JWK {}: {}", jwk.get("kid"), exc)
+                    continue
+                keys[jwk.get("kid", "")] = key
+        except (httpx.HTTPError, ValueError) as exc:
+            logger.warning("JWKS refresh from {} failed: {}", self.url, exc)
+            return
+
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        logger.debug("JWKS refreshed ({} keys)", len(keys))
+
+    async def get_key(self, kid: str) -> jwt.PyJWK | None:
+        key = self._keys.get(kid)
+        if key is not None and not self._is_stale():
+            return key
+
+        async with self._lock:
+            key = self._keys.get(kid)
+            if key is not None and not self._is_stale():
+                return key  # another request refreshed while we waited
+
+            # stale or not, refetch at most once per interval; a failed
+            # refresh keeps serving the old keys until the next attempt
+            since_attempt = time.monotonic() - self._attempted_at
+            if since_attempt > self.min_refresh_interval:
+                await self._refresh()
+
+            if not self._keys:
+                raise _LocalVerificationUnavailable(
+                    status.HTTP_503_SERVICE_UNAVAILABLE,
+                    "Authentication keys unavailable",
+                )
+            return self._keys.get(kid)
+
+
+_jwks = _JWKSCache(
+    settings.supabase_jwk_url,
+    ttl=settings.jwks_cache_ttl_s,
+    min_refresh_interval=settings.jwks_min_refresh_interval_s,
+)
+
+
+async def _verify_local(token: str) -> dict:
+    """
+    Verify signature and claims against the cached JWKS.
+    Returns the same shape as `/auth/v1/user` (`id`, `email`, `role`).
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError:
+        raise _forbidden("Malformed access token")
+
+    kid = header.get("kid")
+    if not kid:
+        # legacy HS256 tokens are signed with the project secret, not a JWK
+        raise _LocalVerificationUnavailable(
+            status.HTTP_403_FORBIDDEN, "Unsupported access token"
+        )
+
+    key = await _jwks.get_key(kid)
+    if key is None:
+        raise _LocalVerificationUnavailable(status.HTTP_403_FORBIDDEN, _UNKNOWN_KID)
+
+    try:
+        claims = jwt.decode(
+            token,
+            key=key.key,
+            algorithms=[key.algorithm_name],
+            audience=settings.jwt_audience,
+            leeway=settings.jwt_leeway_s,
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.PyJWTError as exc:
+        logger.warning("Local token verification failed – {}", exc)
+        raise _forbidden()
+
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "role": claims.get("role"),
+        "exp": claims["exp"],
+    }
+
+
+async def _verify_remote(token: str) -> dict:
     """
     Call Supabase `/auth/v1/user` to validate JWT bearer token.
     Returns raw user JSON on success, raises HTTPException on failure.
@@ -37,38 +186,163 @@ async def verify_token(token: str) -> dict:
         "apikey": settings.supabase_anon_key,  # public anon key is required
     }
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=headers, timeout=10)
+    try:
+        resp = await _http_client().get(url, headers=headers, timeout=10)
+    except httpx.HTTPError as exc:
+        logger.warning("Supabase /auth/v1/user unreachable – {}", exc)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service unavailable",
+        )
+
+    if resp.status_code >= 500:
+        logger.warning("Supabase /auth/v1/user returned {}", resp.status_code)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service unavailable",
+        )
 
     if resp.status_code != 200:
         logger.warning(
-            "Supabase token verification failed – %s %s", resp.status_code, resp.text
-        )
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Invalid or expired access token",
+            "Supabase token verification failed – {} {}", resp.status_code, resp.text
         )
+        raise _forbidden()
 
     data = resp.json()
     if not data or "id" not in data:
-        logger.warning("Supabase /auth/v1/user payload unexpected: %s", data)
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Malformed token payload",
-        )
+        logger.warning("Supabase /auth/v1/user payload unexpected: {}", data)
+        raise _forbidden("Malformed token payload")
 
     return data
 
 
+async def verify_token(token: str) -> dict:
+    """
+    Validate a Supabase access token.
+
+    By default the JWT is verified locally against the cached JWKS
+    (`settings.supabase_jwk_url`). `auth_mode="remote"` always asks
+    `/auth/v1/user`; `auth_remote_fallback` only asks it when local
+    verification cannot decide. Raises HTTPException on failure.
+    """
+    if settings.auth_mode == "remote":
+        return await _verify_remote(token)
+
+    try:
+        return await _verify_local(token)
+    except _LocalVerificationUnavailable as exc:
+        if not settings.auth_remote_fallback:
+            logger.warning("Local token verification unavailable – {}", exc.detail)
+            raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+        logger.info("Falling back to /auth/v1/user ({})", exc.detail)
+        return await _verify_remote(token)
+
+
+# ─── Verified-token cache ─────────────────────────────────────────────────────
+class _TokenCache:
+    """
+    Bounded LRU of verification results keyed by the token's SHA-256.
+
+    Accepted tokens map to their `User` until the earlier of `ttl` and the
+    token's own `exp`; tokens rejected on their signature or claims map to
+    the (status, detail) we raised, for `negative_ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[str, tuple[float, User | tuple[int, str]]] = (
+            OrderedDict()
+        )
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> User | tuple[int, str] | None:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, token: str, expires_at: float, value) -> None:
+        key = self._key(token)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put_user(self, token: str, user: User, exp: float | None) -> None:
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        self._put(token, expires_at, user)
+
+    def put_rejection(self, token: str, status_code: int, detail: str) -> None:
+        self._put(token, time.time() + self.negative_ttl, (status_code, detail))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_token_cache = _TokenCache(
+    max_entries=settings.token_cache_max_entries,
+    ttl=settings.token_cache_ttl_s,
+    negative_ttl=settings.token_cache_negative_ttl_s,
+)
+
+
+def _unverified_exp(token: str) -> float | None:
+    """Read `exp` without checking the signature (only used to bound caching)."""
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+    return float(exp) if exp is not None else None
+
+
 async def get_current_user(
     cred: HTTPAuthorizationCredentials = Depends(_auth_scheme),
 ) -> User:
     """
     FastAPI dependency.
     On success returns a `User` instance; otherwise raises 403/401.
+    Results are served from `_token_cache` while still valid.
     """
-    raw = await verify_token(cred.credentials)
-    return User(id=raw["id"], email=raw.get("email"), role=raw.get("role"))
+    token = cred.credentials
+    cached = _token_cache.get(token)
+    if isinstance(cached, User):
+        metrics.incr("auth.token_cache.hit")
+        return cached
+    if cached is not None:
+        metrics.incr("auth.token_cache.negative_hit")
+        raise HTTPException(status_code=cached[0], detail=cached[1])
+    metrics.incr("auth.token_cache.miss")
+
+    try:
+        raw = await verify_token(token)
+    except HTTPException as exc:
+        # only cache verdicts on the token itself, not upstream outages or
+        # a signing key we have not fetched yet (key rotation)
+        if exc.status_code == status.HTTP_403_FORBIDDEN and exc.detail != _UNKNOWN_KID:
+            _token_cache.put_rejection(token, exc.status_code, exc.detail)
+        raise
+
+    user = User(id=raw["id"], email=raw.get("email"), role=raw.get("role"))
+    exp = raw.get("exp") or _unverified_exp(token)
+    _token_cache.put_user(token, user, exp)
+    metrics.set_gauge("auth.token_cache.size", len(_token_cache))
+    return user
 
 
 # day generation cap
@@ -76,38 +350,17 @@ async def check_generation_limit(user: User = Depends(get_current_user)) -> None
     """
     Dependency to ensure the caller has not exceeded
     `settings.max_gen_per_day` slide / presentation builds today.
+    Counting and checking happen atomically in the quota backend.
     """
-    supabase: Client = create_client(
-        settings.supabase_url, settings.supabase_service_key
-    )
-    today = date.today().isoformat()
-
-    # Fetch current count
-    res = (
-        supabase.table("daily_generations")
-        .select("count")
-        .eq("user_id", user.id)
-        .eq("generation_date", today)
-        .execute()
-    )
-
-    current = res.data[0]["count"] if res.data else 0
-
     if settings.dev_mode:
         return
 
-    if current >= settings.max_gen_per_day:
+    try:
+        await get_quota_backend().increment_and_check(
+            user.id, date.today().isoformat(), settings.max_gen_per_day
+        )
+    except QuotaExceeded:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=f"Daily generation limit ({settings.max_gen_per_day}) reached",
         )
-
-    # Upsert with incremented count
-    if current == 0:
-        supabase.table("daily_generations").insert(
-            {"user_id": user.id, "generation_date": today, "count": 1}
-        ).execute()
-    else:
-        supabase.table("daily_generations").update({"count": current + 1}).eq(
-            "user_id", user.id
-        ).eq("generation_date", today).execute()
@@ -1,31 +1,30 @@
 import asyncio
 import aiofiles
-import subprocess  # only for synchronous helper further below
+import json
+import re
+import subprocess  # for CalledProcessError
 from pathlib import Path
 
 from fastapi import HTTPException
 from loguru import logger
 
 from src.config import settings
+from src.utils import procs
+from src.utils.audio import AUDIO_FORMATS
+from src.utils.progress import ProgressCallback, noop
 
 
 async def _run(cmd: list[str], cwd: Path | None = None) -> None:
-    logger.debug("Running command: {}", " ".join(cmd))
+    try:
+        result = await procs.run(cmd, cwd=cwd)
+    except procs.ProcessTimeout as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    stderr_text = result.stderr.decode(errors="ignore")
 
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        cwd=cwd,
-    )
-
-    stdout, stderr = await proc.communicate()
-    stderr_text = stderr.decode(errors="ignore")
-
-    if proc.returncode != 0:
+    if result.returncode != 0:
         # show just the first 30 lines so the log stays readable
         snippet = "\n".join(stderr_text.splitlines()[:30])
-        logger.error("Command failed ({}):\n{}", proc.returncode, snippet)
+        logger.error("Command failed ({}):\n{}", result.returncode, snippet)
 
         from datetime import datetime
 
@@ -36,7 +35,7 @@ async def _run(cmd: list[str], cwd: Path | None = None) -> None:
         log_path.write_text(stderr_text, encoding="utf-8")
 
         logger.error(
-            "Command failed ({}). Full log saved to {}", proc.returncode, log_path
+            "Command failed ({}). Full log saved to {}", result.returncode, log_path
         )
         raise HTTPException(
             status_code=500,
@@ -70,63 +69,234 @@ async def generate_pdf_from_latex(latex_code: str, job_id: str) -> Path:
     return pdf_path
 
 
-async def convert_pdf_to_pngs(pdf_path: Path, job_id: str) -> list[str]:
+# ─── Rasterisation ────────────────────────────────────────────────────────────
+RASTER_EXTS = {"png": "png", "jpeg": "jpg"}
+
+
+def _raster_args() -> list[str]:
+    """pdftoppm output format + size flags from the RASTER_* settings."""
+    fmt = settings.raster_format
+    if fmt not in RASTER_EXTS:
+        raise ValueError(f"Unsupported RASTER_FORMAT: {fmt!r}")
+    args = [f"-{fmt}"]
+    if fmt == "jpeg":
+        args += ["-jpegopt", f"quality={settings.raster_jpeg_quality},optimize=y"]
+    if settings.raster_scale_to:
+        args += ["-scale-to", str(settings.raster_scale_to)]
+    elif settings.raster_dpi:
+        args += ["-r", str(settings.raster_dpi)]
+    return args
+
+
+async def pdf_page_count(pdf_path: Path) -> int:
+    result = await procs.run([settings.pdfinfo_path, str(pdf_path)], binary="pdfinfo")
+    match = re.search(rb"^Pages:\s+(\d+)", result.stdout, re.MULTILINE)
+    if result.returncode != 0 or not match:
+        logger.error("pdfinfo failed on {}: {}", pdf_path, result.stderr[:500])
+        raise HTTPException(status_code=500, detail="Could not read PDF page count")
+    return int(match.group(1))
+
+
+async def _rasterise_variant(pdf_path: Path, out_dir: Path, width: int) -> list[Path]:
     """
-    Convert each page of `pdf_path` into a PNG slide file, store them under
-    settings.pngs_dir/{job_id}/slide_{n}.png, and return the public URLs.
+    Render every page `width` px wide as a JPEG into out_dir/w{width}/;
+    one pdftoppm run, since small renders are cheap.
+    """
+    variant_dir = out_dir / f"w{width}"
+    variant_dir.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        settings.pdftoppm_path,
+        "-jpeg",
+        "-jpegopt",
+        f"quality={settings.raster_variant_quality},optimize=y",
+        "-scale-to-x",
+        str(width),
+        "-scale-to-y",
+        "-1",
+        str(pdf_path),
+        str(variant_dir / "slide"),
+    ]
+    await _run(cmd)
+    paths = []
+    for raw in sorted(
+        variant_dir.glob("slide-*.jpg"), key=lambda p: int(p.stem.split("-", 1)[1])
+    ):
+        idx = int(raw.stem.split("-", 1)[1])
+        paths.append(raw.rename(variant_dir / f"slide_{idx}.jpg"))
+    return paths
+
 
-    - Uses `pdftoppm` to generate intermediate files named slide-1.png, slide-2.png, etc.
-    - Renames them to slide_{n}.png to match the audio naming scheme.
+async def convert_pdf_to_pngs(
+    pdf_path: Path, job_id: str, progress: ProgressCallback = noop
+) -> list[str]:
+    """
+    Rasterise each page of `pdf_path` into settings.pngs_dir/{job_id}/slide_{n}.<ext>
+    and return the public URLs in page order.
+
+    - Thumbnails (the first RASTER_VARIANT_WIDTHS entry) are rendered first
+      and announced with `thumbnails_ready`, so clients can show the deck
+      early; the other widths render alongside the full-size pages.
+    - Full-size pages are split into runs of RASTER_PAGES_PER_SHARD, each
+      its own `pdftoppm -f/-l` process (queued on the machine-wide
+      pdftoppm slots), sized by RASTER_SCALE_TO / RASTER_DPI in
+      RASTER_FORMAT; `slide_rasterised` is emitted per page.
+    - Every URL, variants included, is listed in {job_id}/manifest.json.
     - Cleans up the original PDF.
     """
     # Prepare output directory for this job
     out_dir = settings.pngs_dir / job_id
     out_dir.mkdir(parents=True, exist_ok=True)
+    ext = RASTER_EXTS[settings.raster_format]
+    args = _raster_args()
+    base_url = f"/pngs/{job_id}"
+
+    pages = await pdf_page_count(pdf_path)
+    step = max(1, settings.raster_pages_per_shard)
+    widths = settings.raster_variant_widths
+    variants: dict[int, dict[str, str]] = {idx: {} for idx in range(1, pages + 1)}
+
+    async def _variant(width: int) -> None:
+        for path in await _rasterise_variant(pdf_path, out_dir, width):
+            idx = int(path.stem.split("_")[1])
+            variants.setdefault(idx, {})[
+                str(width)
+            ] = f"{base_url}/w{width}/{path.name}"
+
+    if widths:
+        await _variant(widths[0])
+        await progress(
+            "thumbnails_ready",
+            {
+                "urls": [
+                    variants[idx].get(str(widths[0])) for idx in range(1, pages + 1)
+                ]
+            },
+        )
 
-    # Run pdftoppm; produces slide-1.png, slide-2.png, ...
-    prefix = out_dir / "slide"
-    cmd = [settings.pdftoppm_path, "-png", str(pdf_path), str(prefix)]
-    await _run(cmd)
-
-    # Gather and rename
-    raw_pngs = sorted(
-        out_dir.glob("slide-*.png"), key=lambda p: int(p.stem.split("-", 1)[1])
+    async def _shard(first: int, last: int) -> None:
+        # pdftoppm names pages <prefix>-<n>, zero-padded to the page count
+        prefix = out_dir / f".shard{first}"
+        cmd = [
+            settings.pdftoppm_path,
+            *args,
+            "-f",
+            str(first),
+            "-l",
+            str(last),
+            str(pdf_path),
+            str(prefix),
+        ]
+        await _run(cmd)
+        for raw in sorted(out_dir.glob(f"{prefix.name}-*.{ext}")):
+            idx = int(raw.stem.rsplit("-", 1)[1])
+            new_name = f"slide_{idx}.{ext}"
+            raw.rename(out_dir / new_name)
+            await progress(
+                "slide_rasterised",
+                {
+                    "index": idx,
+                    "url": f"{base_url}/{new_name}",
+                    "variants": variants.get(idx, {}),
+                },
+            )
+
+    await asyncio.gather(
+        *(_shard(p, min(p + step - 1, pages)) for p in range(1, pages + 1, step)),
+        *(_variant(width) for width in widths[1:]),
     )
-    urls: list[str] = []
-    for raw in raw_pngs:
-        idx = int(raw.stem.split("-", 1)[1])
-        new_name = f"slide_{idx}.png"
-        new_path = out_dir / new_name
-        raw.rename(new_path)
-        urls.append(f"/pngs/{job_id}/{new_name}")
+
+    urls = [f"{base_url}/slide_{idx}.{ext}" for idx in range(1, pages + 1)]
+    manifest = {
+        "slides": [
+            {"index": idx, "url": url, "variants": variants.get(idx, {})}
+            for idx, url in enumerate(urls, start=1)
+        ]
+    }
+    (out_dir / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
 
     # Cleanup
     pdf_path.unlink(missing_ok=True)
     return urls
 
 
+def read_slide_manifest(job_id: str) -> dict[int, dict]:
+    """slide index → {"url", "variants"} as written by `convert_pdf_to_pngs`."""
+    try:
+        manifest = json.loads(
+            (settings.pngs_dir / job_id / "manifest.json").read_text()
+        )
+    except (FileNotFoundError, ValueError):
+        return {}
+    return {slide["index"]: slide for slide in manifest.get("slides", [])}
+
+
+async def render_pdf_page(pdf_path: Path, out_png: Path, page: int = 1) -> None:
+    """
+    Rasterise a single page of `pdf_path` to `out_png` (used for previews).
+    """
+    out_png.parent.mkdir(parents=True, exist_ok=True)
+    prefix = out_png.with_suffix("")
+    cmd = [
+        settings.pdftoppm_path,
+        "-png",
+        "-singlefile",
+        "-f",
+        str(page),
+        "-l",
+        str(page),
+        str(pdf_path),
+        str(prefix),
+    ]
+    if settings.raster_scale_to:
+        cmd[2:2] = ["-scale-to", str(settings.raster_scale_to)]
+    await _run(cmd)
+
+
 async def run_ffmpeg(cmd: list[str]) -> None:
     """
-    Run an ffmpeg command in a thread to avoid blocking the event loop.
+    Run an ffmpeg command in a scheduler slot; raises CalledProcessError
+    on failure.
     """
-    logger.debug("Running ffmpeg command: {}", " ".join(cmd))
-    await asyncio.to_thread(subprocess.run, cmd, check=True)
+    result = await procs.run(cmd, binary="ffmpeg")
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(
+            result.returncode, cmd, result.stdout, result.stderr
+        )
 
 
 async def run_ffmpeg_async(cmd: list[str]) -> None:
     """
-    Spawn FFmpeg as a subprocess without blocking the event loop.
+    Spawn FFmpeg in a machine-wide scheduler slot without blocking the event loop.
     """
-    logger.debug("Running ffmpeg command: {}", " ".join(cmd))
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await proc.communicate()
-    if proc.returncode != 0:
-        msg = stderr.decode().strip()
-        raise RuntimeError(f"FFmpeg failed ({proc.returncode}): {msg}")
+    try:
+        result = await procs.run(cmd, binary="ffmpeg")
+    except procs.ProcessTimeout as exc:
+        raise RuntimeError(f"FFmpeg timed out: {exc}") from exc
+    if result.returncode != 0:
+        msg = result.stderr.decode().strip()
+        raise RuntimeError(f"FFmpeg failed ({result.returncode}): {msg}")
+
+
+def build_audio_encode_cmd(
+    src: Path,
+    dst: Path,
+    fmt: str,
+    bitrate: str,
+) -> list[str]:
+    """
+    Encode a narration WAV into the delivery format (see `AUDIO_FORMATS`).
+    """
+    return [
+        settings.ffmpeg_path,
+        "-y",
+        "-i",
+        str(src),
+        "-vn",
+        *AUDIO_FORMATS[fmt][1],
+        "-b:a",
+        bitrate,
+        str(dst),
+    ]
 
 
 def build_slide_clip_cmd(
@@ -183,6 +353,148 @@ def build_slide_clip_cmd(
     ]
 
 
+def build_still_clip_cmd(
+    png: Path,
+    audio: Path,
+    clip: Path,
+    duration: float | None = None,  # narration length in seconds, if known
+    offset: float = 0.5,  # seconds
+    fps: int = 1,
+    threads: int = 2,
+) -> list[str]:
+    """
+    Like `build_slide_clip_cmd`, but encodes the slide as the still image
+    it is: `fps` frames per second, x264's stillimage tuning and a GOP
+    spanning the whole clip, so a slide costs a handful of frames instead
+    of 30 per second.
+
+    With `duration` the clip length is fixed to offset + duration (audio
+    padded with silence); otherwise it ends with the audio (-shortest).
+    """
+    offset_ms = int(offset * 1000)
+    audio_filter = f"[1:a]adelay={offset_ms}|{offset_ms}"
+    if duration is not None:
+        audio_filter += ",apad"
+        length = ["-t", f"{offset + duration:.3f}"]
+    else:
+        length = ["-shortest"]
+    return [
+        "ffmpeg",
+        "-y",
+        # ── video (loop the still PNG at a low rate) ────────────────────────────
+        "-loop",
+        "1",
+        "-framerate",
+        str(fps),
+        "-i",
+        str(png),
+        # ── audio ───────────────────────────────────────────────────────────────
+        "-i",
+        str(audio),
+        # ── filtering ───────────────────────────────────────────────────────────
+        "-filter_complex",
+        (
+            "[0:v]scale=trunc(iw/2)*2:trunc(ih/2)*2,"
+            "format=yuv420p[v];"
+            f"{audio_filter}[a]"
+        ),
+        "-map",
+        "[v]",
+        "-map",
+        "[a]",
+        # ── encoding ────────────────────────────────────────────────────────────
+        "-c:v",
+        "libx264",
+        "-tune",
+        "stillimage",
+        "-r",
+        str(fps),
+        "-g",
+        str(fps * 3600),  # one keyframe per clip
+        # identical timescale on every clip keeps the stream-copy concat clean
+        "-video_track_timescale",
+        "90000",
+        "-c:a",
+        "aac",
+        "-b:a",
+        "128k",
+        *length,
+        "-threads",
+        str(threads),
+        str(clip),
+    ]
+
+
+def write_image_concat(images: list[tuple[Path, float]], list_file: Path) -> None:
+    """
+    Write an ffconcat script showing each image for its duration (seconds).
+    The last image is listed twice: the demuxer ignores the final duration.
+    """
+    lines = ["ffconcat version 1.0"]
+    for image, duration in images:
+        lines += [f"file '{image.as_posix()}'", f"duration {duration:.3f}"]
+    lines.append(f"file '{images[-1][0].as_posix()}'")
+    list_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def build_single_pass_cmd(
+    image_list: Path,
+    audios: list[tuple[Path, float]],
+    output: Path,
+    offset: float = 0.5,  # seconds of silence before each narration
+    fps: int = 1,
+    threads: int = 2,
+) -> list[str]:
+    """
+    Encode the whole video in one ffmpeg run: the slides come from an
+    ffconcat image list (see `write_image_concat`, durations offset +
+    narration), and each (audio, narration seconds) input is delayed by
+    `offset`, padded/trimmed to its slide's length and concatenated into
+    one track.
+    """
+    offset_ms = int(offset * 1000)
+    inputs: list[str] = ["-f", "concat", "-safe", "0", "-i", str(image_list)]
+    chains = [f"[0:v]scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p,fps={fps}[v]"]
+    for n, (audio, duration) in enumerate(audios, start=1):
+        inputs += ["-i", str(audio)]
+        chains.append(
+            f"[{n}:a]aresample=48000,aformat=channel_layouts=stereo,"
+            f"adelay={offset_ms}|{offset_ms},apad,"
+            f"atrim=end={offset + duration:.3f}[a{n}]"
+        )
+    labels = "".join(f"[a{n}]" for n in range(1, len(audios) + 1))
+    chains.append(f"{labels}concat=n={len(audios)}:v=0:a=1[a]")
+    return [
+        "ffmpeg",
+        "-y",
+        *inputs,
+        "-filter_complex",
+        ";".join(chains),
+        "-map",
+        "[v]",
+        "-map",
+        "[a]",
+        "-c:v",
+        "libx264",
+        "-tune",
+        "stillimage",
+        "-r",
+        str(fps),
+        "-g",
+        str(fps * 3600),
+        "-c:a",
+        "aac",
+        "-b:a",
+        "128k",
+        "-shortest",
+        "-threads",
+        str(threads),
+        "-movflags",
+        "+faststart",
+        str(output),
+    ]
+
+
 def build_concat_cmd(
     list_file: Path,
     output: Path,
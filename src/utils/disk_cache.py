@@ -0,0 +1,162 @@
+"""
+Content-addressed file cache shared by all workers on the box.
+
+Entries are plain files under `root/<k[:2]>/<key><suffix>`:
+- writes are atomic (temp file in the same directory + os.replace), so a
+  reader never sees a half-written entry;
+- mtime is the write time and drives the TTL;
+- atime is bumped explicitly on every hit and drives LRU eviction once
+  the directory grows past `max_bytes`.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from src.utils import metrics
+
+
+def content_key(*parts: Any) -> str:
+    """Stable SHA-256 over JSON-serialisable parts."""
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(
+        self,
+        name: str,
+        root: Path,
+        max_bytes: int,
+        ttl_s: float | None = None,
+        suffix: str = "",
+        evict_interval_s: float = 30.0,
+    ):
+        self.name = name
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.suffix = suffix
+        self.evict_interval_s = evict_interval_s
+        self._last_evict = 0.0
+        self._evict_lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{self.suffix}"
+
+    def _expired(self, st: os.stat_result, now: float) -> bool:
+        return self.ttl_s is not None and now - st.st_mtime > self.ttl_s
+
+    # ─── reads ────────────────────────────────────────────────────────────────
+    def get_path(self, key: str) -> Path | None:
+        """Return the entry's path (and mark it recently used) or None."""
+        path = self.path_for(key)
+        now = time.time()
+        try:
+            st = path.stat()
+            if self._expired(st, now):
+                path.unlink(missing_ok=True)
+                raise FileNotFoundError(path)
+            os.utime(path, (now, st.st_mtime))
+        except FileNotFoundError:
+            metrics.incr(f"cache.{self.name}.miss")
+            return None
+        metrics.incr(f"cache.{self.name}.hit")
+        return path
+
+    def get_bytes(self, key: str) -> bytes | None:
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:  # evicted by another worker in between
+            return None
+
+    # ─── writes ───────────────────────────────────────────────────────────────
+    def _tmp_for(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        os.close(fd)
+        return Path(tmp)
+
+    def put_bytes(self, key: str, data: bytes) -> Path:
+        path = self.path_for(key)
+        tmp = self._tmp_for(path)
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self._maybe_evict()
+        return path
+
+    def put_file(self, key: str, src: Path, move: bool = False) -> Path:
+        """Store `src` under `key` (moved when `move`, else copied)."""
+        path = self.path_for(key)
+        tmp = self._tmp_for(path)
+        try:
+            if move:
+                shutil.move(src, tmp)
+            else:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self._maybe_evict()
+        return path
+
+    # ─── eviction ─────────────────────────────────────────────────────────────
+    def _maybe_evict(self) -> None:
+        now = time.monotonic()
+        if now - self._last_evict < self.evict_interval_s:
+            return
+        self._last_evict = now
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones until under budget."""
+        if not self._evict_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            entries: list[tuple[float, int, Path]] = []
+            removed = 0
+            for path in self.root.glob(f"*/*{self.suffix}"):
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                if self._expired(st, now):
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+
+            metrics.set_gauge(f"cache.{self.name}.bytes", total)
+            if removed:
+                metrics.incr(f"cache.{self.name}.evicted", removed)
+                logger.debug("{} cache: evicted {} entries", self.name, removed)
+            return removed
+        finally:
+            self._evict_lock.release()
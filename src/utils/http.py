@@ -0,0 +1,135 @@
+"""
+App-scoped outbound HTTP pool.
+
+One keep-alive `httpx.AsyncClient` per worker, created in the app lifespan
+and closed on shutdown, so auth, TTS and LLM calls stop paying TCP+TLS setup
+on every request. Besides the global connection limits, each upstream host
+gets its own concurrency cap (`settings.http_per_host_limit`).
+"""
+
+import asyncio
+import importlib.util
+
+import httpx
+from loguru import logger
+
+from src.config import settings
+
+_client: httpx.AsyncClient | None = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that frees the host slot once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _PerHostLimitTransport(httpx.AsyncBaseTransport):
+    """
+    Caps in-flight requests per upstream host. A slot is held until the
+    response body is closed, not just until the headers arrive.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, per_host: int):
+        self._inner = inner
+        self._per_host = per_host
+        self._slots: dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        sema = self._slots.setdefault(
+            request.url.host, asyncio.Semaphore(self._per_host)
+        )
+        await sema.acquire()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                sema.release()
+
+        try:
+            resp = await self._inner.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=resp.status_code,
+            headers=resp.headers,
+            stream=_ReleasingStream(resp.stream, release),
+            extensions=resp.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def http2_available() -> bool:
+    return settings.http2_enabled and importlib.util.find_spec("h2") is not None
+
+
+def timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.http_read_timeout_s, connect=settings.http_connect_timeout_s
+    )
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive,
+        keepalive_expiry=settings.http_keepalive_expiry_s,
+    )
+    transport = _PerHostLimitTransport(
+        httpx.AsyncHTTPTransport(http2=http2_available(), limits=limits, retries=1),
+        per_host=settings.http_per_host_limit,
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout())
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Shared client. Callers must not close it. Outside the app lifespan
+    (scripts, tests) it is created on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def startup() -> None:
+    client = get_client()
+    try:
+        import litellm
+
+        # litellm reuses this session for async provider calls
+        litellm.aclient_session = client
+    except ImportError:  # pragma: no cover
+        pass
+    logger.info(
+        "Outbound HTTP pool ready (http2={}, per_host={}, max={})",
+        http2_available(),
+        settings.http_per_host_limit,
+        settings.http_max_connections,
+    )
+
+
+async def shutdown() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
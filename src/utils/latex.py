@@ -1,12 +1,13 @@
-import asyncio, aiofiles, re
+import asyncio, aiofiles, hashlib, os, random, re, shutil
 from pathlib import Path
 from fastapi import HTTPException
 from loguru import logger
 
 from src.config import settings
+from src.utils import metrics, procs
+from src.utils.disk_cache import DiskCache, content_key
 from src.utils.llm import call_llm_text, load_prompt_template
-
-from time import sleep
+from src.utils.progress import ProgressCallback, noop
 
 # redaction helper
 _PATH_PAT = re.compile(
@@ -29,77 +30,739 @@ def _scrub_paths(text: str) -> str:
 
 
 # pdflatex runner
-async def _pdflatex(job_id: str) -> tuple[int, str]:
+async def _pdflatex(
+    job_id: str, cwd: Path | None = None, fmt: str | None = None
+) -> tuple[int, str]:
     cmd = ["pdflatex", "-interaction=nonstopmode", f"{job_id}.tex"]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        cwd=settings.workspace_root,
-    )
-    _, stderr = await proc.communicate()
-    return proc.returncode, stderr.decode(errors="ignore")
+    if fmt:
+        cmd.insert(1, f"-fmt={fmt}")
+    # runs in a scheduler slot; cancelling (an abandoned preview) kills it
+    try:
+        result = await procs.run(cmd, cwd=cwd or settings.workspace_root)
+    except procs.ProcessTimeout as exc:
+        return -9, str(exc)
+    stderr = result.stderr.decode(errors="ignore")
+    if fmt and result.returncode != 0:
+        # a format that won't load fails before the .log is opened; the
+        # reason only reaches the terminal
+        if m := _FORMAT_ERROR.search(result.stdout.decode(errors="ignore")):
+            stderr = f"{m.group()}\n{stderr}"
+    return result.returncode, stderr
+
+
+# streaming Beamer parsing
+_BEGIN_DOCUMENT = r"\begin{document}"
+
+
+# ─── Preamble format cache ────────────────────────────────────────────────────
+# Generated decks share near-identical preambles (beamer, TikZ, fonts), so
+# each distinct preamble is dumped once into a pdflatex format with
+# mylatexformat and later compiles load that instead of re-reading packages.
+_formats = DiskCache(
+    "latexfmt",
+    settings.cache_dir / "latexfmt",
+    max_bytes=settings.latex_format_cache_max_mb * 1024 * 1024,
+    suffix=".fmt",
+)
+_format_builds: dict[str, asyncio.Task] = {}
+_bad_formats: set[str] = set()  # failed to build or to load; plain compiles only
+
+_FORMAT_ERROR = re.compile(
+    r"Fatal format file error|I can't find the format file|^---! .*\.fmt .*$",
+    re.MULTILINE,
+)
+
+
+def normalize_preamble(preamble: str) -> str:
+    """
+    Drop trailing whitespace, which TeX strips from input lines anyway.
+    Comments stay: a `%` line end can matter inside a macro definition.
+    """
+    return "\n".join(line.rstrip() for line in preamble.splitlines()) + "\n"
+
+
+def format_key(preamble: str) -> str:
+    return content_key("pdflatex-fmt", normalize_preamble(preamble))
+
+
+def split_preamble(latex_code: str) -> str | None:
+    """Everything before `\\begin{document}`, or None if it is missing."""
+    i = latex_code.find(_BEGIN_DOCUMENT)
+    return latex_code[:i] if i != -1 else None
+
+
+async def _build_format(key: str, preamble: str) -> None:
+    """Dump `preamble` into `<key>.fmt` and store it in the format cache."""
+    workdir = settings.latex_build_root / f".fmt-{key[:16]}-{os.getpid()}"
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        (workdir / f"{key}.tex").write_text(
+            f"{preamble}{_BEGIN_DOCUMENT}\n\\end{{document}}\n", encoding="utf-8"
+        )
+        cmd = [
+            "pdflatex",
+            "-ini",
+            "-interaction=nonstopmode",
+            f"-jobname={key}",
+            "&pdflatex",
+            "mylatexformat.ltx",
+            f"{key}.tex",
+        ]
+        try:
+            result = await procs.run(cmd, cwd=workdir)
+        except (OSError, procs.ProcessTimeout) as exc:
+            logger.warning("Format build {} failed: {}", key[:12], exc)
+            _bad_formats.add(key)
+            return
+        fmt = workdir / f"{key}.fmt"
+        if result.returncode != 0 or not fmt.exists():
+            logger.warning(
+                "Format build {} failed (rc={})", key[:12], result.returncode
+            )
+            _bad_formats.add(key)
+            return
+        await asyncio.to_thread(_formats.put_file, key, fmt, True)
+        metrics.incr("latex.format.built")
+        logger.info("Cached pdflatex format {}", key[:12])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def _use_format(preamble: str | None, workdir: Path) -> str | None:
+    """
+    Link the cached format for `preamble` into `workdir` and return its
+    name for `-fmt`. On a miss, start building it in the background (so
+    this compile doesn't wait for the dump) and return None.
+    """
+    if not settings.latex_format_cache or preamble is None:
+        return None
+    key = format_key(preamble)
+    if key in _bad_formats:
+        return None
+    cached = await asyncio.to_thread(_formats.get_path, key)
+    if cached is None:
+        if key not in _format_builds:
+            task = asyncio.create_task(_build_format(key, normalize_preamble(preamble)))
+            _format_builds[key] = task
+            task.add_done_callback(lambda _: _format_builds.pop(key, None))
+        return None
+    dest = workdir / f"{key}.fmt"
+    try:
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(cached, dest)
+        except OSError:
+            shutil.copyfile(cached, dest)
+    except FileNotFoundError:  # evicted by another worker in between
+        return None
+    return key
+
+
+async def _compile_pass(name: str, workdir: Path, fmt: str | None) -> tuple[int, str]:
+    """
+    One pdflatex pass, against the cached format when there is one. A
+    format pdflatex refuses to load (e.g. after a TeX Live upgrade) is
+    dropped and the pass rerun without it; errors in the source itself
+    are returned as they are.
+    """
+    if fmt:
+        rc, stderr = await _pdflatex(name, cwd=workdir, fmt=fmt)
+        if rc == 0:
+            metrics.incr("latex.format.hit")
+        if rc == 0 or not _FORMAT_ERROR.search(stderr):
+            return rc, stderr
+        logger.warning("Dropping pdflatex format {}", fmt[:12])
+        metrics.incr("latex.format.fallback")
+        _bad_formats.add(fmt)
+        _formats.path_for(fmt).unlink(missing_ok=True)
+    return await _pdflatex(name, cwd=workdir)
+
+
+_END_FRAME = r"\end{frame}"
+_EMPTY_FRAME = r"\begin{frame}\end{frame}"
+_FRAME_START = re.compile(r"\\begin\{frame\}|\\frame\s*(?:\[[^\]]*\])?\s*\{")
+
+
+def _match_brace(text: str, open_idx: int) -> int | None:
+    """Index just past the `}` matching the `{` at `open_idx`, or None if unclosed."""
+    depth = 0
+    i = open_idx
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            i += 2  # skip escaped char (\{, \}, \\)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+class BeamerStreamParser:
+    r"""
+    Incrementally splits a Beamer document arriving in chunks.
+
+    `feed()` returns ("preamble", text) once `\begin{document}` has arrived
+    and ("frame", text) for every completed `\begin{frame}...\end{frame}`
+    or `\frame{...}` block. A leading Markdown fence is dropped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.preamble: str | None = None
+        self.frames: list[str] = []
+        self.spans: list[tuple[int, int]] = []  # of each frame in `self.text`
+        self._pos = 0
+        self._fence_checked = False
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        self.text += chunk
+        events: list[tuple[str, str]] = []
+
+        if not self._fence_checked:
+            head = self.text.lstrip()
+            if len(head) < 3:
+                return events
+            if head.startswith("```"):
+                nl = self.text.find("\n", self.text.index("```"))
+                if nl == -1:
+                    return events
+                self.text = self.text[nl + 1 :]
+            self._fence_checked = True
+
+        if self.preamble is None:
+            i = self.text.find(_BEGIN_DOCUMENT)
+            if i == -1:
+                return events
+            self.preamble = self.text[:i]
+            self._pos = i + len(_BEGIN_DOCUMENT)
+            events.append(("preamble", self.preamble))
+
+        while m := _FRAME_START.search(self.text, self._pos):
+            if m.group().startswith("\\begin"):
+                end = self.text.find(_END_FRAME, m.end())
+                if end == -1:
+                    break
+                stop = end + len(_END_FRAME)
+            else:
+                stop = _match_brace(self.text, m.end() - 1)
+                if stop is None:
+                    break
+            frame = self.text[m.start() : stop]
+            self.frames.append(frame)
+            self.spans.append((m.start(), stop))
+            events.append(("frame", frame))
+            self._pos = stop
+
+        return events
+
+
+async def compile_snippet(
+    preamble: str, body: str, workdir: Path, name: str
+) -> Path | None:
+    """
+    Single-pass compile of `preamble` + `body` in `workdir`.
+    Returns the PDF, or None if pdflatex failed. Used for early previews.
+    """
+    workdir.mkdir(parents=True, exist_ok=True)
+    tex = f"{preamble}{_BEGIN_DOCUMENT}\n{body}\n\\end{{document}}\n"
+    async with aiofiles.open(workdir / f"{name}.tex", "w", encoding="utf-8") as f:
+        await f.write(tex)
+    fmt = await _use_format(preamble, workdir)
+    rc, _ = await _compile_pass(name, workdir, fmt)
+    pdf = workdir / f"{name}.pdf"
+    return pdf if rc == 0 and pdf.exists() else None
+
+
+async def check_preamble(preamble: str, workdir: Path, name: str = "preamble") -> bool:
+    """
+    Whether `preamble` compiles. The body is an empty frame: a document
+    with no pages produces no PDF, which would read as a failure.
+    """
+    return await compile_snippet(preamble, _EMPTY_FRAME, workdir, name) is not None
+
+
+# ─── Rerun detection ──────────────────────────────────────────────────────────
+# Only what changes the rendered pages counts: PDF outlines and page labels
+# are invisible once the slides are rasterised.
+_RERUN = re.compile(
+    r"Label\(s\) may have changed|Please rerun LaTeX"
+    r"|Rerun to get (?!outlines|/PageLabels)"
+)
+_XREF_LINE = re.compile(r"^\\(?:newlabel|bibcite|@writefile\{toc\})")
+# Themes other than `default` draw navigation from the .nav
+_NAV_USERS = re.compile(
+    r"\\use(?:outer)?theme(?:\[[^\]]*\])?\{(?!default\})"
+    r"|\\insert\w*navigation|miniframes"
+)
+# ...and a footline showing "n / total" reads the total back from the .nav
+_TOTAL_USERS = re.compile(
+    r"\\inserttotalframenumber|\[(?:frame number|totalframenumber)\]"
+    r"|numbering=fraction|\\use(?:outer)?theme(?:\[[^\]]*\])?"
+    r"\{[^}]*\b(?:infolines|Madrid|AnnArbor|Boadilla|CambridgeUS)\b"
+)
+_NAV_TOTAL = re.compile(rb"^.*inserttotalframenumber.*$", re.MULTILINE)
+
+
+def _uses_navigation(latex_code: str) -> bool:
+    return _NAV_USERS.search(latex_code) is not None
+
+
+def _shows_frame_total(latex_code: str) -> bool:
+    return _TOTAL_USERS.search(latex_code) is not None
+
+
+def _xref_state(workdir: Path, name: str, nav: bool, total: bool) -> str:
+    """
+    Digest of the auxiliary data a further pass would read back: all of
+    the .nav with `nav`, only its frame total with `total`.
+    """
+    h = hashlib.sha256()
+    aux = workdir / f"{name}.aux"
+    if aux.exists():
+        for line in aux.read_text(encoding="utf-8", errors="ignore").splitlines():
+            if _XREF_LINE.match(line):
+                h.update(line.encode())
+    toc = workdir / f"{name}.toc"
+    if toc.exists():
+        h.update(b".toc" + toc.read_bytes())
+    nav_file = workdir / f"{name}.nav"
+    if (nav or total) and nav_file.exists():
+        data = nav_file.read_bytes()
+        h.update(b".nav" + (data if nav else b"".join(_NAV_TOTAL.findall(data))))
+    return h.hexdigest()
+
+
+def _log_wants_rerun(workdir: Path, name: str) -> bool:
+    log = workdir / f"{name}.log"
+    if not log.exists():
+        return False
+    return _RERUN.search(log.read_text(encoding="utf-8", errors="ignore")) is not None
+
+
+async def _compile_passes(
+    name: str, workdir: Path, fmt: str | None, nav: bool, total: bool = False
+) -> tuple[int, str, int]:
+    """
+    Run pdflatex until the cross-reference data settles: another pass only
+    when the log asks for one or the .aux labels / .toc (/.nav, if the theme
+    draws it, or just its frame total, if a footline shows that) changed,
+    up to LATEX_MAX_PASSES. Returns (rc, stderr, passes).
+    """
+    before = _xref_state(workdir, name, nav, total)
+    passes = 0
+    while True:
+        rc, stderr = await _compile_pass(name, workdir, fmt)
+        passes += 1
+        if rc != 0 or passes >= settings.latex_max_passes:
+            break
+        after = _xref_state(workdir, name, nav, total)
+        if after == before and not _log_wants_rerun(workdir, name):
+            break
+        before = after
+    metrics.incr(f"latex.passes.{passes}")
+    return rc, stderr, passes
+
+
+# ─── Rule-based sanitizer ─────────────────────────────────────────────────────
+# Cheap, deterministic fixes for the failures LLM-written Beamer hits most,
+# applied before the first compile and after every repair round so those
+# never cost a repair call. Escaping `&`/`_`/`%` is a guess about intent,
+# so it only runs once pdflatex has complained about one of them.
+_FENCE_LINE = re.compile(r"^[ \t]*```[\w-]*[ \t]*\n?", re.MULTILINE)
+_DOCUMENTCLASS = re.compile(r"^[ \t]*\\documentclass", re.MULTILINE)
+_PAUSE = re.compile(r"\\pause(?:\[\d*\])?(?![A-Za-z@])\s*")
+_GRAPHICS = re.compile(r"\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]*)\}")
+_GRAPHICS_EXTS = ("", ".pdf", ".png", ".jpg", ".jpeg", ".eps")
+_ENV = re.compile(r"\\(begin|end)\s*\{([^}]*)\}")
+_END_DOCUMENT = r"\end{document}"
+_VERBATIM_ENVS = {"verbatim", "verbatim*", "semiverbatim", "lstlisting", "minted"}
+# Environments where `&`, `_` (and `%`) are meant literally by LaTeX
+_NO_ESCAPE_ENVS = _VERBATIM_ENVS | {
+    "math", "displaymath", "equation", "equation*", "align", "align*",
+    "alignat", "alignat*", "aligned", "gather", "gather*", "multline",
+    "multline*", "eqnarray", "eqnarray*", "split", "cases", "array", "matrix",
+    "pmatrix", "bmatrix", "vmatrix", "tabular", "tabular*", "tabularx",
+    "longtable", "tikzpicture", "tikzcd",
+}  # fmt: skip
+_ESCAPE_ERRORS = re.compile(
+    r"^! (?:Misplaced alignment tab character|Missing \$ inserted)", re.MULTILINE
+)
+_TEXT_TOKEN = re.compile(
+    r"""
+      \\(?:begin|end)\s*\{[^}]*\}                      # environment boundary
+    | \\(?:label|ref|eqref|pageref|autoref|cite|url|href|input|include
+         |includegraphics|hypersetup|usetikzlibrary|ensuremath|hyperlink
+         |hypertarget)\*?
+         (?:\[[^\]]*\])?\{[^}]*\}                       # argument taken literally
+    | \\tikz(?![A-Za-z@])(?:\s*\[[^\]]*\])?
+         \s*(?:\{[^}]*\}|[^;]*;)                         # inline TikZ path
+    | \\verb\*?(?P<vd>[^A-Za-z\s*]).*?(?P=vd)           # inline verbatim
+    | \\(?:lstinline|mintinline\{[^}]*\})(?:\[[^\]]*\])?
+         (?:\{[^}]*\}|(?P<ld>[^A-Za-z\s{\[]).*?(?P=ld))   # inline listings
+    | \\[][()]                                         # math delimiters
+    | \\[^A-Za-z]                                      # escaped character
+    | \\[A-Za-z@]+                                      # other commands
+    | \$\$?                                             # inline / display math
+    | \[[^\]\n$]*\]                                      # option list
+    | (?P<pct>(?<=\d)%(?=[ \t]*[A-Za-z(]))              # "50% of ..."
+    | %[^\n]*                                           # comment
+    | [&_]
+    """,
+    re.VERBOSE,
+)
+
+
+def _in_comment(text: str, idx: int) -> bool:
+    line = text[text.rfind("\n", 0, idx) + 1 : idx]
+    return re.search(r"(?<!\\)%", line) is not None
+
+
+def _balance_environments(body: str) -> str:
+    """Close environments left open and drop `\\end`s nothing opened."""
+    out: list[str] = []
+    stack: list[str] = []
+    pos = 0
+    for m in _ENV.finditer(body):
+        kind, env = m.groups()
+        if stack and stack[-1] in _VERBATIM_ENVS and env != stack[-1]:
+            continue
+        if _in_comment(body, m.start()):
+            continue
+        out.append(body[pos : m.start()])
+        pos = m.end()
+        if kind == "begin":
+            stack.append(env)
+        elif env not in stack:
+            continue  # stray \end
+        else:
+            while stack[-1] != env:
+                out.append(f"\\end{{{stack.pop()}}}")
+            stack.pop()
+        out.append(m.group())
+    out.append(body[pos:])
+    while stack:
+        out.append(f"\\end{{{stack.pop()}}}\n")
+    return "".join(out)
+
+
+def _escape_text_specials(body: str) -> str:
+    """Escape `&`, `_` and "50%"-style `%` in running text (not math/tables)."""
+    out: list[str] = []
+    envs: list[str] = []
+    math = False
+    pos = 0
+    for m in _TEXT_TOKEN.finditer(body):
+        tok = m.group()
+        out.append(body[pos : m.start()])
+        pos = m.end()
+        if env := _ENV.fullmatch(tok):
+            kind, name = env.groups()
+            if kind == "begin":
+                envs.append(name)
+            elif envs and envs[-1] == name:  # balanced by now
+                envs.pop()
+        elif tok in ("\\[", "\\("):
+            math = True
+        elif tok in ("\\]", "\\)"):
+            math = False
+        elif tok.startswith("$"):
+            math = not math
+        elif (tok in ("&", "_") or m.lastgroup == "pct") and not math:
+            if not _NO_ESCAPE_ENVS.intersection(envs):
+                tok = "\\" + tok
+        out.append(tok)
+    out.append(body[pos:])
+    return "".join(out)
+
+
+def sanitize_latex(
+    latex_code: str,
+    asset_dir: Path | None = None,
+    fragment: bool = False,
+    record: bool = True,
+    escape: bool = False,
+) -> tuple[str, list[str]]:
+    """
+    Apply the local fix-up rules and return (fixed code, names of the rules
+    that changed something). `\\includegraphics` of files missing from
+    `asset_dir` are dropped; with `fragment`, `latex_code` is document body
+    (e.g. a single frame). `escape` adds the `&`/`_`/`%` escaping rule.
+    Fired rules are counted in metrics when `record`.
+    """
+    fired: list[str] = []
+
+    def apply(rule: str, fixed: str) -> None:
+        nonlocal text
+        if fixed != text:
+            fired.append(rule)
+            text = fixed
+
+    text = latex_code
+    apply("code_fence", _FENCE_LINE.sub("", text))
+    if not fragment and (m := _DOCUMENTCLASS.search(text)):
+        # stray language tag etc. left over from a fence
+        apply("code_fence", text[m.start() :].lstrip())
+    apply("pause", _PAUSE.sub("", text))
+
+    def _graphic(m: re.Match) -> str:
+        name = m.group(1).strip()
+        exists = asset_dir is not None and any(
+            (asset_dir / f"{name}{ext}").is_file() for ext in _GRAPHICS_EXTS
+        )
+        return m.group() if exists else ""
+
+    apply("missing_graphics", _GRAPHICS.sub(_graphic, text))
+
+    if fragment:
+        head, body, tail = "", text, ""
+    else:
+        i = text.find(_BEGIN_DOCUMENT)
+        if i == -1:  # nothing safe to do without a document body
+            return _sanitized(text, fired, record)
+        head, body = text[: i + len(_BEGIN_DOCUMENT)], text[i + len(_BEGIN_DOCUMENT) :]
+        j = body.find(_END_DOCUMENT)
+        if j == -1:
+            fired.append("missing_end_document")
+            body, tail = body.rstrip() + "\n", _END_DOCUMENT + "\n"
+        else:
+            body, tail = body[:j], body[j:]
+
+    rules = [("unbalanced_environment", _balance_environments)]
+    if escape:
+        rules.append(("unescaped_special", _escape_text_specials))
+    rest = body
+    for rule, fix in rules:
+        fixed = fix(rest)
+        if fixed != rest:
+            fired.append(rule)
+            rest = fixed
+    return _sanitized(head + rest + tail, fired, record)
+
+
+def _sanitized(text: str, fired: list[str], record: bool) -> tuple[str, list[str]]:
+    fired = list(dict.fromkeys(fired))
+    if record:
+        for rule in fired:
+            metrics.incr(f"latex.sanitize.{rule}")
+    return text, fired
+
+
+# ─── Frame-level repair ───────────────────────────────────────────────────────
+def _log_errors(log: Path, context: int = 4, limit: int = 3) -> str:
+    """The first `limit` `!` error blocks of a pdflatex log, else its tail."""
+    if not log.exists():
+        return ""
+    lines = log.read_text(encoding="utf-8", errors="ignore").splitlines()
+    blocks = [
+        "\n".join(lines[i : i + context + 1])
+        for i, line in enumerate(lines)
+        if line.startswith("!")
+    ][:limit]
+    return "\n".join(blocks) or "\n".join(lines[-20:])
+
+
+async def _locate_failing_frames(
+    preamble: str, frames: list[str], workdir: Path
+) -> dict[int, str] | None:
+    """
+    Compile the bare preamble and every frame on its own against it, all in
+    parallel. Returns {frame index: error excerpt} for the frames that
+    fail, or None if the preamble itself is broken.
+    """
+
+    async def _one(n: int, body: str) -> str | None:
+        d = workdir / "frames" / str(n)
+        if await compile_snippet(preamble, body, d, "frame") is not None:
+            return None
+        return _scrub_paths(_log_errors(d / "frame.log"))
+
+    try:
+        errors = await asyncio.gather(
+            _one(-1, _EMPTY_FRAME), *(_one(n, frame) for n, frame in enumerate(frames))
+        )
+    finally:
+        shutil.rmtree(workdir / "frames", ignore_errors=True)
+    if errors[0] is not None:
+        return None
+    return {n: err for n, err in enumerate(errors[1:]) if err is not None}
+
+
+async def _repair_frames(
+    latex_code: str, workdir: Path, progress: ProgressCallback = noop
+) -> str | None:
+    """
+    Find the frames that fail to compile on their own, have the LLM repair
+    just those (concurrently) and splice them back in. Returns the patched
+    document, or None when the failure can't be pinned on single frames
+    (broken preamble, text between frames, or every frame compiles alone).
+    """
+    parser = BeamerStreamParser()
+    parser.feed(latex_code)
+    if parser.preamble is None or not parser.frames:
+        return None
+    failing = await _locate_failing_frames(parser.preamble, parser.frames, workdir)
+    if not failing:
+        return None
+
+    await progress("frame_repair", {"frames": [n + 1 for n in sorted(failing)]})
+    prompt = await load_prompt_template("latex_frame_repair.prompt")
+
+    async def _fix(n: int) -> str:
+        fixed = await call_llm_text(
+            prompt.format(
+                error_snippet=failing[n],
+                preamble=parser.preamble,
+                frame=parser.frames[n],
+            ),
+            {},
+            use_cache=False,
+        )
+        if fixed.lstrip().startswith("```"):
+            fixed = fixed.split("```")[1].partition("\n")[2]
+        fixed = fixed.strip()
+        # keep the original if the answer isn't a frame at all
+        return fixed if _FRAME_START.match(fixed) else parser.frames[n]
+
+    fixes = dict(zip(failing, await asyncio.gather(*map(_fix, failing))))
+    if all(fixes[n] == parser.frames[n] for n in fixes):
+        return None
+    metrics.incr("latex.repair.frames", len(fixes))
+
+    text = parser.text
+    for n in sorted(fixes, reverse=True):
+        start, stop = parser.spans[n]
+        text = text[:start] + fixes[n] + text[stop:]
+    return text
 
 
 # main compile+repair loop
+def build_dir(job_id: str) -> Path:
+    """Private scratch dir for one job's compiles (under LATEX_BUILD_ROOT)."""
+    return settings.latex_build_root / job_id
+
+
 async def compile_latex_with_retries(
     latex_code: str,
     job_id: str,
     max_rounds: int = 5,
+    progress: ProgressCallback = noop,
 ) -> Path:
     """
     Compile LaTeX; on failure, redact path info, ask LLM to fix, and retry.
+    Every round is run through the rule-based sanitizer first; once the log
+    shows a stray `&` or `_`, that includes escaping them, which is tried
+    before asking the LLM. With LATEX_FRAME_REPAIR, a round only sends the
+    frames that fail to compile on their own, falling back to the whole
+    document.
+
+    Compiles run in the job's own build dir, which is removed afterwards;
+    the PDF is moved to {workspace_root}/{job_id}/presentation.pdf.
     """
-    tex_path = settings.workspace_root / f"{job_id}.tex"
+    workdir = build_dir(job_id)
+    shutil.rmtree(workdir, ignore_errors=True)
+    workdir.mkdir(parents=True)
+    name = "presentation"
+    tex_path = workdir / f"{name}.tex"
 
     async def _write(code: str):
         async with aiofiles.open(tex_path, "w", encoding="utf-8") as f:
             await f.write(code)
 
     current = latex_code
-    for attempt in range(1, max_rounds + 1):
-        await _write(current)
-        rc, stderr = await _pdflatex(job_id)
-        if rc == 0:
-            # second pass for references—skip error handling
-            if (await _pdflatex(job_id))[0] == 0:
-                logger.info("pdflatex succeeded on attempt {}", attempt)
-                return settings.workspace_root / f"{job_id}.pdf"
+    escape = False
+    try:
+        for attempt in range(1, max_rounds + 1):
+            current, fired = sanitize_latex(current, escape=escape)
+            if fired:
+                logger.info("Sanitizer fixed {} (attempt {})", fired, attempt)
+                await progress("latex_sanitized", {"attempt": attempt, "rules": fired})
+            await _write(current)
+            await progress("compile_attempt", {"attempt": attempt})
+            fmt = await _use_format(split_preamble(current), workdir)
+            rc, stderr, passes = await _compile_passes(
+                name,
+                workdir,
+                fmt,
+                _uses_navigation(current),
+                _shows_frame_total(current),
+            )
+            if rc == 0:
+                logger.info(
+                    "pdflatex succeeded on attempt {} ({} passes)", attempt, passes
+                )
+                await progress(
+                    "compile_succeeded", {"attempt": attempt, "passes": passes}
+                )
+                out = settings.workspace_root / job_id / f"{name}.pdf"
+                out.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(workdir / f"{name}.pdf", out)
+                return out
+
+            # ---- on failure --------------------------------------------------
+            logger.warning("pdflatex failed (attempt {})", attempt)
+            await progress("compile_failed", {"attempt": attempt})
 
-        # ---- on failure ------------------------------------------------------
-        logger.warning("pdflatex failed (attempt {})", attempt)
+            # collect tail of .log (typically more informative than stderr)
+            log_path = workdir / f"{name}.log"
+            log = ""
+            if log_path.exists():
+                log = log_path.read_text(encoding="utf-8", errors="ignore")
+            tail = "\n".join(log.splitlines()[-40:])
 
-        logger.info("Wating for 5 seconds before retrying")
-        sleep(5)
+            error_snippet = _scrub_paths(stderr + "\n" + tail)
 
-        # collect tail of .log (typically more informative than stderr)
-        log_path = settings.workspace_root / f"{job_id}.log"
-        tail = ""
-        if log_path.exists():
-            tail = "\n".join(log_path.read_text(encoding="utf-8").splitlines()[-40:])
+            if attempt == max_rounds:
+                raise HTTPException(
+                    status_code=500,
+                    detail="LaTeX compilation failed after auto-repair attempts.",
+                )
 
-        error_snippet = _scrub_paths(stderr + "\n" + tail)
+            # a stray `&` / `_` in text: the next round escapes them, and
+            # only needs the LLM if that is not enough -----------------------
+            if not escape and _ESCAPE_ERRORS.search(log):
+                escape = True
+                _, fired = sanitize_latex(current, escape=True, record=False)
+                if "unescaped_special" in fired:
+                    continue
 
-        if attempt == max_rounds:
-            raise HTTPException(
-                status_code=500,
-                detail="LaTeX compilation failed after auto-repair attempts.",
+            # back off (without blocking the event loop) before the next round
+            delay = min(
+                settings.latex_retry_max_delay_s,
+                settings.latex_retry_base_delay_s * 2 ** (attempt - 1),
             )
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
 
-        # ask LLM to repair ----------------------------------------------------
-        prompt = await load_prompt_template("latex_repair.prompt")
-        fixed = await call_llm_text(
-            prompt.format(
-                error_snippet=error_snippet,
-                latex_code=current,
-                beamer="{beamer}",
-                document="{document}",
-            ),
-            {},
-        )
-        if fixed.lstrip().startswith("```"):
-            fixed = fixed.split("```")[1]
-        current = fixed
+            # repair just the broken frames when they can be pinned down ------
+            if settings.latex_frame_repair:
+                patched = await _repair_frames(current, workdir, progress)
+                if patched is not None:
+                    current = patched
+                    continue
+
+            # ask LLM to repair the whole document -----------------------------
+            metrics.incr("latex.repair.document")
+            prompt = await load_prompt_template("latex_repair.prompt")
+            fixed = await call_llm_text(
+                prompt.format(
+                    error_snippet=error_snippet,
+                    latex_code=current,
+                    beamer="{beamer}",
+                    document="{document}",
+                ),
+                {},
+                # a cached answer would replay the same failed fix every round
+                use_cache=False,
+            )
+            if fixed.lstrip().startswith("```"):
+                fixed = fixed.split("```")[1]
+            current = fixed
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
 
     # should never reach here
     raise RuntimeError("compile_latex_with_retries: logic error")
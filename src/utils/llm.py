@@ -1,11 +1,18 @@
 import aiofiles
 import asyncio
+import hashlib
+import time
 import litellm
-from typing import Any, List, Dict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, List, Dict
 
+from fastapi import HTTPException
 from loguru import logger
 
 from src.config import settings
+from src.utils import metrics
+from src.utils.disk_cache import DiskCache, content_key
 
 
 async def load_prompt_template(name: str) -> str:
@@ -19,40 +26,191 @@ async def load_prompt_template(name: str) -> str:
         return await f.read()
 
 
-async def call_llm_text(prompt: str, variables: Dict[str, Any]) -> str:
+# ─── Per-model concurrency limiting ───────────────────────────────────────────
+_limiters: dict[str, asyncio.Semaphore] = {}
+_in_flight: dict[str, int] = {}
+
+
+def _model_limit(model: str) -> int:
+    return max(
+        1, settings.llm_model_concurrency.get(model, settings.llm_max_concurrency)
+    )
+
+
+@asynccontextmanager
+async def _llm_slot(model: str):
     """
-    For purely text‐based prompts (e.g. outline extraction).
+    Wait (at most `llm_queue_timeout_s`) for one of the worker's slots for
+    `model`. Queue wait and in-flight count are reported to metrics.
     """
-    # template = await load_prompt_template(prompt_name)
-    # prompt = template.format(**variables)
-    #
-    # logger.debug(f"{template=}")
-    # logger.debug(f"{prompt=}")
-
-    def _sync_call():
-        return litellm.completion(
-            model=settings.materials_extraction_model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=settings.materials_extraction_max_tokens,
-            temperature=0.2,
+    sema = _limiters.setdefault(model, asyncio.Semaphore(_model_limit(model)))
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(sema.acquire(), timeout=settings.llm_queue_timeout_s)
+    except asyncio.TimeoutError:
+        metrics.incr(f"llm.{model}.queue_timeout")
+        logger.warning("LLM queue timeout for {}", model)
+        raise HTTPException(
+            status_code=503, detail="LLM capacity exhausted, please retry shortly"
         )
+    metrics.observe(f"llm.{model}.queue_wait", time.perf_counter() - t0)
+
+    _in_flight[model] = _in_flight.get(model, 0) + 1
+    metrics.set_gauge(f"llm.{model}.in_flight", _in_flight[model])
+    try:
+        yield
+    finally:
+        _in_flight[model] -= 1
+        metrics.set_gauge(f"llm.{model}.in_flight", _in_flight[model])
+        sema.release()
+
+
+# ─── Response cache ───────────────────────────────────────────────────────────
+_response_cache = DiskCache(
+    "llm",
+    settings.cache_dir / "llm",
+    max_bytes=settings.llm_cache_max_mb * 1024 * 1024,
+    ttl_s=settings.llm_cache_ttl_s,
+    suffix=".txt",
+)
+
+
+@lru_cache(maxsize=1)
+def prompts_version() -> str:
+    """Hash of every template in prompts_dir; editing a prompt invalidates the cache."""
+    h = hashlib.sha256()
+    for p in sorted(settings.prompts_dir.glob("*.prompt")):
+        h.update(p.name.encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()[:16]
+
+
+async def _complete(
+    messages: List[Dict[str, Any]],
+    model: str | None = None,
+    max_tokens: int | None = None,
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    validate: Callable[[str], Any] | None = None,
+) -> str:
+    """
+    Native async completion (no executor thread held while the model runs).
+    Identical requests are answered from `_response_cache` unless
+    `use_cache` is False or LLM_CACHE_ENABLED is off.
+
+    Only complete answers (`finish_reason == "stop"`) are cached, and only
+    once `validate` (if given) has returned without raising, so a rejected
+    answer is asked for again on retry instead of replayed.
+    """
+    model = model or settings.materials_extraction_model
+    max_tokens = max_tokens or settings.materials_extraction_max_tokens
+
+    key = None
+    if use_cache and settings.llm_cache_enabled:
+        key = content_key(model, messages, max_tokens, temperature, prompts_version())
+        cached = await asyncio.to_thread(_response_cache.get_bytes, key)
+        if cached is not None:
+            logger.debug("LLM cache hit ({})", key[:12])
+            return cached.decode("utf-8")
+
+    async with _llm_slot(model):
+        t0 = time.perf_counter()
+        try:
+            response = await litellm.acompletion(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+        finally:
+            metrics.observe(f"llm.{model}.latency", time.perf_counter() - t0)
+    choice = response.choices[0]
+    content = choice.message.content
+    if validate is not None:
+        validate(content)
+
+    if key is not None and content and choice.finish_reason == "stop":
+        await asyncio.to_thread(_response_cache.put_bytes, key, content.encode("utf-8"))
+    return content
 
-    response = await asyncio.to_thread(_sync_call)
-    return response.choices[0].message.content
+
+async def call_llm_text(
+    prompt: str,
+    variables: Dict[str, Any],
+    use_cache: bool = True,
+    validate: Callable[[str], Any] | None = None,
+) -> str:
+    """
+    For purely text‐based prompts (e.g. outline extraction).
+    """
+    return await _complete(
+        [{"role": "user", "content": prompt}], use_cache=use_cache, validate=validate
+    )
 
 
-async def call_llm_multimedia(content_array: List[Dict[str, Any]]) -> str:
+async def call_llm_multimedia(
+    content_array: List[Dict[str, Any]],
+    use_cache: bool = True,
+    validate: Callable[[str], Any] | None = None,
+) -> str:
     """
     For image/pdf + prompt‐template payloads.
     """
+    return await _complete(
+        [{"role": "user", "content": content_array}],
+        use_cache=use_cache,
+        validate=validate,
+    )
 
-    def _sync_call():
-        return litellm.completion(
-            model=settings.materials_extraction_model,
-            messages=[{"role": "user", "content": content_array}],
-            max_tokens=settings.materials_extraction_max_tokens,
-            temperature=0.2,
-        )
 
-    response = await asyncio.to_thread(_sync_call)
-    return response.choices[0].message.content
+async def call_llm_stream(prompt: str, use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Like `call_llm_text`, but yields text deltas as the model produces them.
+    A cache hit yields the whole cached answer at once; a stream that ran
+    to `finish_reason == "stop"` is written back to the cache.
+    """
+    model = settings.materials_extraction_model
+    max_tokens = settings.materials_extraction_max_tokens
+    temperature = 0.2
+    messages = [{"role": "user", "content": prompt}]
+
+    key = None
+    if use_cache and settings.llm_cache_enabled:
+        key = content_key(model, messages, max_tokens, temperature, prompts_version())
+        cached = await asyncio.to_thread(_response_cache.get_bytes, key)
+        if cached is not None:
+            logger.debug("LLM cache hit ({})", key[:12])
+            yield cached.decode("utf-8")
+            return
+
+    parts: list[str] = []
+    async with _llm_slot(model):
+        t0 = time.perf_counter()
+        first = True
+        finish_reason = None
+        try:
+            stream = await litellm.acompletion(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+            )
+            async for chunk in stream:
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content or ""
+                if not delta:
+                    continue
+                if first:
+                    metrics.observe(
+                        f"llm.{model}.first_token", time.perf_counter() - t0
+                    )
+                    first = False
+                parts.append(delta)
+                yield delta
+        finally:
+            metrics.observe(f"llm.{model}.latency", time.perf_counter() - t0)
+
+    content = "".join(parts)
+    if key is not None and content and finish_reason == "stop":
+        await asyncio.to_thread(_response_cache.put_bytes, key, content.encode("utf-8"))
@@ -0,0 +1,30 @@
+"""
+Advisory file locks shared by every worker process on the box.
+"""
+
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+
+@asynccontextmanager
+async def file_lock(path: Path, poll_s: float = 0.05):
+    """
+    Hold an exclusive flock on `path` (created if missing) while the block
+    runs. Waiting polls instead of blocking a thread, so it can be
+    cancelled; the lock goes away with the fd, even if the process dies.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(poll_s)
+        yield
+    finally:
+        os.close(fd)
@@ -0,0 +1,67 @@
+"""
+Tiny in-process metrics registry.
+
+Counters and latency samples live per Uvicorn worker; `GET /metrics`
+returns the snapshot of whichever worker served the request.
+"""
+
+from collections import defaultdict, deque
+from statistics import median
+
+_MAX_SAMPLES = 1024
+
+_counters: dict[str, int] = defaultdict(int)
+_gauges: dict[str, float] = {}
+_timings: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=_MAX_SAMPLES))
+
+
+def incr(name: str, value: int = 1) -> None:
+    _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one latency sample (seconds) under `name`."""
+    _timings[name].append(seconds)
+
+
+def _summary(samples: deque[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(median(ordered) * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _hit_rates() -> dict[str, float]:
+    """`<name>.hit_rate` for every `<name>.hit` / `<name>.miss` counter pair."""
+    rates = {}
+    for name, hits in _counters.items():
+        if not name.endswith(".hit"):
+            continue
+        prefix = name[: -len(".hit")]
+        total = hits + _counters.get(f"{prefix}.miss", 0)
+        if total:
+            rates[f"{prefix}.hit_rate"] = round(hits / total, 4)
+    return rates
+
+
+def snapshot() -> dict:
+    return {
+        "counters": dict(_counters),
+        "hit_rates": _hit_rates(),
+        "gauges": dict(_gauges),
+        "timings": {k: _summary(v) for k, v in _timings.items() if v},
+    }
+
+
+def reset() -> None:
+    _counters.clear()
+    _gauges.clear()
+    _timings.clear()
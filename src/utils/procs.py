@@ -0,0 +1,149 @@
+"""
+Machine-wide scheduler for the heavy binaries we shell out to
+(pdflatex, pdftoppm, ffmpeg, pandoc).
+
+Each binary gets `settings.proc_slots[binary]` slots, one lock file each
+under {workspace_root}/locks/. A run holds a slot by flock-ing one of
+them, so the limit is shared by every Uvicorn worker on the box and a
+slot frees itself if its worker dies. Processes start niced in their own
+process group and are killed (group and all) when they outlive their
+timeout or the awaiting task is cancelled.
+"""
+
+import asyncio
+import fcntl
+import os
+import random
+import shutil
+import signal
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from src.config import settings
+from src.utils import metrics
+
+_REAP_TIMEOUT_S = 5.0  # how long a cancelled run waits for its killed process
+_waiting: dict[str, int] = {}
+_running: dict[str, int] = {}
+
+
+class ProcessTimeout(TimeoutError):
+    def __init__(self, cmd: list[str], timeout: float):
+        super().__init__(f"{cmd[0]} killed after {timeout:.0f}s")
+        self.cmd = cmd
+        self.timeout = timeout
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+
+
+def slots(binary: str) -> int:
+    return max(1, settings.proc_slots.get(binary, os.cpu_count() or 1))
+
+
+def threads(binary: str) -> int:
+    """Threads one run may use so that all slots together fit the CPUs."""
+    return max(1, (os.cpu_count() or 1) // slots(binary))
+
+
+def _gauge(kind: dict[str, int], binary: str, delta: int) -> None:
+    kind[binary] = kind.get(binary, 0) + delta
+    name = "waiting" if kind is _waiting else "running"
+    metrics.set_gauge(f"procs.{binary}.{name}", kind[binary])
+
+
+@asynccontextmanager
+async def slot(binary: str):
+    """Hold one of `binary`'s machine-wide slots while the block runs."""
+    lock_dir = settings.workspace_root / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    n = slots(binary)
+    fd = None
+    t0 = time.perf_counter()
+    _gauge(_waiting, binary, +1)
+    try:
+        while fd is None:
+            for i in random.sample(range(n), n):  # spread contention
+                candidate = os.open(
+                    lock_dir / f"{binary}.{i}.lock", os.O_RDWR | os.O_CREAT, 0o644
+                )
+                try:
+                    fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fd = candidate
+                    break
+                except BlockingIOError:
+                    os.close(candidate)
+            else:
+                await asyncio.sleep(settings.proc_poll_interval_s)
+    finally:
+        _gauge(_waiting, binary, -1)
+    metrics.observe(f"procs.{binary}.queue_wait", time.perf_counter() - t0)
+    _gauge(_running, binary, +1)
+    try:
+        yield
+    finally:
+        _gauge(_running, binary, -1)
+        os.close(fd)
+
+
+def _kill(proc: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def run(
+    cmd: list[str],
+    cwd: Path | None = None,
+    timeout: float | None = None,
+    binary: str | None = None,
+) -> ProcessResult:
+    """
+    Run `cmd` in one of its binary's slots and capture its output.
+    `timeout` defaults to `settings.proc_timeouts[binary]`; raises
+    ProcessTimeout once the process has been killed.
+    """
+    binary = binary or Path(cmd[0]).name
+    timeout = timeout or settings.proc_timeouts.get(binary)
+    argv = list(cmd)
+    if settings.proc_nice and shutil.which("nice"):
+        argv = ["nice", "-n", str(settings.proc_nice), *argv]
+
+    async with slot(binary):
+        logger.debug("Running command: {}", " ".join(cmd))
+        t0 = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True,  # own process group, so kill takes children
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            _kill(proc)
+            await proc.wait()
+            metrics.incr(f"procs.{binary}.timeout")
+            logger.error("{} timed out after {}s: {}", binary, timeout, " ".join(cmd))
+            raise ProcessTimeout(cmd, timeout) from None
+        except asyncio.CancelledError:
+            _kill(proc)
+            # reap it, so cancelled runs don't leave zombies behind
+            try:
+                await asyncio.wait_for(asyncio.shield(proc.wait()), _REAP_TIMEOUT_S)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            raise
+        finally:
+            metrics.observe(f"procs.{binary}.runtime", time.perf_counter() - t0)
+    return ProcessResult(proc.returncode, stdout, stderr)
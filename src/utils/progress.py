@@ -0,0 +1,14 @@
+"""
+Progress reporting hook threaded through the slide / presentation pipeline.
+
+Stages call `await progress(event, data)`; callers that don't care pass
+nothing and get `noop`.
+"""
+
+from typing import Any, Awaitable, Callable
+
+ProgressCallback = Callable[[str, dict[str, Any]], Awaitable[None]]
+
+
+async def noop(event: str, data: dict[str, Any]) -> None:
+    return None
@@ -0,0 +1,166 @@
+"""
+Daily generation quota backends.
+
+Every backend implements one atomic operation, `increment_and_check`:
+count a generation for (user, day) unless the user is already at the limit.
+Doing it in one step means concurrent builds can no longer race past
+`settings.max_gen_per_day` the way a read-then-write does.
+"""
+
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from loguru import logger
+from supabase import AsyncClient, acreate_client
+
+from src.config import settings
+
+
+class QuotaExceeded(Exception):
+    """The user has already used `limit` generations on `day`."""
+
+
+class QuotaBackend(ABC):
+    @abstractmethod
+    async def increment_and_check(self, user_id: str, day: str, limit: int) -> int:
+        """
+        Atomically record one generation for `user_id` on `day`.
+        Returns the new count, or raises QuotaExceeded (without counting)
+        when the user is already at `limit`.
+        """
+
+    async def aclose(self) -> None:
+        """Release pooled connections."""
+
+
+# ─── Supabase / PostgREST ─────────────────────────────────────────────────────
+class SupabaseQuotaBackend(QuotaBackend):
+    """
+    Calls the `increment_daily_generation` Postgres function
+    (supabase/migrations/) through one long-lived async client, so the
+    PostgREST connection pool is reused across requests.
+    """
+
+    rpc_name = "increment_daily_generation"
+
+    def __init__(self, url: str, service_key: str):
+        self._url = url
+        self._key = service_key
+        self._client: AsyncClient | None = None
+        self._lock = asyncio.Lock()
+
+    async def _get_client(self) -> AsyncClient:
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client = await acreate_client(self._url, self._key)
+        return self._client
+
+    async def increment_and_check(self, user_id: str, day: str, limit: int) -> int:
+        client = await self._get_client()
+        res = await client.rpc(
+            self.rpc_name,
+            {"p_user_id": user_id, "p_generation_date": day, "p_limit": limit},
+        ).execute()
+        if res.data is None:
+            raise QuotaExceeded(user_id)
+        return int(res.data)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.postgrest.aclose()
+            self._client = None
+
+
+# ─── SQLite (shared by all workers on the box) ────────────────────────────────
+class SQLiteQuotaBackend(QuotaBackend):
+    """
+    Local quota table in a WAL-mode SQLite file. The upsert below is a single
+    statement, so it is atomic across threads and Uvicorn worker processes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn: sqlite3.Connection | None = None
+        self._conn_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_generations (
+                    user_id TEXT NOT NULL,
+                    generation_date TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, generation_date)
+                )
+                """)
+            self._conn = conn
+        return self._conn
+
+    def _increment(self, user_id: str, day: str, limit: int) -> int | None:
+        if limit <= 0:
+            return None
+        with self._conn_lock:
+            row = (
+                self._connect()
+                .execute(
+                    """
+                    INSERT INTO daily_generations (user_id, generation_date, count)
+                    VALUES (?, ?, 1)
+                    ON CONFLICT (user_id, generation_date)
+                    DO UPDATE SET count = count + 1 WHERE count < ?
+                    RETURNING count
+                    """,
+                    (user_id, day, limit),
+                )
+                .fetchone()
+            )
+        return row[0] if row else None
+
+    async def increment_and_check(self, user_id: str, day: str, limit: int) -> int:
+        count = await asyncio.to_thread(self._increment, user_id, day, limit)
+        if count is None:
+            raise QuotaExceeded(user_id)
+        return count
+
+    async def aclose(self) -> None:
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ─── Backend selection ────────────────────────────────────────────────────────
+_backend: QuotaBackend | None = None
+
+
+def get_quota_backend() -> QuotaBackend:
+    """Build the configured backend on first use (`settings.quota_backend`)."""
+    global _backend
+    if _backend is None:
+        kind = settings.quota_backend.lower()
+        if kind == "supabase":
+            _backend = SupabaseQuotaBackend(
+                settings.supabase_url, settings.supabase_service_key
+            )
+        elif kind == "sqlite":
+            _backend = SQLiteQuotaBackend(settings.quota_db_path)
+        else:
+            raise RuntimeError(f"Unknown QUOTA_BACKEND: {settings.quota_backend}")
+        logger.info("Generation quota backend: {}", type(_backend).__name__)
+    return _backend
+
+
+async def close_quota_backend() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.aclose()
+        _backend = None
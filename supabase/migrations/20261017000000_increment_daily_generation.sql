@@ -0,0 +1,37 @@
+-- Atomic increment-and-check used by src/utils/quota.SupabaseQuotaBackend.
+-- Returns the new count, or NULL when the caller is already at p_limit
+-- (in which case nothing is written).
+
+create unique index if not exists daily_generations_user_date_key
+    on public.daily_generations (user_id, generation_date);
+
+create or replace function public.increment_daily_generation(
+    p_user_id uuid,
+    p_generation_date date,
+    p_limit integer
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    new_count integer;
+begin
+    if p_limit <= 0 then
+        return null;
+    end if;
+
+    insert into daily_generations as dg (user_id, generation_date, count)
+    values (p_user_id, p_generation_date, 1)
+    on conflict (user_id, generation_date)
+    do update set count = dg.count + 1
+    where dg.count < p_limit
+    returning dg.count into new_count;
+
+    return new_count;
+end;
+$$;
+
+revoke all on function public.increment_daily_generation(uuid, date, integer)
+    from public, anon, authenticated;
@@ -0,0 +1,179 @@
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+
+from src.config import settings
+from src.utils import auth
+
+
+@pytest.fixture()
+def signing_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+@pytest.fixture()
+def jwks_calls(monkeypatch, signing_key):
+    """
+    Serve a one-key JWKS through a mock transport and count the fetches.
+    """
+    jwk = jwt.algorithms.ECAlgorithm.to_jwk(signing_key.public_key(), as_dict=True)
+    jwk.update({"kid": "k1", "alg": "ES256", "use": "sig"})
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        return httpx.Response(200, json={"keys": [jwk]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(auth, "_http_client", lambda: client)
+    monkeypatch.setattr(
+        auth, "_jwks", auth._JWKSCache(settings.supabase_jwk_url, 600, 30)
+    )
+    monkeypatch.setattr(settings, "auth_mode", "local")
+    monkeypatch.setattr(settings, "auth_remote_fallback", False)
+    return calls
+
+
+def _token(key, kid="k1", **claims) -> str:
+    payload = {
+        "sub": "user-1",
+        "email": "a@b.c",
+        "role": "authenticated",
+        "aud": "authenticated",
+        "exp": int(time.time()) + 3600,
+    }
+    payload.update(claims)
+    return jwt.encode(payload, key, algorithm="ES256", headers={"kid": kid})
+
+
+@pytest.mark.anyio
+async def test_local_verification_uses_cached_jwks(signing_key, jwks_calls):
+    for _ in range(3):
+        data = await auth.verify_token(_token(signing_key))
+        assert data["id"] == "user-1"
+        assert data["email"] == "a@b.c"
+
+    assert len(jwks_calls) == 1
+
+
+@pytest.mark.anyio
+async def test_expired_token_rejected(signing_key, jwks_calls):
+    with pytest.raises(HTTPException) as exc:
+        await auth.verify_token(_token(signing_key, exp=int(time.time()) - 3600))
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_foreign_signature_rejected(jwks_calls):
+    other = ec.generate_private_key(ec.SECP256R1())
+    with pytest.raises(HTTPException) as exc:
+        await auth.verify_token(_token(other))
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_unknown_kid_refresh_is_rate_limited(signing_key, jwks_calls):
+    await auth.verify_token(_token(signing_key))
+
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            await auth.verify_token(_token(signing_key, kid="rotated"))
+        assert exc.value.status_code == 403
+    assert len(jwks_calls) == 1
+
+    # once the refresh interval has passed an unknown kid triggers a re-fetch
+    auth._jwks._attempted_at -= 60
+    with pytest.raises(HTTPException):
+        await auth.verify_token(_token(signing_key, kid="rotated"))
+    assert len(jwks_calls) == 2
+
+
+@pytest.mark.anyio
+async def test_token_cache_hits_and_negative_caching(
+    signing_key, jwks_calls, monkeypatch
+):
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from src.utils import metrics
+
+    monkeypatch.setattr(auth, "_token_cache", auth._TokenCache(100, 300, 30))
+    metrics.reset()
+
+    good = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=_token(signing_key)
+    )
+    for _ in range(3):
+        user = await auth.get_current_user(good)
+        assert user.id == "user-1"
+
+    bad_token = _token(signing_key, exp=int(time.time()) - 3600)
+    bad = HTTPAuthorizationCredentials(scheme="Bearer", credentials=bad_token)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await auth.get_current_user(bad)
+        assert exc.value.status_code == 403
+
+    counters = metrics.snapshot()["counters"]
+    assert counters["auth.token_cache.miss"] == 2
+    assert counters["auth.token_cache.hit"] == 2
+    assert counters["auth.token_cache.negative_hit"] == 1
+
+
+def test_token_cache_entry_bounded_by_exp_and_size():
+    cache = auth._TokenCache(max_entries=2, ttl=300, negative_ttl=30)
+    user = auth.User(id="u")
+
+    cache.put_user("expired", user, exp=time.time() - 1)
+    assert cache.get("expired") is None
+
+    cache.put_user("a", user, exp=None)
+    cache.put_user("b", user, exp=None)
+    cache.get("a")  # refresh "a" so "b" is evicted first
+    cache.put_user("c", user, exp=None)
+    assert cache.get("a") is user
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+@pytest.mark.anyio
+async def test_stale_refresh_is_rate_limited_during_outage(
+    signing_key, jwks_calls, monkeypatch
+):
+    await auth.verify_token(_token(signing_key))
+    assert len(jwks_calls) == 1
+
+    def down(request: httpx.Request) -> httpx.Response:
+        jwks_calls.append(request.url)
+        return httpx.Response(503)
+
+    auth._jwks.ttl = 0  # every lookup now sees a stale key set
+    client = httpx.AsyncClient(transport=httpx.MockTransport(down))
+    monkeypatch.setattr(auth, "_http_client", lambda: client)
+    auth._jwks._attempted_at -= 60
+
+    for _ in range(3):
+        data = await auth.verify_token(_token(signing_key))
+        assert data["id"] == "user-1"  # served from the stale key set
+    assert len(jwks_calls) == 2
+
+
+@pytest.mark.anyio
+async def test_unknown_kid_is_not_negative_cached(signing_key, jwks_calls, monkeypatch):
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    monkeypatch.setattr(auth, "_token_cache", auth._TokenCache(100, 300, 30))
+    rotated = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=_token(signing_key, kid="k2")
+    )
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_user(rotated)
+    assert exc.value.status_code == 403
+
+    # the new key shows up in the JWKS; the same token must now verify
+    auth._jwks._keys["k2"] = auth._jwks._keys["k1"]
+    user = await auth.get_current_user(rotated)
+    assert user.id == "user-1"
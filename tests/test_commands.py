@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import pytest
+
+from src.config import settings
+from src.utils import commands
+from src.utils.commands import (
+    build_single_pass_cmd,
+    build_still_clip_cmd,
+    write_image_concat,
+)
+
+
+def test_still_clip_length_follows_narration():
+    cmd = build_still_clip_cmd(
+        Path("s.png"), Path("a.mp3"), Path("c.mp4"), duration=4.25, offset=0.5
+    )
+    assert cmd[cmd.index("-t") + 1] == "4.750"
+    assert "-shortest" not in cmd
+    assert cmd[cmd.index("-tune") + 1] == "stillimage"
+    assert "apad" in cmd[cmd.index("-filter_complex") + 1]
+
+    cmd = build_still_clip_cmd(Path("s.png"), Path("a.mp3"), Path("c.mp4"))
+    assert "-shortest" in cmd and "-t" not in cmd
+
+
+def test_single_pass_cmd_offsets_and_joins_narration(tmp_path):
+    images = tmp_path / "images.ffconcat"
+    write_image_concat([(Path("/p/1.png"), 3.5), (Path("/p/2.png"), 2.0)], images)
+    assert images.read_text().splitlines() == [
+        "ffconcat version 1.0",
+        "file '/p/1.png'",
+        "duration 3.500",
+        "file '/p/2.png'",
+        "duration 2.000",
+        "file '/p/2.png'",
+    ]
+
+    cmd = build_single_pass_cmd(
+        images, [(Path("1.mp3"), 3.0), (Path("2.mp3"), 1.5)], Path("out.mp4")
+    )
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "[1:a]" in graph and "atrim=end=3.500[a1]" in graph
+    assert "atrim=end=2.000[a2]" in graph
+    assert graph.endswith("[a1][a2]concat=n=2:v=0:a=1[a]")
+
+
+@pytest.mark.anyio
+async def test_rasterisation_is_sharded_with_thumbnails_first(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "pngs_dir", tmp_path)
+    monkeypatch.setattr(settings, "raster_format", "jpeg")
+    monkeypatch.setattr(settings, "raster_pages_per_shard", 2)
+    monkeypatch.setattr(settings, "raster_variant_widths", [320, 960])
+    shards = []
+
+    async def page_count(pdf):
+        return 5
+
+    async def fake_pdftoppm(cmd, cwd=None):
+        if "-f" in cmd:
+            first, last = int(cmd[cmd.index("-f") + 1]), int(cmd[cmd.index("-l") + 1])
+            shards.append((first, last))
+            assert "-scale-to" in cmd and "-jpeg" in cmd
+        else:  # one run per variant width
+            first, last = 1, 5
+        for page in range(first, last + 1):
+            Path(f"{cmd[-1]}-{page:02d}.jpg").write_bytes(b"jpg")
+
+    monkeypatch.setattr(commands, "pdf_page_count", page_count)
+    monkeypatch.setattr(commands, "_run", fake_pdftoppm)
+    events = []
+
+    async def progress(event, data):
+        events.append((event, data))
+
+    urls = await commands.convert_pdf_to_pngs(tmp_path / "deck.pdf", "j1", progress)
+
+    assert sorted(shards) == [(1, 2), (3, 4), (5, 5)]
+    assert urls == [f"/pngs/j1/slide_{i}.jpg" for i in range(1, 6)]
+    assert events[0] == (
+        "thumbnails_ready",
+        {"urls": [f"/pngs/j1/w320/slide_{i}.jpg" for i in range(1, 6)]},
+    )
+    assert sorted(d["index"] for e, d in events[1:]) == [1, 2, 3, 4, 5]
+
+    manifest = commands.read_slide_manifest("j1")
+    assert manifest[3]["url"] == "/pngs/j1/slide_3.jpg"
+    assert manifest[3]["variants"] == {
+        "320": "/pngs/j1/w320/slide_3.jpg",
+        "960": "/pngs/j1/w960/slide_3.jpg",
+    }
@@ -0,0 +1,42 @@
+import os
+import time
+
+from src.utils.disk_cache import DiskCache, content_key
+
+
+def test_roundtrip_and_key_stability(tmp_path):
+    cache = DiskCache("t", tmp_path, max_bytes=1 << 20)
+    key = content_key("model", [{"role": "user", "content": "x"}], 10)
+
+    assert key == content_key("model", [{"role": "user", "content": "x"}], 10)
+    assert cache.get_bytes(key) is None
+
+    cache.put_bytes(key, b"hello")
+    assert cache.get_bytes(key) == b"hello"
+    assert not list(tmp_path.glob("*/.tmp-*"))
+
+
+def test_ttl_expiry(tmp_path):
+    cache = DiskCache("t", tmp_path, max_bytes=1 << 20, ttl_s=60)
+    path = cache.put_bytes("ab" * 32, b"old")
+    past = time.time() - 120
+    os.utime(path, (past, past))
+
+    assert cache.get_bytes("ab" * 32) is None
+    assert not path.exists()
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = DiskCache("t", tmp_path, max_bytes=25, evict_interval_s=3600)
+    keys = [f"{i:02d}" * 32 for i in range(3)]
+    for age, key in zip((300, 200, 100), keys):
+        path = cache.put_bytes(key, b"x" * 10)
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+
+    cache.get_path(keys[0])  # oldest entry is used again
+    cache.evict()
+
+    assert cache.get_bytes(keys[0]) is not None
+    assert cache.get_bytes(keys[1]) is None
+    assert cache.get_bytes(keys[2]) is not None
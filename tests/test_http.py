@@ -0,0 +1,29 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.utils.http import _PerHostLimitTransport
+
+
+@pytest.mark.anyio
+async def test_per_host_limit_caps_in_flight_requests():
+    in_flight = {"a.test": 0, "b.test": 0}
+    peak = {"a.test": 0, "b.test": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200, text="ok")
+
+    transport = _PerHostLimitTransport(httpx.MockTransport(handler), per_host=2)
+    async with httpx.AsyncClient(transport=transport) as client:
+        responses = await asyncio.gather(
+            *(client.get(f"https://{h}/x") for h in ["a.test", "b.test"] * 6)
+        )
+
+    assert all(r.text == "ok" for r in responses)
+    assert peak == {"a.test": 2, "b.test": 2}
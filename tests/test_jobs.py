@@ -0,0 +1,171 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from src.config import settings
+from src.services import job_engine, jobs
+
+
+def _parse(frames: list[str]) -> list[tuple[str, dict]]:
+    out = []
+    for frame in frames:
+        fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+        out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+@pytest.fixture()
+def workspace(tmp_path, monkeypatch):
+    """Point the workspace (job logs, job DB, ...) at a throwaway dir."""
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    for name in ("materials", "pngs", "audios", "videos", "cache"):
+        monkeypatch.setattr(settings, f"{name}_dir", tmp_path / name)
+    monkeypatch.setattr(settings, "job_db_path", tmp_path / "jobs.sqlite3")
+    return tmp_path
+
+
+@pytest.mark.anyio
+async def test_events_stream_until_terminal_event(workspace):
+    job_id = uuid.uuid4().hex
+    events = await jobs.create_job(job_id, "owner", "build_slides")
+
+    async def produce():
+        await events.emit("compile_attempt", {"attempt": 1})
+        await asyncio.sleep(0.05)
+        await events.emit(
+            "slide_rasterised", {"index": 1, "url": "/pngs/x/slide_1.png"}
+        )
+        await events.emit("done", {"result": ["/pngs/x/slide_1.png"]})
+
+    producer = asyncio.create_task(produce())
+    frames = [f async for f in jobs.stream_events(job_id)]
+    await producer
+
+    assert [e for e, _ in _parse(frames)] == [
+        "compile_attempt",
+        "slide_rasterised",
+        "done",
+    ]
+
+    # reconnecting with Last-Event-ID only replays what was missed
+    replay = [f async for f in jobs.stream_events(job_id, last_event_id=2)]
+    assert [e for e, _ in _parse(replay)] == ["done"]
+
+
+@pytest.fixture()
+def engine(workspace, monkeypatch):
+    monkeypatch.setattr(settings, "job_max_running_per_worker", 1)
+    monkeypatch.setattr(settings, "job_max_running_per_user", 1)
+    monkeypatch.setattr(job_engine, "_tasks", {})
+    return job_engine
+
+
+def test_claim_order_priority_then_fairness(engine):
+    engine._insert("a", "u1", "t", {}, 0)
+    engine._insert("b", "u1", "t", {}, 0)
+    engine._insert("c", "u2", "t", {}, 0)
+    engine._insert("d", "u1", "t", {}, 10)
+    for job_id in "abcd":
+        engine._release(job_id)
+
+    assert engine._claim(1)["id"] == "d"
+    # u1 is at its running cap, so u2 goes next despite queueing later
+    assert engine._claim(1)["id"] == "c"
+    assert engine._claim(1) is None
+
+
+@pytest.mark.anyio
+async def test_engine_runs_and_cancels_jobs(engine):
+    started = asyncio.Event()
+
+    async def slow(job_id, payload, progress):
+        await progress("working", {"n": payload["n"]})
+        started.set()
+        await asyncio.sleep(3600)
+
+    async def quick(job_id, payload, progress):
+        return payload["n"] * 2
+
+    engine.register("slow", slow)
+    engine.register("quick", quick)
+
+    await engine.submit("job-slow", "u1", "slow", {"n": 1})
+    await engine._tick(pid=1)
+    await started.wait()
+    assert (await engine.status("job-slow", "u1"))["status"] == "running"
+
+    await engine.cancel("job-slow", "u1")
+    await engine._tick(pid=1)
+    await asyncio.gather(*engine._tasks.values(), return_exceptions=True)
+    assert (await engine.status("job-slow", "u1"))["status"] == "cancelled"
+
+    await engine.submit("job-quick", "u2", "quick", {"n": 21})
+    await engine._tick(pid=1)
+    frames = [f async for f in jobs.stream_events("job-quick")]
+    assert _parse(frames)[-1] == ("done", {"result": 42})
+    assert (await engine.status("job-quick", "u2"))["status"] == "done"
+
+    events = [f async for f in jobs.stream_events("job-slow")]
+    assert [e for e, _ in _parse(events)] == [
+        "queued",
+        "started",
+        "working",
+        "cancelled",
+    ]
+
+
+@pytest.mark.anyio
+async def test_job_owner_is_enforced(engine):
+    async def noop(job_id, payload, progress):
+        return None
+
+    engine.register("noop", noop)
+    await engine.submit("job-owned", "owner", "noop", {})
+
+    with pytest.raises(HTTPException) as exc:
+        await engine.status("job-owned", "someone-else")
+    assert exc.value.status_code == 404
+
+    # an active job id can't be resubmitted
+    with pytest.raises(HTTPException) as exc:
+        await engine.submit("job-owned", "owner", "noop", {})
+    assert exc.value.status_code == 409
+
+    # nor can another user take over a finished one
+    await asyncio.to_thread(engine._finish, "job-owned", "done")
+    with pytest.raises(HTTPException) as exc:
+        await engine.submit("job-owned", "someone-else", "noop", {"evil": 1})
+    assert exc.value.status_code == 404
+    row = await asyncio.to_thread(engine._row, "job-owned")
+    assert (row["owner"], row["payload"], row["status"]) == ("owner", "{}", "done")
+
+
+def test_stage_budget_is_split_across_workers(monkeypatch):
+    monkeypatch.setattr(settings, "stage_limits", {"latex": 8, "video": 1})
+    monkeypatch.setattr(settings, "uvicorn_workers", 3)
+
+    assert job_engine._stage_slots("latex") == 2  # 3 workers x 2 <= 8
+    assert job_engine._stage_slots("video") == 1
+
+
+@pytest.mark.anyio
+async def test_overlapping_submits_keep_the_live_job_log(engine):
+    async def noop(job_id, payload, progress):
+        return None
+
+    engine.register("noop", noop)
+    events = await engine.submit("job-dup", "owner", "noop", {})
+    await events.emit("working", {})
+
+    results = await asyncio.gather(
+        engine.submit("job-dup", "owner", "noop", {}),
+        engine.submit("job-dup", "owner", "noop", {}),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, HTTPException) and r.status_code == 409 for r in results)
+    log = jobs._events_path("job-dup").read_text().splitlines()
+    assert [json.loads(line)["event"] for line in log] == ["queued", "working"]
@@ -0,0 +1,453 @@
+import asyncio
+import re
+
+import pytest
+
+from src.config import settings
+from src.utils import latex, procs
+from src.utils.latex import BeamerStreamParser
+
+DECK = r"""```latex
+\documentclass{beamer}
+\title{Chain rule}
+\begin{document}
+\frame{\titlepage}
+\section{Intro}
+\begin{frame}{Definition}
+  $\frac{d}{dx} f(g(x)) = f'(g(x))\,g'(x)$ and \{braces\}
+\end{frame}
+\frame[plain]{\frametitle{Recap} Done.}
+\end{document}
+```"""
+
+
+def _feed_in_chunks(text: str, size: int) -> tuple[BeamerStreamParser, list]:
+    parser = BeamerStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i : i + size]))
+    return parser, events
+
+
+def test_stream_parser_finds_preamble_and_frames_across_chunk_boundaries():
+    for size in (1, 7, 64, len(DECK)):
+        parser, events = _feed_in_chunks(DECK, size)
+
+        kinds = [kind for kind, _ in events]
+        assert kinds == ["preamble", "frame", "frame", "frame"]
+        assert parser.preamble.startswith(r"\documentclass{beamer}")
+        assert parser.frames[0] == r"\frame{\titlepage}"
+        assert parser.frames[1].startswith(r"\begin{frame}{Definition}")
+        assert parser.frames[1].endswith(r"\end{frame}")
+        assert parser.frames[2] == r"\frame[plain]{\frametitle{Recap} Done.}"
+
+
+def test_stream_parser_holds_back_unfinished_frame():
+    parser = BeamerStreamParser()
+    events = parser.feed(
+        "\\documentclass{beamer}\n\\begin{document}\n\\begin{frame}{A}"
+    )
+
+    assert [kind for kind, _ in events] == ["preamble"]
+    assert parser.feed(" text \\end{fr") == []
+    assert [kind for kind, _ in parser.feed("ame}\n")] == ["frame"]
+
+
+@pytest.mark.anyio
+async def test_compile_loop_isolates_build_dir_and_backs_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_root", tmp_path / "ws")
+    monkeypatch.setattr(settings, "latex_build_root", tmp_path / "build")
+    monkeypatch.setattr(settings, "latex_retry_base_delay_s", 0.0)
+    monkeypatch.setattr(settings, "latex_format_cache", False)
+    attempts = []
+
+    async def fake_pdflatex(name, cwd=None, fmt=None):
+        attempts.append(cwd)
+        if "fixed" not in (cwd / f"{name}.tex").read_text():
+            (cwd / f"{name}.log").write_text("! Undefined control sequence.")
+            return 1, ""
+        (cwd / f"{name}.pdf").write_bytes(b"%PDF")
+        return 0, ""
+
+    async def fake_llm(prompt, variables, use_cache=True):
+        assert "Undefined control sequence" in prompt
+        return "fixed"
+
+    monkeypatch.setattr(latex, "_pdflatex", fake_pdflatex)
+    monkeypatch.setattr(latex, "call_llm_text", fake_llm)
+
+    pdf = await latex.compile_latex_with_retries("broken", "job1")
+
+    assert pdf == tmp_path / "ws" / "job1" / "presentation.pdf"
+    assert pdf.read_bytes() == b"%PDF"
+    assert set(attempts) == {tmp_path / "build" / "job1"}
+    assert not (tmp_path / "build" / "job1").exists()
+    assert not list((tmp_path / "ws").glob("job1.*"))
+
+
+def test_preamble_key_ignores_only_trailing_whitespace():
+    a = "\\documentclass{beamer}\n\\usepackage{tikz}\n"
+    b = "\\documentclass{beamer}  \n\\usepackage{tikz}\t\n"
+    c = "\\documentclass{beamer}\n\\usepackage{amsmath}\n"
+    # the `%` line end keeps the space out of the macro; the key must differ
+    d = "\\documentclass{beamer}%\n\\usepackage{tikz}\n"
+
+    assert latex.format_key(a) == latex.format_key(b)
+    assert latex.format_key(a) != latex.format_key(c)
+    assert latex.format_key(a) != latex.format_key(d)
+
+
+@pytest.mark.anyio
+async def test_stale_format_falls_back_to_plain_compile(tmp_path, monkeypatch):
+    cache = latex.DiskCache("latexfmt-test", tmp_path / "fmt", max_bytes=1 << 20)
+    monkeypatch.setattr(latex, "_formats", cache)
+    monkeypatch.setattr(latex, "_bad_formats", set())
+    monkeypatch.setattr(settings, "latex_format_cache", True)
+    preamble = "\\documentclass{beamer}\n"
+    key = latex.format_key(preamble)
+    cache.put_bytes(key, b"stale format")
+    calls = []
+
+    async def fake_pdflatex(name, cwd=None, fmt=None):
+        calls.append(fmt)
+        if fmt:
+            assert (cwd / f"{fmt}.fmt").read_bytes() == b"stale format"
+            return 1, "Fatal format file error"
+        (cwd / f"{name}.pdf").write_bytes(b"%PDF")
+        return 0, ""
+
+    monkeypatch.setattr(latex, "_pdflatex", fake_pdflatex)
+
+    pdf = await latex.compile_snippet(preamble, "hi", tmp_path / "work", "s")
+    again = await latex.compile_snippet(preamble, "hi", tmp_path / "work", "s")
+
+    assert pdf is not None and again is not None
+    assert calls == [key, None, None]
+    assert cache.get_path(key) is None
+
+
+@pytest.mark.anyio
+async def test_source_error_with_format_is_not_compiled_twice(tmp_path, monkeypatch):
+    cache = latex.DiskCache("latexfmt-test", tmp_path / "fmt", max_bytes=1 << 20)
+    monkeypatch.setattr(latex, "_formats", cache)
+    monkeypatch.setattr(latex, "_bad_formats", set())
+    monkeypatch.setattr(settings, "latex_format_cache", True)
+    preamble = "\\documentclass{beamer}\n"
+    key = latex.format_key(preamble)
+    cache.put_bytes(key, b"good format")
+    calls = []
+
+    async def fake_pdflatex(name, cwd=None, fmt=None):
+        calls.append(fmt)
+        (cwd / f"{name}.log").write_text("! Undefined control sequence.")
+        return 1, ""
+
+    monkeypatch.setattr(latex, "_pdflatex", fake_pdflatex)
+
+    assert await latex.compile_snippet(preamble, "\\oops", tmp_path / "w", "s") is None
+    assert calls == [key]
+    assert cache.get_path(key) is not None
+
+
+@pytest.mark.anyio
+async def test_extra_passes_only_while_cross_references_settle(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "latex_max_passes", 3)
+    runs = []
+
+    async def fake_pass(name, workdir, fmt):
+        # labels land in the .aux on the first pass and are stable afterwards
+        tex = (workdir / f"{name}.tex").read_text()
+        labels = "".join(
+            f"\\newlabel{{{label}}}{{{{1}}{{1}}}}\n"
+            for label in re.findall(r"\\label\{(\w+)\}", tex)
+        )
+        (workdir / f"{name}.aux").write_text("\\relax\n" + labels)
+        (workdir / f"{name}.log").write_text("Output written on s.pdf")
+        runs.append(name)
+        return 0, ""
+
+    monkeypatch.setattr(latex, "_compile_pass", fake_pass)
+    plain = tmp_path / "plain"
+    plain.mkdir()
+    (plain / "s.tex").write_text("\\begin{frame}Hi\\end{frame}")
+    refs = tmp_path / "refs"
+    refs.mkdir()
+    (refs / "s.tex").write_text("\\begin{frame}\\label{intro}See \\ref{intro}")
+
+    assert (await latex._compile_passes("s", plain, None, nav=False))[2] == 1
+    assert (await latex._compile_passes("s", refs, None, nav=False))[2] == 2
+
+
+@pytest.mark.anyio
+async def test_failing_frame_is_repaired_alone_and_spliced_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_root", tmp_path / "ws")
+    monkeypatch.setattr(settings, "latex_build_root", tmp_path / "build")
+    monkeypatch.setattr(settings, "latex_retry_base_delay_s", 0.0)
+    monkeypatch.setattr(settings, "latex_format_cache", False)
+    monkeypatch.setattr(settings, "latex_frame_repair", True)
+    compiled = []
+
+    async def fake_pdflatex(name, cwd=None, fmt=None):
+        tex = (cwd / f"{name}.tex").read_text()
+        if name == "presentation":
+            compiled.append(tex)
+        if "\\oops" in tex:
+            (cwd / f"{name}.log").write_text(
+                "(./frame.tex\n! Undefined control sequence.\nl.4 \\oops\n)"
+            )
+            return 1, ""
+        body = tex.split("\\begin{document}")[1].split("\\end{document}")[0]
+        if not body.strip():  # like pdflatex: no pages, no PDF
+            (cwd / f"{name}.log").write_text("No pages of output.")
+            return 0, ""
+        (cwd / f"{name}.pdf").write_bytes(b"%PDF")
+        return 0, ""
+
+    prompts = []
+
+    async def fake_llm(prompt, variables, use_cache=True):
+        prompts.append(prompt)
+        return "```latex\n\\begin{frame}{Two}fixed\\end{frame}\n```"
+
+    monkeypatch.setattr(latex, "_pdflatex", fake_pdflatex)
+    monkeypatch.setattr(latex, "call_llm_text", fake_llm)
+    deck = (
+        "\\documentclass{beamer}\n\\begin{document}\n"
+        "\\begin{frame}{One}alpha\\end{frame}\n"
+        "\\begin{frame}{Two}\\oops\\end{frame}\n"
+        "\\begin{frame}{Three}gamma\\end{frame}\n\\end{document}\n"
+    )
+
+    await latex.compile_latex_with_retries(deck, "job2")
+
+    assert len(prompts) == 1
+    assert "\\oops" in prompts[0] and "Undefined control sequence" in prompts[0]
+    assert "alpha" not in prompts[0] and "gamma" not in prompts[0]
+    assert compiled[-1] == deck.replace("\\oops", "fixed")
+
+
+def test_sanitizer_fixes_mechanical_errors_and_reports_rules(tmp_path):
+    (tmp_path / "real.png").write_bytes(b"png")
+    messy = (
+        "```latex\n\\documentclass{beamer}\n\\begin{document}\n"
+        "\\begin{frame}{R&D_plan}\n"
+        "  \\begin{itemize}\n  \\item 50% of $x_1$ \\pause done \\label{a_b}\n"
+        "  \\item \\includegraphics[width=3cm]{fake} \\includegraphics{real}\n"
+        "\\end{frame}\n"
+        "\\begin{frame}\\begin{tabular}{cc} a & b \\\\ \\end{tabular}\\end{itemize}"
+        "\\end{frame} % trailing_comment &\n```\n"
+    )
+
+    fixed, fired = latex.sanitize_latex(messy, asset_dir=tmp_path, escape=True)
+
+    assert fixed == (
+        "\\documentclass{beamer}\n\\begin{document}\n"
+        "\\begin{frame}{R\\&D\\_plan}\n"
+        "  \\begin{itemize}\n  \\item 50\\% of $x_1$ done \\label{a_b}\n"
+        "  \\item  \\includegraphics{real}\n"
+        "\\end{itemize}\\end{frame}\n"
+        "\\begin{frame}\\begin{tabular}{cc} a & b \\\\ \\end{tabular}"
+        "\\end{frame} % trailing_comment &\n\\end{document}\n"
+    )
+    assert fired == [
+        "code_fence",
+        "pause",
+        "missing_graphics",
+        "missing_end_document",
+        "unbalanced_environment",
+        "unescaped_special",
+    ]
+    assert latex.sanitize_latex(fixed, asset_dir=tmp_path, escape=True) == (fixed, [])
+
+
+@pytest.mark.anyio
+async def test_stream_failure_stops_preview_compiles(tmp_path, monkeypatch):
+    from src.services import presentation
+
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    started, cancelled = asyncio.Event(), []
+
+    async def stream(prompt):
+        yield "\\documentclass{beamer}\\begin{document}\\frame{a}"
+        await started.wait()
+        raise RuntimeError("LLM went away")
+
+    async def hanging_compile(preamble, body, workdir, name):
+        workdir.mkdir(parents=True, exist_ok=True)
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    monkeypatch.setattr(presentation, "call_llm_stream", stream)
+    monkeypatch.setattr(presentation, "compile_snippet", hanging_compile)
+
+    with pytest.raises(RuntimeError):
+        await presentation._generate_latex_streaming("job3", "p", latex.noop)
+
+    assert cancelled
+    assert not (tmp_path / "job3" / "preview").exists()
+
+
+@pytest.mark.anyio
+async def test_streamed_document_keeps_body_after_prose(tmp_path, monkeypatch):
+    from src.services import presentation
+
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    monkeypatch.setattr(settings, "beamer_streaming", True)
+    compiled = []
+
+    async def stream(prompt):
+        yield "Here is your deck:\n```latex\n\\documentclass{beamer}\n"
+        yield "\\begin{document}\n\\frame{a}\n\\end{document}\n```\n"
+
+    async def fake_compile(code, job_id, progress):
+        compiled.append(code)
+        return tmp_path / "deck.pdf"
+
+    async def no_preview(*args):
+        return None
+
+    async def no_pngs(pdf, job_id, progress):
+        return []
+
+    monkeypatch.setattr(presentation, "call_llm_stream", stream)
+    monkeypatch.setattr(presentation, "compile_snippet", no_preview)
+    monkeypatch.setattr(presentation, "check_preamble", no_preview)
+    monkeypatch.setattr(presentation, "compile_latex_with_retries", fake_compile)
+    monkeypatch.setattr(presentation, "convert_pdf_to_pngs", no_pngs)
+
+    await presentation.create_slides_from_outline("job4", [], cached=False)
+
+    assert compiled == [
+        "\\documentclass{beamer}\n\\begin{document}\n\\frame{a}\n\\end{document}\n"
+    ]
+
+
+@pytest.mark.anyio
+async def test_changed_frame_total_forces_another_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "latex_max_passes", 3)
+
+    async def fake_pass(name, workdir, fmt):
+        # the frame total only reaches the .nav; other .nav entries keep
+        # changing here but don't matter without a navigation theme
+        runs = len(list(workdir.glob("run*"))) + 1
+        (workdir / f"run{runs}").touch()
+        (workdir / f"{name}.nav").write_text(
+            f"\\headcommand {{\\slideentry {{0}}{{0}}{{1}}{{{runs}}}}}\n"
+            "\\headcommand {\\def \\inserttotalframenumber {4}}\n"
+        )
+        return 0, ""
+
+    monkeypatch.setattr(latex, "_compile_pass", fake_pass)
+
+    passes = await latex._compile_passes("s", tmp_path, None, nav=False, total=True)
+    assert passes[2] == 2
+
+
+@pytest.mark.anyio
+async def test_plain_deck_compiles_in_one_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_root", tmp_path / "ws")
+    monkeypatch.setattr(settings, "latex_build_root", tmp_path / "build")
+    monkeypatch.setattr(settings, "latex_format_cache", False)
+    monkeypatch.setattr(settings, "latex_max_passes", 3)
+    passes = []
+
+    async def fake_pdflatex(name, cwd=None, fmt=None):
+        # beamer always writes the total to the .nav, shown or not
+        (cwd / f"{name}.nav").write_text(
+            "\\headcommand {\\def \\inserttotalframenumber {1}}\n"
+        )
+        (cwd / f"{name}.pdf").write_bytes(b"%PDF")
+        return 0, ""
+
+    async def progress(event, data):
+        if event == "compile_succeeded":
+            passes.append(data["passes"])
+
+    monkeypatch.setattr(latex, "_pdflatex", fake_pdflatex)
+
+    deck = "\\documentclass{beamer}\n\\begin{document}\n\\frame{a}\n\\end{document}\n"
+    await latex.compile_latex_with_retries(deck, "plain", progress=progress)
+    footline = deck.replace(
+        "\\begin{document}",
+        "\\setbeamertemplate{footline}[frame number]\n\\begin{document}",
+    )
+    await latex.compile_latex_with_retries(footline, "numbered", progress=progress)
+
+    assert passes == [1, 2]
+
+
+def test_sanitizer_leaves_inline_verbatim_alone():
+    body = (
+        "\\verb|a_b| \\verb*+c&d+ \\lstinline|x&y| \\lstinline[language=C]{p_q} "
+        "\\mintinline{py}{r_s} but t_u"
+    )
+
+    fixed, fired = latex.sanitize_latex(body, fragment=True, record=False, escape=True)
+
+    assert fixed == body.replace("t_u", "t\\_u")
+    assert fired == ["unescaped_special"]
+
+
+def test_sanitizer_leaves_literal_arguments_and_options_alone():
+    body = (
+        "\\begin{frame}[label=intro_frame]{Q&A}\\ensuremath{x_1} "
+        "\\hyperlink{sec_two}{Part_2} \\hypertarget{sec_two}{} "
+        "\\tikz \\node[name=a_b] (c_d) {}; \\end{frame}"
+    )
+
+    fixed, _ = latex.sanitize_latex(body, fragment=True, record=False, escape=True)
+    assert fixed == body.replace("Q&A", "Q\\&A").replace("Part_2", "Part\\_2")
+    # without a compile error asking for it, nothing is escaped at all
+    assert latex.sanitize_latex(body, fragment=True, record=False) == (body, [])
+
+
+@pytest.mark.anyio
+async def test_escaping_waits_for_a_compile_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_root", tmp_path / "ws")
+    monkeypatch.setattr(settings, "latex_build_root", tmp_path / "build")
+    monkeypatch.setattr(settings, "latex_format_cache", False)
+    monkeypatch.setattr(settings, "latex_frame_repair", False)
+    compiled = []
+
+    async def fake_pdflatex(name, cwd=None, fmt=None):
+        tex = (cwd / f"{name}.tex").read_text()
+        compiled.append(tex)
+        if "R&D" in tex:
+            (cwd / f"{name}.log").write_text(
+                "! Misplaced alignment tab character &.\nl.3 R&\n"
+            )
+            return 1, ""
+        (cwd / f"{name}.pdf").write_bytes(b"%PDF")
+        return 0, ""
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("escaping should have been enough")
+
+    monkeypatch.setattr(latex, "_pdflatex", fake_pdflatex)
+    monkeypatch.setattr(latex, "call_llm_text", no_llm)
+
+    deck = "\\documentclass{beamer}\n\\begin{document}\nR&D\n\\end{document}\n"
+    await latex.compile_latex_with_retries(deck, "job5")
+
+    assert compiled == [deck, deck.replace("R&D", "R\\&D")]
+
+
+@pytest.mark.anyio
+async def test_format_load_error_is_read_from_the_terminal(tmp_path, monkeypatch):
+    async def fake_run(cmd, cwd=None, **kwargs):
+        out = (
+            b"---! ./k.fmt was written by pdftex\n"
+            b"(Fatal format file error; I'm stymied)\n"
+        )
+        return procs.ProcessResult(1, out, b"")
+
+    monkeypatch.setattr(latex.procs, "run", fake_run)
+
+    rc, stderr = await latex._pdflatex("s", cwd=tmp_path, fmt="k")
+    assert rc == 1 and latex._FORMAT_ERROR.search(stderr)
+    _, stderr = await latex._pdflatex("s", cwd=tmp_path)
+    assert stderr == ""
@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from src.config import settings
+from src.utils import llm
+
+
+def _response(text: str, finish_reason: str = "stop"):
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                message=SimpleNamespace(content=text), finish_reason=finish_reason
+            )
+        ]
+    )
+
+
+@pytest.fixture()
+def fake_acompletion(monkeypatch):
+    state = {"in_flight": 0, "peak": 0, "calls": 0}
+
+    async def acompletion(**kwargs):
+        state["calls"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.02)
+        state["in_flight"] -= 1
+        return _response(f"echo:{kwargs['messages'][0]['content']}")
+
+    monkeypatch.setattr(llm.litellm, "acompletion", acompletion)
+    monkeypatch.setattr(llm, "_limiters", {})
+    monkeypatch.setattr(llm, "_in_flight", {})
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    return state
+
+
+@pytest.mark.anyio
+async def test_per_model_concurrency_limit(fake_acompletion, monkeypatch):
+    model = settings.materials_extraction_model
+    monkeypatch.setattr(settings, "llm_model_concurrency", {model: 2})
+
+    results = await asyncio.gather(*(llm.call_llm_text(f"p{i}", {}) for i in range(6)))
+
+    assert results == [f"echo:p{i}" for i in range(6)]
+    assert fake_acompletion["peak"] == 2
+
+
+@pytest.mark.anyio
+async def test_queue_timeout_returns_503(fake_acompletion, monkeypatch):
+    model = settings.materials_extraction_model
+    monkeypatch.setattr(settings, "llm_model_concurrency", {model: 1})
+    monkeypatch.setattr(settings, "llm_queue_timeout_s", 0.001)
+
+    results = await asyncio.gather(
+        llm.call_llm_text("a", {}), llm.call_llm_text("b", {}), return_exceptions=True
+    )
+
+    errors = [r for r in results if isinstance(r, HTTPException)]
+    assert len(errors) == 1 and errors[0].status_code == 503
+
+
+@pytest.fixture()
+def llm_cache(tmp_path, monkeypatch):
+    cache = llm.DiskCache("llm-test", tmp_path, max_bytes=1 << 20, ttl_s=3600)
+    monkeypatch.setattr(llm, "_response_cache", cache)
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    return cache
+
+
+@pytest.mark.anyio
+async def test_identical_prompts_served_from_cache(fake_acompletion, llm_cache):
+    first = await llm.call_llm_text("same prompt", {})
+    second = await llm.call_llm_text("same prompt", {})
+    await llm.call_llm_text("other prompt", {})
+
+    assert first == second == "echo:same prompt"
+    assert fake_acompletion["calls"] == 2
+
+
+@pytest.mark.anyio
+async def test_cache_opt_out(fake_acompletion, llm_cache):
+    await llm.call_llm_text("p", {}, use_cache=False)
+    await llm.call_llm_text("p", {}, use_cache=False)
+
+    assert fake_acompletion["calls"] == 2
+
+
+@pytest.mark.anyio
+async def test_truncated_answer_not_cached(llm_cache, monkeypatch):
+    calls = []
+
+    async def acompletion(**kwargs):
+        calls.append(kwargs)
+        return _response("half an ans", finish_reason="length")
+
+    monkeypatch.setattr(llm.litellm, "acompletion", acompletion)
+    await llm.call_llm_text("p", {})
+    await llm.call_llm_text("p", {})
+
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_rejected_narrations_are_asked_for_again(
+    llm_cache, monkeypatch, tmp_path
+):
+    from src.services import presentation
+
+    answers = iter(["not json", '[{"slideIndex": 1, "narration": "hi"}]'])
+
+    async def acompletion(**kwargs):
+        return _response(next(answers))
+
+    monkeypatch.setattr(llm.litellm, "acompletion", acompletion)
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    (tmp_path / "job1").mkdir()
+    (tmp_path / "job1" / "presentation.tex").write_text(r"\begin{document}")
+
+    with pytest.raises(HTTPException) as exc:
+        await presentation.generate_narrations("job1")
+    assert exc.value.status_code == 500
+
+    narrations = await presentation.generate_narrations("job1")
+    assert narrations == [{"slideIndex": 1, "narration": "hi"}]
+    # the good answer is cached; a third call does not reach the model
+    assert await presentation.generate_narrations("job1") == narrations
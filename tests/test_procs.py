@@ -0,0 +1,69 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from src.config import settings
+from src.utils import metrics, procs
+
+
+@pytest.fixture()
+def scheduler(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    monkeypatch.setattr(settings, "proc_slots", {"python": 2})
+    monkeypatch.setattr(settings, "proc_nice", 0)
+
+
+@pytest.mark.anyio
+async def test_runs_are_capped_per_binary(scheduler):
+    peak = 0
+
+    async def sample():
+        nonlocal peak
+        while True:
+            peak = max(
+                peak, metrics.snapshot()["gauges"].get("procs.python.running", 0)
+            )
+            await asyncio.sleep(0.01)
+
+    sampler = asyncio.create_task(sample())
+    cmd = [sys.executable, "-c", "import time; time.sleep(0.2)"]
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(procs.run(cmd, binary="python") for _ in range(4)))
+    sampler.cancel()
+
+    assert all(r.returncode == 0 for r in results)
+    assert peak == 2
+    assert time.perf_counter() - t0 >= 0.4
+
+
+@pytest.mark.anyio
+async def test_runaway_process_is_killed(scheduler):
+    cmd = [sys.executable, "-c", "import time; time.sleep(30)"]
+    t0 = time.perf_counter()
+    with pytest.raises(procs.ProcessTimeout):
+        await procs.run(cmd, binary="python", timeout=0.3)
+    assert time.perf_counter() - t0 < 5
+
+
+@pytest.mark.anyio
+async def test_cancelled_run_reaps_its_process(scheduler, monkeypatch):
+    started = []
+    spawn = asyncio.create_subprocess_exec
+
+    async def recording_spawn(*args, **kwargs):
+        started.append(await spawn(*args, **kwargs))
+        return started[-1]
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", recording_spawn)
+    cmd = [sys.executable, "-c", "import time; time.sleep(30)"]
+    task = asyncio.create_task(procs.run(cmd, binary="python"))
+    while not started:
+        await asyncio.sleep(0.01)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert started[0].returncode is not None
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from src.utils.quota import QuotaExceeded, SQLiteQuotaBackend
+
+
+@pytest.mark.anyio
+async def test_sqlite_counts_up_to_limit(tmp_path):
+    backend = SQLiteQuotaBackend(tmp_path / "quota.sqlite3")
+    try:
+        assert await backend.increment_and_check("u1", "2026-01-01", 2) == 1
+        assert await backend.increment_and_check("u1", "2026-01-01", 2) == 2
+        with pytest.raises(QuotaExceeded):
+            await backend.increment_and_check("u1", "2026-01-01", 2)
+
+        # other users and other days are independent
+        assert await backend.increment_and_check("u2", "2026-01-01", 2) == 1
+        assert await backend.increment_and_check("u1", "2026-01-02", 2) == 1
+    finally:
+        await backend.aclose()
+
+
+@pytest.mark.anyio
+async def test_sqlite_concurrent_builds_cannot_exceed_limit(tmp_path):
+    # separate instances stand in for separate Uvicorn workers
+    path = tmp_path / "quota.sqlite3"
+    backends = [SQLiteQuotaBackend(path) for _ in range(4)]
+    limit = 5
+
+    async def attempt(backend):
+        try:
+            return await backend.increment_and_check("u1", "2026-01-01", limit)
+        except QuotaExceeded:
+            return None
+
+    try:
+        results = await asyncio.gather(
+            *(attempt(backends[i % len(backends)]) for i in range(40))
+        )
+    finally:
+        for backend in backends:
+            await backend.aclose()
+
+    granted = sorted(r for r in results if r is not None)
+    assert granted == list(range(1, limit + 1))
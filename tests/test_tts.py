@@ -0,0 +1,213 @@
+import asyncio
+import io
+import json
+import threading
+import wave
+from pathlib import Path
+
+import httpx
+import pytest
+from gradio_client.exceptions import AppError
+
+from src.config import settings
+from src.services import job_engine, presentation, tts, tts_backends
+from src.services.tts_backends import FakeTTSBackend
+from src.utils.audio import read_wav, wav_duration
+from src.utils.disk_cache import DiskCache
+
+
+def _wav(seconds: float, rate: int = 24000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\0\0" * int(seconds * rate))
+    return buf.getvalue()
+
+
+class CountingBackend(FakeTTSBackend):
+    def __init__(self):
+        super().__init__(latency_s=0.02)
+        self.state = {"in_flight": 0, "peak": 0, "calls": 0}
+        self._lock = threading.Lock()
+
+    def _render(self, text: str, speed: float) -> bytes:
+        with self._lock:
+            self.state["calls"] += 1
+            self.state["in_flight"] += 1
+            self.state["peak"] = max(self.state["peak"], self.state["in_flight"])
+        try:
+            return super()._render(text, speed)
+        finally:
+            with self._lock:
+                self.state["in_flight"] -= 1
+
+
+@pytest.fixture()
+def fake_tts(monkeypatch, tmp_path):
+    backend = CountingBackend()
+    monkeypatch.setattr(tts_backends, "_backend", backend)
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    monkeypatch.setattr(settings, "tts_audio_format", "wav")
+    monkeypatch.setattr(
+        tts,
+        "_audio_cache",
+        DiskCache("tts", tmp_path / "cache", max_bytes=1 << 20, suffix=".wav"),
+    )
+    monkeypatch.setattr(job_engine, "_stage_pools", {})
+    monkeypatch.setattr(settings, "uvicorn_workers", 1)  # whole stage budget here
+    return backend.state
+
+
+def _narrations(n: int) -> list[dict]:
+    return [{"slideIndex": i, "narration": f"slide {i}"} for i in range(1, n + 1)]
+
+
+@pytest.mark.anyio
+async def test_narrations_bounded_and_ordered(fake_tts, monkeypatch):
+    monkeypatch.setattr(settings, "tts_job_concurrency", 3)
+    events = []
+
+    async def progress(event, data):
+        events.append(data["index"])
+
+    clips = await presentation.synthesize_narrations(
+        "j1", _narrations(8), "v", progress
+    )
+
+    assert [c["url"] for c in clips] == [
+        f"/audios/j1/slide_{i}.wav" for i in range(1, 9)
+    ]
+    assert fake_tts["peak"] == 3
+    assert sorted(events) == list(range(1, 9))
+
+
+@pytest.mark.anyio
+async def test_gradio_backend_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(settings, "tts_max_attempts", 3)
+    monkeypatch.setattr(settings, "tts_retry_base_delay_s", 0.0)
+    failures = {"slide 1": 2, "slide 2": 3}
+
+    def predict(text, voice, speed):
+        if failures[text] > 0:
+            failures[text] -= 1
+            raise httpx.ConnectError("space asleep")
+        return _wav(0.5)
+
+    backend = tts_backends.GradioTTSBackend("repo", "token", concurrency=2)
+    monkeypatch.setattr(backend, "_predict", predict)
+
+    assert await backend.synthesize("slide 1", "v", 1.0) == _wav(0.5)
+    with pytest.raises(httpx.ConnectError):
+        await backend.synthesize("slide 2", "v", 1.0)
+
+
+@pytest.mark.anyio
+async def test_gradio_backend_does_not_retry_app_errors(monkeypatch):
+    monkeypatch.setattr(settings, "tts_max_attempts", 3)
+    monkeypatch.setattr(settings, "tts_retry_base_delay_s", 0.0)
+    calls = []
+
+    def predict(text, voice, speed):
+        calls.append(text)
+        raise AppError("unknown voice")
+
+    backend = tts_backends.GradioTTSBackend("repo", "token", concurrency=2)
+    monkeypatch.setattr(backend, "_predict", predict)
+
+    with pytest.raises(AppError):
+        await backend.synthesize("slide 1", "nope", 1.0)
+    assert calls == ["slide 1"]
+
+
+@pytest.mark.anyio
+async def test_identical_narration_is_synthesized_once(fake_tts, tmp_path):
+    narrations = [
+        {"slideIndex": 1, "narration": "Welcome back."},
+        {"slideIndex": 2, "narration": "  Welcome\n back. "},
+    ]
+    await presentation.synthesize_narrations("j1", narrations, "v")
+    await presentation.synthesize_narrations("j2", narrations[:1], "v")
+
+    assert fake_tts["calls"] == 1
+    first = (tmp_path / "audios" / "j1" / "slide_1.wav").stat()
+    again = (tmp_path / "audios" / "j2" / "slide_1.wav").stat()
+    assert first.st_ino == again.st_ino
+
+    await tts.synthesize_tts("Welcome back.", "j3", 1, "v", speed=1.2)
+    assert fake_tts["calls"] == 2
+
+
+@pytest.mark.anyio
+async def test_clip_duration_is_recorded(fake_tts, tmp_path):
+    clip = await tts.synthesize_tts("one two three four", "j1", 3, "v")
+
+    assert clip == {"url": "/audios/j1/slide_3.wav", "duration_s": 1.0}
+    meta = json.loads((tmp_path / "audios" / "j1" / "slide_3.json").read_text())
+    assert meta["duration_s"] == 1.0
+    assert wav_duration(tmp_path / "audios" / "j1" / "slide_3.wav") == 1.0
+    assert not list((tmp_path / "audios" / "j1").glob(".*"))
+
+
+def test_split_sentences_merges_up_to_limit():
+    text = "One two.  Three four!\nFive. Six seven eight nine ten eleven."
+    assert tts.split_sentences(text, 20) == [
+        "One two. Three four!",
+        "Five.",
+        "Six seven eight nine ten eleven.",
+    ]
+
+
+@pytest.mark.anyio
+async def test_chunked_audio_streams_while_synthesizing(fake_tts, monkeypatch):
+    monkeypatch.setattr(settings, "tts_chunking", True)
+    monkeypatch.setattr(settings, "tts_chunk_max_chars", 10)
+    monkeypatch.setattr(settings, "job_poll_interval_s", 0.01)
+    events = []
+
+    async def progress(event, data):
+        events.append((event, data))
+
+    async def consume():
+        return b"".join([part async for part in tts.stream_slide_audio("j1", 2)])
+
+    reader = asyncio.create_task(consume())
+    clip = await tts.synthesize_tts(
+        "One two. Three four! Five.", "j1", 2, "v", progress=progress
+    )
+    streamed = await reader
+
+    assert fake_tts["calls"] == 3
+    assert clip["duration_s"] == 1.25
+    assert events == [
+        ("audio_stream_ready", {"index": 2, "url": tts.stream_url("j1", 2)})
+    ]
+    whole = read_wav(Path(settings.workspace_root) / "audios" / "j1" / "slide_2.wav")
+    assert streamed.startswith(b"RIFF")
+    assert streamed.endswith(whole[1])
+
+
+@pytest.mark.anyio
+async def test_rebuild_drops_stale_chunks(fake_tts, monkeypatch):
+    monkeypatch.setattr(settings, "tts_chunking", True)
+    monkeypatch.setattr(settings, "tts_chunk_max_chars", 10)
+    stale = tts._chunk_dir("j1", 3)
+    stale.mkdir(parents=True)
+    (stale / "manifest.json").write_text(json.dumps({"chunks": 9}))
+    (stale / "7.wav").write_bytes(b"old")
+
+    await tts.synthesize_tts("One two. Three four!", "j1", 3, "v")
+
+    assert sorted(p.name for p in stale.iterdir()) == [
+        "0.wav",
+        "1.wav",
+        "manifest.json",
+    ]
+    assert json.loads((stale / "manifest.json").read_text()) == {"chunks": 2}
+
+    # without chunking, the finished clip is what a stream request gets
+    monkeypatch.setattr(settings, "tts_chunking", False)
+    await tts.synthesize_tts("One two. Three four!", "j1", 3, "v")
+    assert not tts.has_chunk_stream("j1", 3)
+    assert tts.finished_clip("j1", 3).name == "slide_3.wav"
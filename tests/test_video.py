@@ -0,0 +1,60 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from src.config import settings
+from src.services import job_engine, presentation
+
+
+@pytest.fixture()
+def deck(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "workspace_root", tmp_path)
+    monkeypatch.setattr(settings, "pngs_dir", tmp_path / "pngs")
+    monkeypatch.setattr(settings, "videos_dir", tmp_path / "videos")
+    monkeypatch.setattr(settings, "video_assembler", "clips")
+    monkeypatch.setattr(job_engine, "_stage_pools", {})
+    png_dir, audio_dir = tmp_path / "pngs" / "j1", tmp_path / "audios" / "j1"
+    png_dir.mkdir(parents=True)
+    audio_dir.mkdir(parents=True)
+    for i in (1, 2, 3):
+        (png_dir / f"slide_{i}.png").write_bytes(b"png%d" % i)
+        (audio_dir / f"slide_{i}.mp3").write_bytes(b"mp3%d" % i)
+        (audio_dir / f"slide_{i}.json").write_text(json.dumps({"duration_s": 2.0}))
+
+    runs: list[list[str]] = []
+
+    async def fake_ffmpeg(cmd):
+        runs.append(cmd)
+        await asyncio.sleep(0.01)
+        Path(cmd[-1]).write_bytes(b"mp4")
+
+    monkeypatch.setattr(presentation, "run_ffmpeg_async", fake_ffmpeg)
+    return runs
+
+
+@pytest.mark.anyio
+async def test_concurrent_stitches_share_one_build(deck):
+    outputs = await asyncio.gather(*(presentation.stitch_video("j1") for _ in range(3)))
+
+    assert len(set(outputs)) == 1 and outputs[0].exists()
+    assert len(deck) == 4  # three clips + one concat
+
+
+@pytest.mark.anyio
+async def test_only_changed_slides_are_rebuilt(deck):
+    await presentation.stitch_video("j1")
+    deck.clear()
+
+    await presentation.stitch_video("j1")
+    assert deck == []  # up to date
+
+    audio = settings.workspace_root / "audios" / "j1" / "slide_2.mp3"
+    audio.write_bytes(b"new narration")
+    await presentation.stitch_video("j1")
+
+    assert len(deck) == 2  # slide 2's clip + concat
+    assert "slide_2.png" in " ".join(deck[0])
+    clips = list((settings.workspace_root / "j1" / "clips").glob("*.mp4"))
+    assert len(clips) == 3